@@ -0,0 +1,291 @@
+"""
+Concurrency model comparison harness
+
+Every workload in this repo is tied to one execution model:
+- crawl (threading/1_base.py) is I/O bound and uses one thread per link
+- is_prime (multiprocessing/4_pool_1.py) is CPU bound and uses a process Pool
+- inc_counter (threading/3_lock_basic.py) is lock heavy and uses threads
+
+This harness runs each workload under every model and measures it, so the choice of model for a new service can
+be based on numbers:-
+- serial: one loop in the main thread, the baseline for the speedup column
+- threads: ThreadPoolExecutor(workers)
+- process-fork / process-spawn / process-forkserver: multiprocessing.Pool(workers) with that start method.
+  Pool start up is part of the measured time, it is part of the cost of the model.
+- asyncio: one event loop, at most `workers` coroutines in flight (asyncio.Semaphore)
+- subinterpreters: one thread per sub-interpreter, when the interpreter has the private _xxsubinterpreters
+  module (CPython 3.11/3.12). They don't share objects, so every interpreter counts into its own counter.
+
+Each (workload, model, workers) cell runs in a fresh interpreter (subprocess), because peak RSS only ever grows
+within a process: measuring all cells in one process would charge every cell with the peak of the ones before it.
+The table shows tasks/s, speedup over serial, CPU seconds (user + system, parent + children), the peak RSS of
+the parent and the largest peak RSS of a child process. forkserver workers are children of the fork server, not
+of the measured process, so their CPU time and RSS don't show up in those columns.
+
+Run:  python compare_models.py [--workers 1,2,4,8] [--workloads crawl,is_prime] [--models threads,asyncio]
+"""
+
+import argparse
+import ast
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import _xxsubinterpreters as _interpreters
+except ImportError:
+    _interpreters = None
+
+CRAWL_LINKS = 64
+CRAWL_DELAY = 0.01  # simulated network delay per link
+PRIME_LIMIT = 300_000
+PRIME_CHUNKS = 64
+COUNTER_TASKS = 64
+COUNTER_INCREMENTS = 2_000
+
+
+# --- workloads, module level functions so spawn/forkserver workers can import them ---
+def crawl(link, delay=CRAWL_DELAY):
+    time.sleep(delay)  # Simulate network delay
+    return 1
+
+async def crawl_async(link, delay=CRAWL_DELAY):
+    await asyncio.sleep(delay)
+    return 1
+
+# copy of is_prime from multiprocessing/4_pool_1.py: spawn/forkserver workers unpickle functions by module name,
+# so the function has to live in an importable module, not one loaded with importlib from a file path
+def is_prime(number):
+    if number < 2:
+        return False
+    if number == 2:
+        return True
+    if number % 2 == 0:
+        return False
+    for i in range(3, int(math.sqrt(number)) + 1, 2):
+        if number % i == 0:
+            return False
+    return True
+
+def count_primes(bounds):
+    start, stop = bounds
+    return sum(1 for n in range(start, stop) if is_prime(n))
+
+# inc_counter shares one counter and one lock between all workers. Threads use the module globals below,
+# process workers get a shared RawValue + multiprocessing.Lock from _init_process_worker.
+_counter = types.SimpleNamespace(value=0)
+_counter_lock = threading.Lock()
+
+def inc_counter(increments):
+    for _ in range(increments):
+        with _counter_lock:
+            _counter.value += 1
+    return increments
+
+def _init_process_worker(counter, lock):
+    global _counter, _counter_lock
+    if counter is not None:
+        _counter, _counter_lock = counter, lock
+
+
+class Workload:
+    def __init__(self, name, fn, make_tasks, async_fn=None, shared_counter=False):
+        self.name = name
+        self.fn = fn
+        self.make_tasks = make_tasks
+        self.async_fn = async_fn
+        self.shared_counter = shared_counter
+
+
+def _prime_tasks():
+    step = -(-PRIME_LIMIT // PRIME_CHUNKS)
+    return [(start, min(start + step, PRIME_LIMIT)) for start in range(0, PRIME_LIMIT, step)]
+
+WORKLOADS = {
+    "crawl": Workload("crawl", crawl, lambda: [f"https://example.com/{i}" for i in range(CRAWL_LINKS)],
+                      async_fn=crawl_async),
+    "is_prime": Workload("is_prime", count_primes, _prime_tasks),
+    "inc_counter": Workload("inc_counter", inc_counter, lambda: [COUNTER_INCREMENTS] * COUNTER_TASKS,
+                            shared_counter=True),
+}
+
+
+# --- execution models, each returns (results, final shared counter value) ---
+def run_serial(workload, tasks, workers):
+    return [workload.fn(task) for task in tasks], _counter.value
+
+def run_threads(workload, tasks, workers):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(workload.fn, tasks))
+    return results, _counter.value
+
+def _run_processes(method, workload, tasks, workers):
+    ctx = multiprocessing.get_context(method)
+    counter = lock = None
+    if workload.shared_counter:
+        counter, lock = ctx.RawValue("q", 0), ctx.Lock()
+    with ctx.Pool(workers, initializer=_init_process_worker, initargs=(counter, lock)) as pool:
+        results = pool.map(workload.fn, tasks, chunksize=1)
+    return results, counter.value if counter is not None else 0
+
+def run_asyncio(workload, tasks, workers):
+    async def main():
+        limit = asyncio.Semaphore(workers)
+
+        async def one(task):
+            async with limit:
+                if workload.async_fn is not None:
+                    return await workload.async_fn(task)
+                return workload.fn(task)  # CPU bound: runs on the loop thread, nothing to overlap with
+
+        return await asyncio.gather(*(one(task) for task in tasks))
+
+    return asyncio.run(main()), _counter.value
+
+_SUBINTERPRETER_SCRIPT = """
+import ast, importlib.util
+spec = importlib.util.spec_from_file_location("compare_models", harness_path)
+harness = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(harness)
+workload = harness.WORKLOADS[workload_name]
+results = [workload.fn(task) for task in ast.literal_eval(tasks)]
+with open(out_path, "w") as f:
+    f.write(repr((results, harness._counter.value)))
+"""
+
+def run_subinterpreters(workload, tasks, workers):
+    if _interpreters is None:
+        raise RuntimeError("this interpreter has no sub-interpreter support")
+    slices = [tasks[i::workers] for i in range(workers)]
+    outputs = []
+    threads = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, chunk in enumerate(slices):
+            out_path = os.path.join(tmp, f"{i}.out")
+            outputs.append(out_path)
+            shared = {"harness_path": os.path.abspath(__file__), "workload_name": workload.name,
+                      "tasks": repr(chunk), "out_path": out_path}
+
+            def run(shared=shared):
+                interp = _interpreters.create()
+                try:
+                    _interpreters.run_string(interp, _SUBINTERPRETER_SCRIPT, shared)
+                finally:
+                    _interpreters.destroy(interp)
+
+            threads.append(threading.Thread(target=run))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        results, counter = [], 0
+        for path in outputs:
+            with open(path) as f:
+                chunk_results, chunk_counter = ast.literal_eval(f.read())
+            results += chunk_results
+            counter += chunk_counter  # each interpreter has its own counter
+    return results, counter
+
+MODELS = {
+    "serial": run_serial,
+    "threads": run_threads,
+    "process-fork": lambda w, t, n: _run_processes("fork", w, t, n),
+    "process-spawn": lambda w, t, n: _run_processes("spawn", w, t, n),
+    "process-forkserver": lambda w, t, n: _run_processes("forkserver", w, t, n),
+    "asyncio": run_asyncio,
+    "subinterpreters": run_subinterpreters,
+}
+
+def available_models():
+    methods = multiprocessing.get_all_start_methods()
+    models = [m for m in MODELS if not m.startswith("process-") or m.split("-", 1)[1] in methods]
+    if _interpreters is None:
+        models.remove("subinterpreters")
+    return models
+
+
+# --- measuring one cell ---
+def measure(workload_name, model, workers):
+    workload = WORKLOADS[workload_name]
+    tasks = workload.make_tasks()
+    before = os.times()
+    start = time.perf_counter()
+    results, counter = MODELS[model](workload, tasks, workers)
+    elapsed = time.perf_counter() - start
+    after = os.times()
+    cpu = sum(after[:4]) - sum(before[:4])  # user + system, self + waited-for children
+    total = counter if workload.shared_counter else sum(results)
+    return {
+        "workload": workload_name,
+        "model": model,
+        "workers": workers,
+        "seconds": elapsed,
+        "tasks_per_s": len(tasks) / elapsed,
+        "cpu_seconds": cpu,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "child_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        "total": total,  # compared with the serial run's total
+    }
+
+def measure_in_subprocess(workload_name, model, workers, timeout=600):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--cell", workload_name, model, str(workers)],
+                          capture_output=True, text=True, timeout=timeout)
+    if proc.returncode != 0:
+        return {"workload": workload_name, "model": model, "workers": workers,
+                "error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run_comparison(workloads=tuple(WORKLOADS), models=None, worker_counts=(1, 2, 4, 8)):
+    models = [m for m in (models or available_models()) if m != "serial"]
+    print(f"{'workload':>12} {'model':>19} {'workers':>8} {'seconds':>8} {'tasks/s':>9} {'speedup':>8} "
+          f"{'CPU s':>7} {'RSS MB':>7} {'child RSS MB':>13} {'correct':>8}")
+    rows = []
+    for workload_name in workloads:
+        baseline = measure_in_subprocess(workload_name, "serial", 1)
+        cells = [baseline] + [measure_in_subprocess(workload_name, model, workers)
+                              for model in models for workers in worker_counts]
+        for row in cells:
+            rows.append(row)
+            if "error" in row:
+                print(f"{row['workload']:>12} {row['model']:>19} {row['workers']:>8}  failed: {row['error']}")
+                continue
+            speedup = baseline["seconds"] / row["seconds"] if "seconds" in baseline else float("nan")
+            row["correct"] = row["total"] == baseline.get("total")
+            print(f"{row['workload']:>12} {row['model']:>19} {row['workers']:>8} {row['seconds']:>8.3f} "
+                  f"{row['tasks_per_s']:>9.1f} {speedup:>7.2f}x {row['cpu_seconds']:>7.2f} {row['rss_mb']:>7.1f} "
+                  f"{row['child_rss_mb']:>13.1f} {str(row['correct']):>8}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cell", nargs=3, metavar=("WORKLOAD", "MODEL", "WORKERS"), help=argparse.SUPPRESS)
+    parser.add_argument("--workers", default="1,2,4,8", help="comma separated worker counts to sweep")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS))
+    parser.add_argument("--models", default=",".join(available_models()))
+    parser.add_argument("--json", help="also write all rows to this file")
+    args = parser.parse_args()
+
+    if args.cell:
+        workload_name, model, workers = args.cell
+        print(json.dumps(measure(workload_name, model, int(workers))))
+    else:
+        print(f"Python {sys.version.split()[0]}, {os.cpu_count()} CPUs, "
+              f"start methods: {multiprocessing.get_all_start_methods()}, "
+              f"sub-interpreters: {'yes' if _interpreters is not None else 'no'}")
+        rows = run_comparison(args.workloads.split(","), args.models.split(","),
+                              [int(n) for n in args.workers.split(",")])
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(rows, f, indent=2)
@@ -108,3 +108,9 @@ if __name__ == '__main__':
 
     print(final_result)
 
+
+# Every url and every result here is its own put (its own lock, pickle and pipe write), and result_queue is only
+# read after joining the consumers, which hangs once the results don't fit in the pipe buffer. See
+# 3_exchanging_objects_batched_queue.py for a batched queue (put_many/get_many, out-of-band pickling of large
+# buffers) with the results drained while the consumers run, and 3_exchanging_objects_async_workers.py for
+# consumers that each run an event loop with thousands of requests in flight instead of one.
@@ -0,0 +1,275 @@
+"""
+Hybrid crawl workers: processes for the CPU, an event loop in each for the network
+
+The consumer processes in 3_exchanging_objects_1_queue.py call help_process_url for one URL at a time: a fresh
+requests.get (new connection, new handshake) and then a time.sleep(1). While a request waits for the network
+the whole process waits with it, so 4 processes means 4 requests in flight, however many URLs there are.
+
+Here every worker process runs an asyncio event loop instead:-
+- Fetching: max_concurrency coroutines per process share the AsyncCrawler from threading/1_base_async_crawler.py.
+  It keeps a pool of keep-alive connections per host (at most per_host_limit open to one host), so requests to
+  the same host reuse connections instead of connecting again. 2 processes x 1000 coroutines = 2000 requests in
+  flight.
+- Parsing: the processes are still there for the CPU. A page is parsed in the process that fetched it, one
+  process per core, so parsing runs in parallel across cores. Within a process it runs in the loop's default
+  executor, so the loop keeps serving the network while a page is parsed.
+- Transport: the parent sends URLs in batches and the workers send results back in batches, over the BatchQueue
+  of 3_exchanging_objects_batched_queue.py. Everything that can block on the pipes runs in a thread of its own
+  (run_in_executor): a feeder coroutine reads the next batch of URLs on a reader thread, and stops taking URLs
+  while enough are waiting (bounded asyncio.Queue), so the URLs stay spread over the processes. Results go out
+  through one writer thread, one thread so the put() batching of the BatchQueue is never used concurrently.
+- The reader thread reads with a short timeout and gives up once the worker stops. A worker that fails doesn't
+  leave a read blocked (holding the queue's read lock, or taking the URLs and sentinels of the other workers):
+  what it read but didn't crawl goes back into the task queue.
+- The parent drains the results with a ResultDrainer while the workers run.
+
+The benchmark runs both models against the local StandInServer (every response waits `latency` seconds), in a
+process of its own. The one-at-a-time baseline leaves out the extra time.sleep(1) of the original, it only pays
+for the request itself.
+"""
+
+import asyncio
+import contextlib
+import http.client
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import module_from_spec, spec_from_file_location
+from multiprocessing import get_context
+from urllib.parse import urlsplit
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _load(name, path):
+    spec = spec_from_file_location(name, path)
+    module = module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+_batched_queue = _load("batched_queue", os.path.join(_HERE, "3_exchanging_objects_batched_queue.py"))
+_async_crawler = _load("base_async_crawler", os.path.join(_HERE, "..", "threading", "1_base_async_crawler.py"))
+BatchQueue = _batched_queue.BatchQueue
+ResultDrainer = _batched_queue.ResultDrainer
+AsyncCrawler = _async_crawler.AsyncCrawler
+StandInServer = _async_crawler.StandInServer
+
+_WORD = re.compile(rb"\w+")
+READ_POLL = 0.1  # seconds a task queue read waits before it checks whether the worker is stopping
+
+
+def parse_page(body, rounds=20):
+    """Stand-in for the CPU heavy part: word statistics of the page, `rounds` times."""
+    words = 0
+    longest = 0
+    for _ in range(rounds):
+        tokens = _WORD.findall(body)
+        words = len(tokens)
+        longest = max(map(len, tokens), default=0)
+    return {"words": words, "longest_word": longest}
+
+
+# --- worker side ---
+def _read_batch(task_queue, stop):
+    """task_queue.get_many(), but returns None once stop is set instead of blocking on for good."""
+    while not stop.is_set():
+        try:
+            return task_queue.get_many(timeout=READ_POLL)
+        except queue.Empty:
+            pass
+    return None
+
+async def _crawl_worker(task_queue, result_queue, max_concurrency, per_host_limit, parse_rounds):
+    loop = asyncio.get_running_loop()
+    crawler = AsyncCrawler(max_concurrency=max_concurrency, per_host_limit=per_host_limit)
+    urls = asyncio.Queue(maxsize=max_concurrency)  # a bounded backlog, the rest stays in task_queue
+    in_flight = 0
+    stats = {"worker": os.getpid(), "peak_in_flight": 0, "fetched": 0, "errors": 0}
+    stop = threading.Event()
+    reader = ThreadPoolExecutor(1, thread_name_prefix="task-reader")
+    writer = ThreadPoolExecutor(1, thread_name_prefix="result-writer")
+    pending_read = None  # the reader's concurrent Future while its batch isn't in `urls` yet
+    crawling = set()  # URLs taken from `urls` whose result isn't written yet
+
+    async def feeder():
+        nonlocal pending_read
+        while True:
+            pending_read = reader.submit(_read_batch, task_queue, stop)
+            batch = await asyncio.wrap_future(pending_read)
+            pending_read = None
+            for url in batch:
+                await urls.put(url)
+                if url is None:
+                    return
+
+    async def fetcher():
+        nonlocal in_flight
+        while True:
+            url = await urls.get()
+            if url is None:
+                await urls.put(None)  # leave the stop marker for the other fetchers
+                return
+            crawling.add(url)
+            in_flight += 1
+            stats["peak_in_flight"] = max(stats["peak_in_flight"], in_flight)
+            try:
+                status, body = await crawler.fetch_page(url)
+                result = {"url": url, "status_code": status, "content_length": len(body)}
+                result.update(await loop.run_in_executor(None, parse_page, body, parse_rounds))
+                stats["fetched"] += 1
+            except Exception as e:  # every URL gets a result, one bad page must not end the fetcher
+                result = {"url": url, "error": repr(e)}
+                stats["errors"] += 1
+            finally:
+                in_flight -= 1
+            await loop.run_in_executor(writer, result_queue.put, result)
+            crawling.discard(url)
+
+    tasks = [asyncio.create_task(feeder())] + [asyncio.create_task(fetcher()) for _ in range(max_concurrency)]
+    try:
+        await asyncio.gather(*tasks)
+        stats["connections_opened"] = crawler.connections_opened
+        stats["connections_reused"] = crawler.connections_reused
+        writer.submit(result_queue.put, stats)
+    finally:
+        pending = set(tasks)
+        while pending:
+            # cancel again until they are gone: asyncio.wait_for before Python 3.12 loses a cancel that comes
+            # in together with the result, the fetcher then goes on to wait in urls.get()
+            for task in pending:
+                task.cancel()
+            _, pending = await asyncio.wait(pending, timeout=READ_POLL)
+        await crawler.close()
+        # ends a read in progress within READ_POLL, it must not hold the read lock after this worker is gone
+        stop.set()
+        await loop.run_in_executor(None, reader.shutdown)
+        leftover = list(crawling)
+        if pending_read is not None and not pending_read.cancelled() and pending_read.exception() is None:
+            leftover += pending_read.result() or []
+        while not urls.empty():
+            leftover.append(urls.get_nowait())
+        # only after a failure: URLs this worker took but didn't crawl go back for the other workers
+        leftover = [url for url in leftover if url is not None]
+        if leftover:
+            writer.submit(task_queue.put_many, leftover)
+        # every result is written before async_consumer sends the sentinel of this worker
+        await loop.run_in_executor(None, writer.shutdown)
+
+def async_consumer(task_queue, result_queue, max_concurrency=1000, per_host_limit=1000, parse_rounds=20):
+    try:
+        asyncio.run(_crawl_worker(task_queue, result_queue, max_concurrency, per_host_limit, parse_rounds))
+    finally:
+        # also when the worker failed: flushes the results, then tells the drainer this worker is done
+        result_queue.put_many([None])
+
+def blocking_consumer(task_queue, result_queue, parse_rounds=20):
+    """3_exchanging_objects_1_queue.py style: one request at a time, a new connection for every URL."""
+    while True:
+        for url in task_queue.get_many():
+            if url is None:
+                result_queue.put_many([None])
+                return
+            parts = urlsplit(url)
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+            try:
+                conn.request("GET", parts.path or "/")
+                response = conn.getresponse()
+                body = response.read()
+                result = {"url": url, "status_code": response.status, "content_length": len(body)}
+                result.update(parse_page(body, parse_rounds))
+            except OSError as e:
+                result = {"url": url, "error": repr(e)}
+            finally:
+                conn.close()
+            result_queue.put(result)
+
+
+def crawl(urls, processes=2, mode="async", max_concurrency=1000, per_host_limit=None, parse_rounds=20,
+          url_batch=50):
+    """Runs the crawl on `processes` worker processes. Returns (results, per worker stats)."""
+    ctx = get_context("fork")
+    per_host_limit = per_host_limit or max_concurrency
+    task_queue = BatchQueue(batch_size=url_batch, ctx=ctx)
+    result_queue = BatchQueue(batch_size=256, ctx=ctx)
+    if mode == "async":
+        target, args = async_consumer, (task_queue, result_queue, max_concurrency, per_host_limit, parse_rounds)
+    else:
+        target, args = blocking_consumer, (task_queue, result_queue, parse_rounds)
+    workers = [ctx.Process(target=target, args=args) for _ in range(processes)]
+    for p in workers:
+        p.start()
+
+    drainer = ResultDrainer(result_queue, producers=processes)
+    drainer.start()
+    for url in urls:
+        task_queue.put(url)
+    task_queue.flush()
+    for _ in range(processes):
+        task_queue.put_many([None])
+    for p in workers:
+        p.join()
+    collected = drainer.wait()
+    results = [item for item in collected if "worker" not in item]
+    stats = [item for item in collected if "worker" in item]
+    return results, stats
+
+
+# --- Benchmark: one request at a time per process vs an event loop per process ---
+def _serve(latency, conn):
+    with StandInServer(latency=latency) as server:
+        conn.send(server.url())
+        conn.recv()  # until the parent is done
+
+@contextlib.contextmanager
+def stand_in_server(latency):
+    """StandInServer in a process of its own, so the forked workers don't inherit its event loop thread."""
+    ctx = get_context("fork")
+    parent_conn, child_conn = ctx.Pipe()
+    server = ctx.Process(target=_serve, args=(latency, child_conn), daemon=True)
+    server.start()
+    try:
+        yield parent_conn.recv().rstrip("/")
+    finally:
+        parent_conn.send("stop")
+        server.join()
+
+def run_benchmark(latency=0.5, processes=2):
+    print(f"{processes} worker processes on {os.cpu_count()} CPUs, stand-in server latency {latency * 1000:.0f} ms")
+    print(f"{'model':>24} {'urls':>7} {'seconds':>8} {'urls/s':>8} {'errors':>7} {'in flight':>10} "
+          f"{'conns opened':>13} {'reused':>8}")
+    cases = (
+        ("one at a time", 40, {"mode": "blocking"}),
+        ("asyncio x 100", 2_000, {"mode": "async", "max_concurrency": 100}),
+        ("asyncio x 1000", 10_000, {"mode": "async", "max_concurrency": 1000}),
+        ("asyncio x 2500", 20_000, {"mode": "async", "max_concurrency": 2500}),
+    )
+    with stand_in_server(latency) as base_url:
+        for name, size, options in cases:
+            urls = [f"{base_url}/page/{i}" for i in range(size)]
+            start = time.perf_counter()
+            results, stats = crawl(urls, processes, **options)
+            elapsed = time.perf_counter() - start
+            errors = sum(1 for r in results if "error" in r) + size - len(results)
+            in_flight = sum(s["peak_in_flight"] for s in stats) if stats else processes
+            opened = sum(s["connections_opened"] for s in stats) if stats else size
+            reused = sum(s["connections_reused"] for s in stats)
+            print(f"{name:>24} {size:>7} {elapsed:>8.2f} {size / elapsed:>8.0f} {errors:>7} {in_flight:>10} "
+                  f"{opened:>13} {reused:>8}")
+    # "in flight" adds up the peak of every worker; the one-at-a-time model has exactly one per process
+
+
+if __name__ == '__main__':
+    with stand_in_server(latency=0.05) as base_url:
+        urls_to_crawl = [f"{base_url}/page/{i}" for i in range(500)]
+        final_result, worker_stats = crawl(urls_to_crawl, processes=2, max_concurrency=200)
+    print(f"{len(final_result)} results, first: {final_result[0]}")
+    for s in worker_stats:
+        print(f"worker {s['worker']}: {s['fetched']} fetched, peak {s['peak_in_flight']} in flight, "
+              f"{s['connections_opened']} connections opened, {s['connections_reused']} reused")
+
+    print("\nBenchmark: one request at a time per process vs an event loop per process")
+    run_benchmark()
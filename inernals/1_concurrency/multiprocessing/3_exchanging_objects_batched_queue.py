@@ -0,0 +1,295 @@
+"""
+Batched queue transport with out-of-band pickling
+
+In 3_exchanging_objects_1_queue.py every URL is one task_queue.put and every result one result_queue.put. Each
+message pays for itself: the queue's lock, a pickle.dumps, a write on the pipe (done by the queue's feeder thread)
+and on the other side a read, a pickle.loads and the lock again. With small messages that fixed cost is most of
+the work. And the parent only starts reading result_queue after joining the consumers: a process that has put
+data on a queue doesn't exit until the data is flushed into the pipe, so once the pipe buffer (64 KB on Linux)
+is full the consumers wait for the parent and the parent waits for the consumers.
+
+BatchQueue changes three things:-
+- Batching: put() collects items locally and sends `batch_size` of them as one message, put_many() sends a whole
+  list as one message. One lock, one pickle and one pipe write per batch instead of per item. get() reads a
+  whole batch and hands the items out one by one, get_many() returns them all at once.
+- Out-of-band buffers: a batch is pickled with protocol 5. Buffers that support it (pickle.PickleBuffer,
+  bytearray, NumPy arrays) of at least `oob_threshold` bytes are not copied into the pickle stream: they are
+  written to the pipe as frames of their own and received with recv_bytes_into into a fresh bytearray. A
+  PickleBuffer arrives as that bytearray itself and a NumPy array is rebuilt on top of it, so a 1 MB payload is
+  copied into the pipe and out of it, not also into and out of a pickle. (A plain bytearray is rebuilt with
+  bytearray(buffer), one copy on the receiving side: wrap big payloads in a PickleBuffer.)
+- Draining: ResultDrainer reads the result queue in a thread of the parent while the consumers run, so the
+  parent can join the consumers without the deadlock above.
+
+Things to know:-
+- A batch goes to one reader as a whole. For task distribution keep batch_size small (like a Pool chunksize),
+  otherwise one consumer gets everything. For the same reason send stop sentinels as separate batches
+  (put_many([None]) once per consumer), never several in one batch.
+- put() buffers: call flush() (or close()) when the producer is done, or the last partial batch stays behind.
+- Like multiprocessing.Queue, a BatchQueue can only be passed to a Process as an argument, not sent over a queue.
+"""
+
+import os
+import pickle
+import queue
+import struct
+import threading
+import time
+from collections import deque
+from multiprocessing import Process, get_context
+from multiprocessing.context import assert_spawning
+
+_HEADER = struct.Struct("!I")  # number of out-of-band buffers, followed by one "!Q" size per buffer
+_SIZE = struct.Struct("!Q")
+
+
+class BatchQueue:
+    def __init__(self, batch_size=64, oob_threshold=64 * 1024, ctx=None):
+        ctx = ctx or get_context()
+        self.batch_size = batch_size
+        self.oob_threshold = oob_threshold
+        self._reader, self._writer = ctx.Pipe(duplex=False)
+        self._read_lock = ctx.Lock()
+        self._write_lock = ctx.Lock()
+        self._reset()
+
+    def _reset(self):
+        # per process state, not shared and not pickled
+        self._pending = []     # put() items not sent yet
+        self._received = deque()  # items of the last batch not handed out by get() yet
+
+    def __getstate__(self):
+        assert_spawning(self)
+        return self.batch_size, self.oob_threshold, self._reader, self._writer, self._read_lock, self._write_lock
+
+    def __setstate__(self, state):
+        self.batch_size, self.oob_threshold, self._reader, self._writer, self._read_lock, self._write_lock = state
+        self._reset()
+
+    # --- sending ---
+    def _send_batch(self, items):
+        buffers = []
+
+        def out_of_band(buffer):
+            if buffer.raw().nbytes >= self.oob_threshold:
+                buffers.append(buffer)
+                return False  # false -> out-of-band
+            return True       # small buffers stay in the pickle stream
+
+        data = pickle.dumps(items, protocol=5, buffer_callback=out_of_band)
+        header = _HEADER.pack(len(buffers)) + b"".join(_SIZE.pack(b.raw().nbytes) for b in buffers)
+        with self._write_lock:
+            # all frames of one batch under the lock, so batches of different writers don't interleave
+            self._writer.send_bytes(header + data)
+            for buffer in buffers:
+                self._writer.send_bytes(buffer.raw())
+
+    def put(self, item):
+        self._pending.append(item)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def put_many(self, items):
+        """Sends the pending put() items, then `items` as one batch."""
+        self.flush()
+        items = list(items)
+        if items:
+            self._send_batch(items)
+
+    def flush(self):
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self._send_batch(pending)
+
+    # --- receiving ---
+    def _recv_batch(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._read_lock.acquire(True, timeout):  # timeout None blocks
+            raise queue.Empty
+        try:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self._reader.poll(remaining):
+                raise queue.Empty
+            frame = self._reader.recv_bytes()
+            count, = _HEADER.unpack_from(frame)
+            sizes = [_SIZE.unpack_from(frame, _HEADER.size + i * _SIZE.size)[0] for i in range(count)]
+            buffers = []
+            for size in sizes:
+                buffer = bytearray(size)
+                self._reader.recv_bytes_into(buffer)
+                buffers.append(buffer)
+        finally:
+            self._read_lock.release()
+        data = memoryview(frame)[_HEADER.size + len(sizes) * _SIZE.size:]
+        return pickle.loads(data, buffers=buffers)
+
+    def get(self, block=True, timeout=None):
+        if not self._received:
+            self._received.extend(self._recv_batch(timeout if block else 0))
+        return self._received.popleft()
+
+    def get_many(self, block=True, timeout=None):
+        """All items of the next batch (or what get() left of the current one) as a list."""
+        if not self._received:
+            return self._recv_batch(timeout if block else 0)
+        items = list(self._received)
+        self._received.clear()
+        return items
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        self._reader.close()
+
+
+class ResultDrainer(threading.Thread):
+    """
+    Collects everything from a BatchQueue (or a multiprocessing.Queue) in a background thread of the parent
+    until `producers` sentinels arrived, so the producers never block on a full pipe.
+    The sentinel is compared by identity (`==` on a NumPy array result is an array, not a bool), so it has to be
+    an object unpickling keeps the identity of, like the default None.
+    """
+    def __init__(self, result_queue, producers, sentinel=None):
+        super().__init__(daemon=True)
+        self.result_queue = result_queue
+        self.producers = producers
+        self.sentinel = sentinel
+        self.results = []
+
+    def run(self):
+        finished = 0
+        get_many = getattr(self.result_queue, "get_many", None)
+        while finished < self.producers:
+            items = get_many() if get_many is not None else [self.result_queue.get()]
+            for item in items:
+                if item is self.sentinel:
+                    finished += 1
+                else:
+                    self.results.append(item)
+
+    def wait(self, timeout=None):
+        self.join(timeout)
+        return self.results
+
+
+# --- the crawler from 3_exchanging_objects_1_queue.py on BatchQueues ---
+def help_process_url(url: str) -> dict[str, str]:
+    time.sleep(0.01)  # Simulate network delay (the original does a requests.get)
+    return {"url": url, "status_code": 200, "content_length": len(url) * 100}
+
+def producer(task_queue: BatchQueue, urls: list[str], total_consumers: int):
+    for url in urls:
+        task_queue.put(url)
+    task_queue.flush()
+    # one batch per sentinel, a batch goes to one consumer as a whole
+    for _ in range(total_consumers):
+        task_queue.put_many([None])
+    print(f"[{os.getpid()}] Producer finished adding all tasks.")
+
+def consumer(task_queue: BatchQueue, result_queue: BatchQueue):
+    while True:
+        curr_task = task_queue.get()
+        if curr_task is None:
+            break
+        result_queue.put(help_process_url(curr_task))
+    result_queue.put_many([None])  # flushes the pending results, then tells the drainer this consumer is done
+
+
+# --- Benchmark: multiprocessing.Queue vs BatchQueue ---
+def _send_plain(q, make_item, count):
+    for i in range(count):
+        q.put(make_item(i))
+    q.put(None)
+
+def _send_batched(q, make_item, count):
+    for i in range(count):
+        q.put(make_item(i))
+    q.put_many([None])
+
+def _small_message(i):
+    return {"url": f"https://example.com/{i}", "status_code": 200, "content_length": i}
+
+def _large_message(i, size=1 << 20):
+    return {"id": i, "payload": bytearray(size)}
+
+def _large_buffer_message(i, size=1 << 20):
+    # multiprocessing.Queue pickles with protocol 4 and can't send a PickleBuffer
+    return {"id": i, "payload": pickle.PickleBuffer(bytearray(size))}
+
+def _message_bytes(message):
+    return len(pickle.dumps(message, protocol=5))
+
+def _measure(ctx, q, sender, make_item, count):
+    producer_p = ctx.Process(target=sender, args=(q, make_item, count))
+    start = time.perf_counter()
+    producer_p.start()
+    drainer = ResultDrainer(q, producers=1)
+    drainer.start()
+    results = drainer.wait()
+    elapsed = time.perf_counter() - start
+    producer_p.join()
+    return elapsed, len(results)
+
+def _pickle_round_trip(message, out_of_band, rounds=200):
+    """Microseconds for dumps + loads of one message, the copies on top of the pipe that out-of-band buffers skip."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        if out_of_band:
+            buffers = []
+            data = pickle.dumps(message, protocol=5, buffer_callback=buffers.append)
+            # the buffers themselves go through the pipe, recv_bytes_into fills the bytearray loads() uses
+            pickle.loads(data, buffers=buffers)
+        else:
+            pickle.loads(pickle.dumps(message, protocol=5))
+    return (time.perf_counter() - start) / rounds * 1e6
+
+def run_benchmark():
+    ctx = get_context("fork")
+    no_oob = float("inf")
+    cases = (
+        ("small dicts", _small_message, _small_message, 100_000,
+         ((1, 64 * 1024), (64, 64 * 1024), (256, 64 * 1024))),
+        ("1 MB payloads", _large_message, _large_buffer_message, 500, ((1, 64 * 1024), (1, no_oob), (8, 64 * 1024))),
+    )
+    print(f"{'messages':>16} {'transport':>24} {'seconds':>8} {'msgs/s':>10} {'MB/s':>8} {'received':>9}")
+    for name, plain_item, batched_item, count, settings in cases:
+        total_bytes = _message_bytes(plain_item(0)) * count
+        variants = [("multiprocessing.Queue", lambda: ctx.Queue(), _send_plain, plain_item)]
+        for batch_size, threshold in settings:
+            label = f"BatchQueue({batch_size}{', no oob' if threshold == no_oob else ''})"
+            variants.append((label, lambda b=batch_size, t=threshold: BatchQueue(b, t, ctx=ctx), _send_batched,
+                             batched_item))
+        for variant, make_queue, sender, make_item in variants:
+            q = make_queue()
+            elapsed, received = _measure(ctx, q, sender, make_item, count)
+            print(f"{name:>16} {variant:>24} {elapsed:>8.3f} {count / elapsed:>10,.0f} "
+                  f"{total_bytes / elapsed / 1e6:>8.1f} {received == count!s:>9}")
+            q.close()
+
+    message = _large_buffer_message(0)
+    print(f"\npickle round trip of one 1 MB message: in-band {_pickle_round_trip(message, False):.0f} us, "
+          f"out-of-band {_pickle_round_trip(message, True):.0f} us (the rest is the pipe, on one CPU it dominates)")
+
+if __name__ == '__main__':
+    urls_to_crawl = [f"https://example.com/page/{i}" for i in range(200)]
+    num_consumers = 4
+    task_queue = BatchQueue(batch_size=8)  # small batches: tasks should spread over the consumers
+    result_queue = BatchQueue(batch_size=64)
+
+    producer_p = Process(target=producer, args=(task_queue, urls_to_crawl, num_consumers))
+    producer_p.start()
+    consumer_processes = [Process(target=consumer, args=(task_queue, result_queue)) for _ in range(num_consumers)]
+    for p in consumer_processes:
+        p.start()
+
+    # drain while the consumers run, then join them
+    drainer = ResultDrainer(result_queue, producers=num_consumers)
+    drainer.start()
+    producer_p.join()
+    for p in consumer_processes:
+        p.join()
+    final_result = drainer.wait()
+    print(f"{len(final_result)} results, first: {final_result[0]}")
+
+    print("\nBenchmark: multiprocessing.Queue vs BatchQueue")
+    run_benchmark()
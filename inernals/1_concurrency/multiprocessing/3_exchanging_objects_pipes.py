@@ -96,4 +96,10 @@ if __name__ == '__main__':
         child_p.join()
 
 
-        
\ No newline at end of file
+        
+
+# Every command and reply here is pickled and the parent waits for each reply before sending the next command.
+# See 3_exchanging_objects_pipes_binary.py for a binary protocol with request ids, raw pixel payloads read into
+# preallocated buffers and several requests in flight, and 3_exchanging_objects_pipes_dispatcher.py for spreading
+# the requests over a pool of such workers, one per core. For many tiny messages between two processes,
+# 3_exchanging_objects_shm_ring.py passes them through a shared memory ring buffer instead of the kernel.
@@ -0,0 +1,436 @@
+"""
+Binary, pipelined protocol for the Pipe image processor
+
+consumer_image_processor in 3_exchanging_objects_pipes.py gets string commands ('resize', 'greyscale') and
+answers with nested dicts. conn.send()/conn.recv() pickle every message, so an image inside a dict is copied
+into a pickle and out of it again on both ends, and a new bytes object is allocated for every message. And
+the parent waits for each reply before it sends the next command: one request in flight, the pipe sits idle
+while the worker computes and the worker sits idle while the parent reads.
+
+The protocol here:-
+- Every message is a fixed 20 byte header (struct "!IBBHHHHHI": request id, opcode, status, channels, width,
+  height, two opcode arguments, payload length) followed by the raw pixels. No pickling at all.
+- Both sides receive into buffers allocated once (max_payload bytes), not into a new bytes object per
+  message. A reply payload is a memoryview into the client's buffer: valid until the next reply is read,
+  copy it (bytes(view)) to keep it.
+- Connection.send_bytes/recv_bytes_into can carry these frames (FrameChannel(conn, raw=False)), but
+  recv_bytes_into reads the whole message into an io.BytesIO first and copies it into the buffer after that.
+  So by default FrameChannel writes header + payload with one os.writev on the connection's file descriptor
+  and reads them with readinto straight into the preallocated buffers: the only copies left are the ones the
+  kernel makes.
+- Request ids: the client numbers its requests and every reply carries the id of its request, so replies can
+  be matched to requests while several are in flight.
+- Pipelining: ImageClient.pipeline() sends the requests from a sender thread while the calling thread reads the
+  replies. At most `window` requests are in flight. Sending and receiving in the same thread would deadlock
+  with big payloads: the client blocks writing a request into a full pipe while the worker blocks writing a
+  reply the client isn't reading.
+
+Images are raw interleaved pixels (channels bytes per pixel). OP_GREYSCALE keeps one channel (green, a cheap
+approximation of luminance), OP_RESIZE scales down by an integer factor with nearest neighbour sampling.
+Both are slice copies that run in C, the point here is the transport, not the image processing.
+"""
+
+import os
+import statistics
+import struct
+import threading
+import time
+from multiprocessing import Pipe, Process
+
+_HEADER = struct.Struct("!IBBHHHHHI")
+
+OP_EXIT, OP_RESIZE, OP_GREYSCALE = 0, 1, 2
+STATUS_OK, STATUS_BAD_REQUEST, STATUS_TOO_LARGE = 0, 1, 2
+
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+
+class Message:
+    __slots__ = ("request_id", "op", "status", "channels", "width", "height", "arg1", "arg2", "payload")
+
+    def __init__(self, request_id, op, status, channels, width, height, arg1, arg2, payload):
+        self.request_id = request_id
+        self.op = op
+        self.status = status
+        self.channels = channels
+        self.width = width
+        self.height = height
+        self.arg1 = arg1
+        self.arg2 = arg2
+        self.payload = payload  # memoryview into the receiver's buffer
+
+
+class PayloadTooLarge(ValueError):
+    def __init__(self, request_id, op, length, limit):
+        super().__init__(f"payload of {length} bytes is over the {limit} byte buffer")
+        self.request_id = request_id
+        self.op = op
+
+
+class FrameChannel:
+    """
+    Messages on one end of a Pipe. raw=True writes and reads the frames on the connection's file descriptor
+    (os.writev, FileIO.readinto), raw=False goes through conn.send_bytes / conn.recv_bytes_into.
+    """
+    def __init__(self, conn, raw=True):
+        self.conn = conn
+        self.raw = raw
+        self._header_buf = bytearray(_HEADER.size)
+        if raw:
+            self._fd = conn.fileno()
+            self._file = open(self._fd, "rb", buffering=0, closefd=False)
+
+    def send(self, request_id, op, status=STATUS_OK, channels=0, width=0, height=0, arg1=0, arg2=0,
+             payload=b""):
+        header = _HEADER.pack(request_id, op, status, channels, width, height, arg1, arg2, len(payload))
+        if not self.raw:
+            self.conn.send_bytes(header)
+            if len(payload):
+                self.conn.send_bytes(payload)
+            return
+        # header and payload in one system call, no copy of the payload into a bigger buffer
+        views = [memoryview(header)]
+        if len(payload):
+            views.append(memoryview(payload).cast("B"))
+        while views:
+            written = os.writev(self._fd, views)
+            while views and written >= views[0].nbytes:
+                written -= views[0].nbytes
+                views.pop(0)
+            if written:
+                views[0] = views[0][written:]
+
+    def _read_exact(self, view):
+        while view.nbytes:
+            n = self._file.readinto(view)
+            if not n:
+                raise EOFError
+            view = view[n:]
+
+    def recv(self, payload_buf):
+        """
+        Reads one message, the payload into payload_buf. Raises EOFError when the other end is closed and
+        PayloadTooLarge (after skipping the payload) when it doesn't fit.
+        """
+        if self.raw:
+            self._read_exact(memoryview(self._header_buf))
+        else:
+            self.conn.recv_bytes_into(self._header_buf)
+        request_id, op, status, channels, width, height, arg1, arg2, length = _HEADER.unpack(self._header_buf)
+        if length > len(payload_buf):
+            # read and drop it, so the next header is read from the right place
+            if self.raw:
+                remaining = length
+                while remaining:
+                    chunk = min(remaining, len(payload_buf))
+                    self._read_exact(memoryview(payload_buf)[:chunk])
+                    remaining -= chunk
+            else:
+                self.conn.recv_bytes()
+            raise PayloadTooLarge(request_id, op, length, len(payload_buf))
+        payload = memoryview(payload_buf)[:length]
+        if length:
+            if self.raw:
+                self._read_exact(payload)
+            else:
+                self.conn.recv_bytes_into(payload_buf)
+        return Message(request_id, op, status, channels, width, height, arg1, arg2, payload)
+
+    def close(self):
+        if self.raw:
+            self._file.close()
+        self.conn.close()
+
+
+# --- worker side ---
+def greyscale(src, out, width, height, channels):
+    """One byte per pixel: the green channel (or the only one). Returns the number of bytes written."""
+    pixels = width * height
+    out[:pixels] = src[min(1, channels - 1):pixels * channels:channels]
+    return pixels
+
+def resize(src, out, width, height, channels, new_width, new_height):
+    """Nearest neighbour downscale by an integer factor. Returns the number of bytes written."""
+    if new_width <= 0 or new_height <= 0:
+        raise ValueError(f"can't resize to {new_width}x{new_height}")
+    step = width // new_width
+    if step < 1 or width != new_width * step or height != new_height * step:
+        raise ValueError(f"can only scale {width}x{height} down by an integer factor, not to "
+                         f"{new_width}x{new_height}")
+    row_in, row_out = width * channels, new_width * channels
+    for y in range(new_height):
+        row = src[y * step * row_in:(y * step + 1) * row_in]
+        base = y * row_out
+        for c in range(channels):
+            out[base + c:base + row_out:channels] = row[c::step * channels]
+    return new_height * row_out
+
+def binary_image_processor(conn, max_payload=MAX_PAYLOAD, raw=True, extra_ops=None):
+    """extra_ops: {opcode: fn(src, out, msg) -> (bytes written, channels, width, height)} for more operations."""
+    channel = FrameChannel(conn, raw)
+    in_buf = bytearray(max_payload)
+    out_buf = bytearray(max_payload)
+    try:
+        while True:
+            try:
+                msg = channel.recv(in_buf)
+            except EOFError:
+                break
+            except PayloadTooLarge as e:
+                channel.send(e.request_id, e.op, STATUS_TOO_LARGE, payload=str(e).encode())
+                continue
+            if msg.op == OP_EXIT:
+                break
+            try:
+                if msg.width * msg.height * msg.channels != len(msg.payload):
+                    raise ValueError("payload size doesn't match width * height * channels")
+                # in_buf itself, not msg.payload: a strided slice of a bytearray is a fast C copy, the same
+                # slice assigned from a memoryview is not
+                if msg.op == OP_GREYSCALE:
+                    n = greyscale(in_buf, out_buf, msg.width, msg.height, msg.channels)
+                    channel.send(msg.request_id, msg.op, STATUS_OK, 1, msg.width, msg.height,
+                                 payload=memoryview(out_buf)[:n])
+                elif msg.op == OP_RESIZE:
+                    n = resize(in_buf, out_buf, msg.width, msg.height, msg.channels, msg.arg1, msg.arg2)
+                    channel.send(msg.request_id, msg.op, STATUS_OK, msg.channels, msg.arg1, msg.arg2,
+                                 payload=memoryview(out_buf)[:n])
+                elif extra_ops and msg.op in extra_ops:
+                    n, channels, width, height = extra_ops[msg.op](in_buf, out_buf, msg)
+                    channel.send(msg.request_id, msg.op, STATUS_OK, channels, width, height,
+                                 payload=memoryview(out_buf)[:n])
+                else:
+                    raise ValueError(f"unknown opcode {msg.op}")
+            except Exception as e:  # a bad request gets an error reply, it must not take the worker down
+                channel.send(msg.request_id, msg.op, STATUS_BAD_REQUEST, payload=(str(e) or repr(e)).encode())
+    finally:
+        channel.close()
+
+
+# --- client side ---
+class ImageClient:
+    def __init__(self, conn, max_payload=MAX_PAYLOAD, raw=True):
+        self.channel = FrameChannel(conn, raw)
+        self.max_payload = max_payload
+        self._reply_buf = bytearray(max_payload)
+        self._next_id = 0
+
+    def _send(self, op, image, channels, width, height, arg1=0, arg2=0):
+        if len(image) > self.max_payload:
+            raise ValueError(f"image of {len(image)} bytes is over max_payload {self.max_payload}")
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        self.channel.send(self._next_id, op, STATUS_OK, channels, width, height, arg1, arg2, image)
+        return self._next_id
+
+    def _recv(self):
+        return self.channel.recv(self._reply_buf)
+
+    def request(self, op, image, channels, width, height, arg1=0, arg2=0):
+        """One request, one reply. The reply payload is only valid until the next reply is read."""
+        request_id = self._send(op, image, channels, width, height, arg1, arg2)
+        reply = self._recv()
+        if reply.request_id != request_id:
+            raise RuntimeError(f"got the reply to request {reply.request_id}, expected {request_id}")
+        return reply
+
+    def pipeline(self, requests, on_reply, window=8):
+        """
+        Sends every (op, image, channels, width, height, arg1, arg2) of `requests` with at most `window` in
+        flight, and calls on_reply(index, reply) for every reply, on the calling thread.
+
+        If a send fails, nothing more is sent, the replies to what was sent are still passed to on_reply and
+        then the error is raised. If on_reply raises, nothing more is sent either, the replies still on their
+        way are read and dropped (so the client can be used again) and the error is raised.
+        """
+        slots = threading.Semaphore(window)
+        sent = {}  # request id -> index in requests
+        cond = threading.Condition()
+        in_flight = 0  # sent completely and not answered yet, the replies the reader can wait for
+        sender_done = False
+        stop = False
+        failure = []  # of the sender
+        reply_error = None
+
+        def sender():
+            nonlocal in_flight, sender_done
+            try:
+                for index, request in enumerate(requests):
+                    slots.acquire()
+                    if stop:
+                        break
+                    op, image, channels, width, height, arg1, arg2 = request
+                    with cond:
+                        # registered before it is sent, the reply can't overtake it
+                        self._next_id = request_id = (self._next_id + 1) & 0xFFFFFFFF
+                        sent[request_id] = index
+                    try:
+                        self.channel.send(request_id, op, STATUS_OK, channels, width, height, arg1, arg2, image)
+                    except BaseException:
+                        with cond:
+                            del sent[request_id]
+                        raise
+                    with cond:
+                        in_flight += 1
+                        cond.notify()
+            except BaseException as e:
+                failure.append(e)
+            finally:
+                with cond:
+                    sender_done = True
+                    cond.notify()
+
+        thread = threading.Thread(target=sender, daemon=True)
+        thread.start()
+        try:
+            while True:
+                with cond:
+                    while not in_flight and not sender_done:
+                        cond.wait()
+                    if not in_flight:
+                        break
+                reply = self._recv()
+                with cond:
+                    in_flight -= 1
+                    index = sent.pop(reply.request_id)
+                slots.release()
+                if reply_error is None:
+                    try:
+                        on_reply(index, reply)
+                    except BaseException as e:
+                        reply_error = e
+                        stop = True
+        except BaseException:
+            stop = True
+            slots.release()  # a sender waiting for a slot sees stop and ends
+            raise
+        thread.join()
+        if reply_error is not None:
+            raise reply_error
+        if failure:
+            raise failure[0]
+
+    def close(self):
+        self.channel.send(0, OP_EXIT)
+        self.channel.close()
+
+
+# --- the current protocol, as in 3_exchanging_objects_pipes.py but carrying the image ---
+def pickled_image_processor(conn):
+    try:
+        while True:
+            command = conn.recv()
+            if command == 'exit':
+                break
+            width, height, channels = command['width'], command['height'], command['channels']
+            src = command['image']
+            out = bytearray(width * height * channels)
+            if command['command'] == 'resize':
+                new_width, new_height = command['size']
+                n = resize(src, out, width, height, channels, new_width, new_height)
+            else:
+                n = greyscale(src, out, width, height, channels)
+            conn.send({'success': {
+                'status': 'success',
+                'message': f"image {command['command']} successfully",
+                'data': bytes(out[:n]),
+            }})
+    except EOFError:
+        pass
+    finally:
+        conn.close()
+
+
+# --- Benchmark: pickled dicts, one at a time vs binary frames, one at a time and pipelined ---
+def _make_image(width, height, channels=3):
+    return bytes(range(256)) * (width * height * channels // 256) + bytes(width * height * channels % 256)
+
+def _bench_pickled(image, width, height, rounds):
+    parent_conn, child_conn = Pipe()
+    worker = Process(target=pickled_image_processor, args=(child_conn,))
+    worker.start()
+    command = {'command': 'resize', 'image': image, 'width': width, 'height': height, 'channels': 3,
+               'size': (width // 2, height // 2)}
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        sent_at = time.perf_counter()
+        parent_conn.send(command)
+        reply = parent_conn.recv()
+        latencies.append(time.perf_counter() - sent_at)
+        moved = len(reply['success']['data'])
+    elapsed = time.perf_counter() - start
+    parent_conn.send('exit')
+    worker.join()
+    return elapsed, latencies, moved
+
+def _bench_binary(image, width, height, rounds, window, raw=True):
+    parent_conn, child_conn = Pipe()
+    worker = Process(target=binary_image_processor, args=(child_conn, len(image), raw))
+    worker.start()
+    client = ImageClient(parent_conn, len(image), raw)
+    request = (OP_RESIZE, image, 3, width, height, width // 2, height // 2)
+    latencies = []
+    moved = 0
+    start = time.perf_counter()
+    if window == 1:
+        for _ in range(rounds):
+            sent_at = time.perf_counter()
+            reply = client.request(*request)
+            latencies.append(time.perf_counter() - sent_at)
+            moved = len(reply.payload)
+    else:
+        def on_reply(index, reply):
+            nonlocal moved
+            moved = len(reply.payload)
+        client.pipeline([request] * rounds, on_reply, window)
+    elapsed = time.perf_counter() - start
+    client.close()
+    worker.join()
+    return elapsed, latencies, moved
+
+def run_benchmark(sizes=((128, 128), (512, 512), (1024, 1024)), rounds=200):
+    print(f"{'image':>14} {'protocol':>28} {'round trips/s':>14} {'p50 ms':>8} {'p99 ms':>8} {'MB/s':>8}")
+    for width, height in sizes:
+        image = _make_image(width, height)
+        label = f"{width}x{height} RGB"
+        for name, run in (
+            ("pickled dicts", lambda: _bench_pickled(image, width, height, rounds)),
+            ("binary, recv_bytes_into", lambda: _bench_binary(image, width, height, rounds, 1, raw=False)),
+            ("binary, raw fd", lambda: _bench_binary(image, width, height, rounds, 1)),
+            ("binary, raw fd, window 8", lambda: _bench_binary(image, width, height, rounds, 8)),
+        ):
+            elapsed, latencies, reply_bytes = run()
+            mb = rounds * (len(image) + reply_bytes) / 1e6  # request + reply payloads
+            if latencies:
+                latencies.sort()
+                p50 = f"{statistics.median(latencies) * 1000:.2f}"
+                p99 = f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f}"
+            else:
+                p50 = p99 = "-"  # pipelined: round trips overlap, the throughput is the number
+            print(f"{label:>14} {name:>28} {rounds / elapsed:>14.0f} {p50:>8} {p99:>8} {mb / elapsed:>8.1f}")
+
+
+if __name__ == '__main__':
+    print(f"[{os.getpid()}] Main process started.")
+    parent_conn, child_conn = Pipe()
+    child_p = Process(target=binary_image_processor, args=(child_conn, 1024 * 1024))
+    child_p.start()
+
+    client = ImageClient(parent_conn, 1024 * 1024)
+    width, height = 64, 48
+    image = _make_image(width, height)
+    try:
+        reply = client.request(OP_RESIZE, image, 3, width, height, 32, 24)
+        print(f"[{os.getpid()}] request {reply.request_id}: resized to {reply.width}x{reply.height}, "
+              f"{len(reply.payload)} bytes")
+        reply = client.request(OP_GREYSCALE, image, 3, width, height)
+        print(f"[{os.getpid()}] request {reply.request_id}: greyscale {reply.width}x{reply.height}, "
+              f"{len(reply.payload)} bytes")
+        reply = client.request(OP_RESIZE, image, 3, width, height, 30, 20)
+        print(f"[{os.getpid()}] request {reply.request_id}: status {reply.status}, {bytes(reply.payload).decode()}")
+    finally:
+        print(f"\n[{os.getpid()}] Sending exit to worker...")
+        client.close()
+        child_p.join()
+
+    print("\nBenchmark: pickled dicts vs binary frames (resize to half size)")
+    run_benchmark()
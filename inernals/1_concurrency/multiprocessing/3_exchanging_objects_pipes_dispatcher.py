@@ -0,0 +1,289 @@
+"""
+Dispatcher over a pool of Pipe workers
+
+3_exchanging_objects_pipes.py has one consumer_image_processor child, so all image work runs on one core no
+matter how many the machine has. Dispatcher starts N workers (the binary_image_processor of
+3_exchanging_objects_pipes_binary.py, each on its own Pipe) and spreads the requests over them:-
+- Routing: a request goes to the least loaded worker, the one with the fewest requests in flight. A worker
+  stuck on a slow request stops getting new ones while the others drain theirs.
+- Request ids: ids are unique across the pool, every worker keeps a table request id -> (Future, sent at).
+  Replies complete their Future whatever order they arrive in, between workers and within one.
+- One receiver thread waits on all worker connections at once with multiprocessing.connection.wait() and reads
+  whichever reply is ready. Submitting threads only ever write; as the receiver always keeps reading, a worker
+  never stays blocked on a reply and a submit blocked on a full pipe always gets to continue (backpressure,
+  no deadlock).
+- metrics(): per worker queue depth (requests in flight), completed requests and p50/p99 latency
+  (submit to reply, the last 1000 requests).
+- A Future cancelled by the caller is skipped when its reply arrives. A reply the receiver can't match to a
+  request is dropped (and counted), it doesn't stop the receiver.
+- A worker that exits fails the Futures of its requests in flight and is replaced by a new one, until
+  close(). A bad request doesn't end a worker (it gets a STATUS_BAD_REQUEST reply), a crash does.
+
+A reply payload is copied out of the worker's receive buffer into bytes, a Future can outlive the next reply.
+
+With CPU bound operations (the pure Python box blur below) the throughput scales with the number of cores,
+as long as there are enough requests in flight to keep every worker busy (at least one per worker).
+"""
+
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from importlib.util import module_from_spec, spec_from_file_location
+from multiprocessing import get_context
+from multiprocessing.connection import wait
+
+_spec = spec_from_file_location("pipes_binary", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                             "3_exchanging_objects_pipes_binary.py"))
+_binary = module_from_spec(_spec)
+sys.modules["pipes_binary"] = _binary
+_spec.loader.exec_module(_binary)
+FrameChannel = _binary.FrameChannel
+ImageClient = _binary.ImageClient
+binary_image_processor = _binary.binary_image_processor
+MAX_PAYLOAD = _binary.MAX_PAYLOAD
+OP_EXIT, OP_RESIZE, OP_GREYSCALE = _binary.OP_EXIT, _binary.OP_RESIZE, _binary.OP_GREYSCALE
+STATUS_OK = _binary.STATUS_OK
+
+OP_BLUR = 3
+
+
+def box_blur(src, out, msg):
+    """3x3 box blur of the green channel in pure Python: a CPU bound operation (extra_ops handler)."""
+    width, height, channels = msg.width, msg.height, msg.channels
+    grey = src[min(1, channels - 1):width * height * channels:channels]
+    for y in range(height):
+        rows = [grey[row * width:(row + 1) * width] for row in range(max(0, y - 1), min(height, y + 2))]
+        columns = [sum(values) for values in zip(*rows)]  # vertical sums
+        base = y * width
+        for x in range(width):
+            left, right = max(0, x - 1), min(width, x + 2)
+            out[base + x] = sum(columns[left:right]) // ((right - left) * len(rows))
+    return width * height, 1, width, height
+
+EXTRA_OPS = {OP_BLUR: box_blur}
+
+
+class _Worker:
+    def __init__(self, index, process, channel, max_payload):
+        self.index = index
+        self.process = process
+        self.channel = channel
+        self.reply_buf = bytearray(max_payload)
+        self.send_lock = threading.Lock()
+        self.pending = {}  # request id -> (Future, sent at), guarded by Dispatcher._lock
+        self.completed = 0
+        self.bad_replies = 0  # replies with an unknown request id or that failed to complete their Future
+        self.latencies = deque(maxlen=1000)
+
+
+class Dispatcher:
+    def __init__(self, workers=None, max_payload=MAX_PAYLOAD, extra_ops=EXTRA_OPS, ctx=None):
+        self._ctx = ctx or get_context("fork")
+        self._max_payload = max_payload
+        self._extra_ops = extra_ops
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._closed = False
+        self._workers = [self._start_worker(index) for index in range(workers or os.cpu_count())]
+        self._all_workers = list(self._workers)  # including the ones that exited, for metrics()
+        self._receiver = threading.Thread(target=self._receive_loop, name="dispatcher-receiver", daemon=True)
+        self._receiver.start()
+
+    def _start_worker(self, index):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=binary_image_processor,
+                                    args=(child_conn, self._max_payload, True, self._extra_ops), daemon=True)
+        process.start()
+        child_conn.close()
+        return _Worker(index, process, FrameChannel(parent_conn), self._max_payload)
+
+    def submit(self, op, image, channels, width, height, arg1=0, arg2=0):
+        """Sends the request to the least loaded worker. Returns a Future of the reply Message."""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("cannot submit after close()")
+            if not self._workers:
+                raise RuntimeError("no workers left")
+            worker = min(self._workers, key=lambda w: len(w.pending))
+            self._next_id = request_id = (self._next_id + 1) & 0xFFFFFFFF
+            # registered before it is sent, the reply can't overtake it
+            worker.pending[request_id] = (future, time.perf_counter())
+        try:
+            with worker.send_lock:
+                worker.channel.send(request_id, op, STATUS_OK, channels, width, height, arg1, arg2, image)
+        except BaseException:
+            # never sent (struct.error for a field out of range, or a broken pipe): not in flight either
+            with self._lock:
+                worker.pending.pop(request_id, None)
+            raise
+        return future
+
+    def map(self, requests):
+        """Submits every (op, image, channels, width, height[, arg1, arg2]) and returns the replies in order."""
+        futures = [self.submit(*request) for request in requests]
+        return [future.result() for future in futures]
+
+    def _receive_loop(self):
+        by_conn = {w.channel.conn: w for w in self._workers}
+        while by_conn:
+            for conn in wait(list(by_conn)):
+                worker = by_conn[conn]
+                try:
+                    msg = worker.channel.recv(worker.reply_buf)
+                except (EOFError, OSError):
+                    del by_conn[conn]
+                    replacement = self._worker_exited(worker)
+                    if replacement is not None:
+                        by_conn[replacement.channel.conn] = replacement
+                    continue
+                try:
+                    self._complete(worker, msg)
+                except Exception as e:
+                    # one bad reply must not end the only receiver thread, every later Future would hang
+                    worker.bad_replies += 1
+                    print(f"dispatcher: dropped a reply of worker {worker.index}: {e!r}", file=sys.stderr)
+
+    def _complete(self, worker, msg):
+        with self._lock:
+            entry = worker.pending.pop(msg.request_id, None)
+        if entry is None:
+            raise KeyError(f"unknown request id {msg.request_id}")
+        future, sent_at = entry
+        worker.latencies.append(time.perf_counter() - sent_at)
+        worker.completed += 1
+        msg.payload = bytes(msg.payload)  # reply_buf is reused for the next reply
+        # False when the caller cancelled the Future, afterwards cancel() can't get in between
+        if future.set_running_or_notify_cancel():
+            future.set_result(msg)
+
+    def _worker_exited(self, worker):
+        """Fails the worker's requests in flight and, unless closing, starts its replacement (returned)."""
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            pending, worker.pending = worker.pending, {}
+            replacement = None
+            if not self._closed:
+                # under the lock, so close() either sees the replacement or it is never started
+                replacement = self._start_worker(len(self._all_workers))
+                self._workers.append(replacement)
+                self._all_workers.append(replacement)
+        worker.process.join()
+        for future, _ in pending.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError(f"worker {worker.index} (pid {worker.process.pid}) exited"))
+        return replacement
+
+    def metrics(self):
+        with self._lock:
+            depths = [len(w.pending) for w in self._all_workers]
+        rows = []
+        for worker, depth in zip(self._all_workers, depths):
+            latencies = sorted(worker.latencies)
+            p99_index = min(len(latencies) - 1, int(len(latencies) * 0.99))
+            rows.append({
+                "worker": worker.index,
+                "pid": worker.process.pid,
+                "alive": worker.process.is_alive(),
+                "queue_depth": depth,
+                "completed": worker.completed,
+                "bad_replies": worker.bad_replies,
+                "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+                "p99_ms": latencies[p99_index] * 1000 if latencies else None,
+            })
+        return rows
+
+    def close(self):
+        """Lets every worker finish the requests it has, then stops it."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers)
+        for worker in workers:
+            with worker.send_lock:
+                worker.channel.send(0, OP_EXIT)
+        self._receiver.join()
+        for worker in self._all_workers:
+            worker.process.join()
+            worker.channel.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def format_metrics(rows):
+    lines = [f"{'worker':>6} {'pid':>7} {'alive':>6} {'depth':>6} {'completed':>10} {'p50 ms':>8} {'p99 ms':>8}"]
+    for row in rows:
+        p50 = f"{row['p50_ms']:.2f}" if row["p50_ms"] is not None else "-"
+        p99 = f"{row['p99_ms']:.2f}" if row["p99_ms"] is not None else "-"
+        lines.append(f"{row['worker']:>6} {row['pid']:>7} {str(row['alive']):>6} {row['queue_depth']:>6} "
+                     f"{row['completed']:>10} {p50:>8} {p99:>8}")
+    return "\n".join(lines)
+
+
+# --- Benchmark: one worker, one request at a time vs the dispatcher with 1..N workers ---
+def _make_image(width, height, channels=3):
+    return bytes(range(256)) * (width * height * channels // 256) + bytes(width * height * channels % 256)
+
+def run_benchmark(width=128, height=128, requests=200, worker_counts=None):
+    worker_counts = worker_counts or sorted({1, 2, 4, os.cpu_count() or 1})
+    image = _make_image(width, height)
+    request = (OP_BLUR, image, 3, width, height)
+    print(f"{os.cpu_count()} CPUs, {requests} x box blur of {width}x{height} RGB")
+    print(f"{'variant':>28} {'seconds':>8} {'requests/s':>11} {'speedup':>8}")
+
+    # 3_exchanging_objects_pipes.py: one worker, the next request only after the reply
+    ctx = get_context("fork")
+    parent_conn, child_conn = ctx.Pipe()
+    worker = ctx.Process(target=binary_image_processor, args=(child_conn, len(image), True, EXTRA_OPS))
+    worker.start()
+    client = ImageClient(parent_conn, len(image))
+    start = time.perf_counter()
+    for _ in range(requests):
+        expected = bytes(client.request(*request).payload)
+    baseline = time.perf_counter() - start
+    client.close()
+    worker.join()
+    print(f"{'1 worker, one at a time':>28} {baseline:>8.2f} {requests / baseline:>11.1f} {1.0:>7.2f}x")
+
+    for count in worker_counts:
+        with Dispatcher(count, max_payload=len(image)) as dispatcher:
+            start = time.perf_counter()
+            replies = dispatcher.map([request] * requests)
+            elapsed = time.perf_counter() - start
+            metrics = dispatcher.metrics()
+        assert all(reply.payload == expected for reply in replies)
+        print(f"{f'dispatcher, {count} workers':>28} {elapsed:>8.2f} {requests / elapsed:>11.1f} "
+              f"{baseline / elapsed:>7.2f}x")
+    print(f"\nper worker metrics of the last run:\n{format_metrics(metrics)}")
+
+
+if __name__ == '__main__':
+    print(f"[{os.getpid()}] Main process started.")
+    width, height = 64, 48
+    image = _make_image(width, height)
+    with Dispatcher(workers=2, max_payload=len(image)) as dispatcher:
+        futures = [
+            dispatcher.submit(OP_RESIZE, image, 3, width, height, 32, 24),
+            dispatcher.submit(OP_GREYSCALE, image, 3, width, height),
+            dispatcher.submit(OP_BLUR, image, 3, width, height),
+            dispatcher.submit(OP_RESIZE, image, 3, width, height, 30, 20),
+        ]
+        for future in futures:
+            reply = future.result()
+            detail = f"{reply.width}x{reply.height}, {len(reply.payload)} bytes" if reply.status == STATUS_OK \
+                else reply.payload.decode()
+            print(f"[{os.getpid()}] request {reply.request_id}, op {reply.op}: status {reply.status}, {detail}")
+        print(format_metrics(dispatcher.metrics()))
+
+    print("\nBenchmark: one worker one request at a time vs dispatcher")
+    run_benchmark()
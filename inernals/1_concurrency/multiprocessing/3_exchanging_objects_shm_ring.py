@@ -0,0 +1,434 @@
+"""
+Single producer / single consumer ring buffer in shared memory
+
+Every message of Pipe (3_exchanging_objects_pipes.py) and Queue (3_exchanging_objects_1_queue.py) goes
+through the kernel: a write() system call that copies it into the pipe buffer and a read() that copies it out,
+plus waking up the reader. For a tick of 20 bytes that fixed cost is almost everything.
+
+ShmRing keeps the messages in a multiprocessing.shared_memory block both processes have mapped:-
+- Layout: a header with two counters, head (bytes ever written, only the producer writes it) and tail (bytes
+  ever read, only the consumer writes it), each on its own 64 byte cache line, then `capacity` bytes of data.
+  With exactly one writer per counter no lock is needed: the producer writes the record first and then moves
+  head, the consumer reads the record first and then moves tail.
+- Variable size records (send_bytes / recv_bytes, send / recv with pickle): a 4 byte length, the bytes, padded
+  to 8. A record that doesn't fit before the end of the buffer is preceded by a wrap marker and starts at 0.
+- Fixed size records (record_format, a struct format): send_record(*values) packs straight into the shared
+  memory with struct.pack_into, recv_record() unpacks from it, no bytes object in between.
+  send_records / recv_records move a whole batch and update head / tail once for it.
+- Waiting: the side that finds the ring empty (or full) first spins `spin` times re-reading the counter, then
+  sets a waiting flag and blocks on a multiprocessing.Semaphore that the other side releases when it sees the
+  flag. On a machine with one CPU spinning only burns the time slice the other process needs to make progress,
+  so spin defaults to 0 there.
+- Connection-like API: send/recv, send_bytes/recv_bytes/recv_bytes_into, poll, close. close() on either end
+  marks the ring closed, the consumer gets EOFError once it has read everything.
+
+Limits:-
+- One producer and one consumer. For more, use one ring per pair.
+- Python can't emit memory barriers. On x86-64 stores become visible in program order, so a consumer that sees
+  the new head also sees the record. On weakly ordered CPUs (ARM) that isn't guaranteed from Python code.
+  For the same reason a wakeup can be lost in a narrow race (flag and counter read in the other order), so
+  the blocking wait is a loop of `block_timeout` waits: a lost wakeup costs at most that long.
+"""
+
+import os
+import pickle
+import statistics
+import struct
+import time
+from importlib.util import module_from_spec, spec_from_file_location
+from multiprocessing import BufferTooShort, Process, get_context, shared_memory
+from multiprocessing.context import assert_spawning
+
+_spec = spec_from_file_location("pool_shared_memory", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                   "4_pool_shared_memory.py"))
+_pool_shared_memory = module_from_spec(_spec)
+_spec.loader.exec_module(_pool_shared_memory)
+_attach_untracked = _pool_shared_memory._attach_untracked
+
+_HEADER = 256
+# indexes into the header viewed as unsigned 64 bit ints, each counter on its own cache line
+_HEAD, _TAIL, _READER_WAITING, _WRITER_WAITING, _CLOSED = 0, 8, 16, 24, 25
+_LENGTH = struct.Struct("<I")
+_WRAP = 0xFFFFFFFF
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+class ShmRing:
+    def __init__(self, capacity=1 << 20, record_format=None, spin=None, block_timeout=0.01, ctx=None):
+        ctx = ctx or get_context()
+        self.record = struct.Struct(record_format) if record_format else None
+        if self.record is not None:
+            slot = _align(self.record.size)
+            capacity = max(slot, capacity // slot * slot)  # whole slots only, a record never wraps
+        else:
+            capacity = _align(capacity)
+        self.capacity = capacity
+        self.spin = spin if spin is not None else (0 if (os.cpu_count() or 1) == 1 else 2000)
+        self.block_timeout = block_timeout
+        self.shm = shared_memory.SharedMemory(create=True, size=_HEADER + capacity)
+        self.shm.buf[:_HEADER] = bytes(_HEADER)
+        self._data_ready = ctx.Semaphore(0)
+        self._space_ready = ctx.Semaphore(0)
+        self._owner_pid = os.getpid()  # a forked child gets a copy of this object, only the creator unlinks
+        self._setup()
+
+    def _setup(self):
+        self._buf = self.shm.buf
+        self._counters = self.shm.buf[:_HEADER].cast("Q")
+        self._slot = _align(self.record.size) if self.record is not None else 0
+        # each side keeps its own counter locally and a cached copy of the other side's
+        self._head = self._counters[_HEAD]
+        self._tail = self._counters[_TAIL]
+        self._seen_head = self._head
+        self._seen_tail = self._tail
+
+    def __getstate__(self):
+        # like a multiprocessing.Queue, only passed to a process as an argument (spawn / forkserver)
+        assert_spawning(self)
+        return (self.shm.name, self.capacity, self.record.format if self.record else None, self.spin,
+                self.block_timeout, self._data_ready, self._space_ready)
+
+    def __setstate__(self, state):
+        name, self.capacity, record_format, self.spin, self.block_timeout, self._data_ready, self._space_ready = state
+        self.record = struct.Struct(record_format) if record_format else None
+        self.shm = _attach_untracked(name)
+        self._owner_pid = None
+        self._setup()
+
+    # --- waiting ---
+    def _wait(self, ready, flag, semaphore, timeout):
+        """Spins, then blocks until ready() is true. Raises TimeoutError or, when closed and not ready, EOFError."""
+        counters = self._counters
+        for _ in range(self.spin):
+            if ready():
+                return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            counters[flag] = 1
+            if ready():  # re-check after raising the flag, the other side may have missed it
+                counters[flag] = 0
+                return
+            if counters[_CLOSED]:
+                counters[flag] = 0
+                raise EOFError("ring buffer closed")
+            wait = self.block_timeout
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    counters[flag] = 0
+                    raise TimeoutError
+            semaphore.acquire(True, wait)
+
+    def _wake(self, flag, semaphore):
+        if self._counters[flag]:
+            self._counters[flag] = 0
+            semaphore.release()
+
+    # --- producer side ---
+    def _reserve(self, size):
+        """Waits until `size` more bytes fit after self._head."""
+        if self._head + size - self._seen_tail <= self.capacity:
+            return
+        self._seen_tail = self._counters[_TAIL]
+        if self._head + size - self._seen_tail <= self.capacity:
+            return
+        self._publish()  # records written but not published yet would never be read otherwise
+
+        def has_space():
+            self._seen_tail = self._counters[_TAIL]
+            return self._head + size - self._seen_tail <= self.capacity
+
+        self._wait(has_space, _WRITER_WAITING, self._space_ready, None)
+
+    def _publish(self):
+        if self._counters[_HEAD] != self._head:
+            self._counters[_HEAD] = self._head
+            self._wake(_READER_WAITING, self._data_ready)
+
+    def send_bytes(self, data):
+        if self.record is not None:
+            raise ValueError("a ring with record_format carries fixed records, use send_record")
+        n = len(data)
+        size = _align(_LENGTH.size + n)
+        if size > self.capacity:
+            raise ValueError(f"a message of {n} bytes doesn't fit in a ring of {self.capacity} bytes")
+        pos = self._head % self.capacity
+        if pos + size > self.capacity:
+            # skip + size may be more than the whole ring: publish the wrap marker first, the consumer
+            # frees the skipped end once it reads it
+            skip = self.capacity - pos
+            self._reserve(skip)
+            _LENGTH.pack_into(self._buf, _HEADER + pos, _WRAP)
+            self._head += skip
+            self._publish()
+            pos = 0
+        self._reserve(size)
+        start = _HEADER + pos
+        _LENGTH.pack_into(self._buf, start, n)
+        self._buf[start + _LENGTH.size:start + _LENGTH.size + n] = data
+        self._head += size
+        self._publish()
+
+    def send(self, obj):
+        self.send_bytes(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def send_record(self, *values):
+        self._reserve(self._slot)
+        self.record.pack_into(self._buf, _HEADER + self._head % self.capacity, *values)
+        self._head += self._slot
+        self._publish()
+
+    def send_records(self, records):
+        """Writes every tuple of `records`, head is published once at the end (or when the ring is full)."""
+        slot, pack_into, buf, capacity = self._slot, self.record.pack_into, self._buf, self.capacity
+        for values in records:
+            if self._head + slot - self._seen_tail > capacity:
+                self._reserve(slot)
+            pack_into(buf, _HEADER + self._head % capacity, *values)
+            self._head += slot
+        self._publish()
+
+    # --- consumer side ---
+    def _has_data(self):
+        self._seen_head = self._counters[_HEAD]
+        return self._seen_head != self._tail
+
+    def _await_data(self, timeout=None):
+        if self._seen_head == self._tail and not self._has_data():
+            self._wait(self._has_data, _READER_WAITING, self._data_ready, timeout)
+
+    def _consume(self, size):
+        self._tail += size
+        self._counters[_TAIL] = self._tail
+        self._wake(_WRITER_WAITING, self._space_ready)
+
+    def _await_record(self, timeout):
+        """Waits for the next record and returns its position, consuming a wrap marker on the way."""
+        while True:
+            self._await_data(timeout)
+            pos = self._tail % self.capacity
+            if self.record is not None or _LENGTH.unpack_from(self._buf, _HEADER + pos)[0] != _WRAP:
+                return pos
+            # the record itself may not be written yet: the producer waits for this space to write it
+            self._consume(self.capacity - pos)
+
+    def _next_record(self, timeout):
+        pos = self._await_record(timeout)
+        n, = _LENGTH.unpack_from(self._buf, _HEADER + pos)
+        return _HEADER + pos + _LENGTH.size, n
+
+    def recv_bytes(self, timeout=None):
+        start, n = self._next_record(timeout)
+        data = bytes(self._buf[start:start + n])
+        self._consume(_align(_LENGTH.size + n))
+        return data
+
+    def recv_bytes_into(self, buffer, timeout=None):
+        """Like Connection.recv_bytes_into: a message too big for buffer is consumed and raised as BufferTooShort."""
+        start, n = self._next_record(timeout)
+        with memoryview(buffer) as view:
+            if n > view.nbytes:
+                data = bytes(self._buf[start:start + n])
+                self._consume(_align(_LENGTH.size + n))
+                raise BufferTooShort(data)
+            view[:n] = self._buf[start:start + n]
+        self._consume(_align(_LENGTH.size + n))
+        return n
+
+    def recv(self, timeout=None):
+        return pickle.loads(self.recv_bytes(timeout))
+
+    def recv_record(self, timeout=None):
+        self._await_data(timeout)
+        values = self.record.unpack_from(self._buf, _HEADER + self._tail % self.capacity)
+        self._consume(self._slot)
+        return values
+
+    def recv_records(self, max_records=None, timeout=None):
+        """Every record available now (at least one, waits for it), tail is moved once for all of them."""
+        self._await_data(timeout)
+        self._has_data()  # the latest head, not the one cached at the last wait
+        count = (self._seen_head - self._tail) // self._slot
+        if max_records is not None:
+            count = min(count, max_records)
+        slot, unpack_from, buf, capacity, tail = self._slot, self.record.unpack_from, self._buf, self.capacity, \
+            self._tail
+        records = [unpack_from(buf, _HEADER + (tail + i * slot) % capacity) for i in range(count)]
+        self._consume(count * slot)
+        return records
+
+    def poll(self, timeout=0.0):
+        try:
+            self._await_record(timeout)
+            return True
+        except (TimeoutError, EOFError):
+            return False
+
+    # --- both ---
+    def close(self):
+        """Marks the ring closed: the consumer reads what is left, then gets EOFError."""
+        if self._counters is None:
+            return
+        if self._head > self._counters[_HEAD]:  # only the producer's own head can be ahead of the shared one
+            self._publish()
+        self._counters[_CLOSED] = 1
+        self._data_ready.release()
+        self._space_ready.release()
+        self._counters.release()
+        self._counters = None
+        self._buf = None
+        self.shm.close()
+        if self._owner_pid == os.getpid():
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Benchmark: Pipe vs ShmRing, throughput and round trip latency of small messages ---
+TICK = "<dqi"  # timestamp, price in ticks, size: a 20 byte record
+
+def _pipe_sender(conn, count, payload):
+    for _ in range(count):
+        conn.send_bytes(payload)
+    conn.send_bytes(b"")
+    conn.close()
+
+def _ring_sender(ring, count, payload):
+    for _ in range(count):
+        ring.send_bytes(payload)
+    ring.send_bytes(b"")
+    ring.close()
+
+def _ring_record_sender(ring, count, batch):
+    tick = (1.5, 1_000_000, 100)
+    if batch == 1:
+        for _ in range(count):
+            ring.send_record(*tick)
+    else:
+        for sent in range(0, count, batch):
+            ring.send_records([tick] * min(batch, count - sent))
+    ring.close()
+
+def _throughput(name, make, target, count, receive):
+    ctx = get_context("fork")
+    recv_end, send_end, args = make(ctx)
+    producer = ctx.Process(target=target, args=(send_end,) + args)
+    start = time.perf_counter()
+    producer.start()
+    received = receive(recv_end)
+    elapsed = time.perf_counter() - start
+    producer.join()
+    recv_end.close()
+    print(f"{name:>36} {count / elapsed:>14,.0f} {str(received == count):>9}")
+
+def _count_until_empty(conn):
+    received = 0
+    while conn.recv_bytes():
+        received += 1
+    return received
+
+def _count_records(ring):
+    received = 0
+    try:
+        while True:
+            received += len(ring.recv_records())
+    except EOFError:
+        return received
+
+def _count_record(ring):
+    received = 0
+    try:
+        while True:
+            ring.recv_record()
+            received += 1
+    except EOFError:
+        return received
+
+def _pipe_echo(conn):
+    while True:
+        data = conn.recv_bytes()
+        if not data:
+            break
+        conn.send_bytes(data)
+
+def _ring_echo(requests, replies):
+    while True:
+        data = requests.recv_bytes()
+        if not data:
+            break
+        replies.send_bytes(data)
+    replies.close()
+
+def _latency(name, send, recv, rounds, payload):
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        send(payload)
+        recv()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"{name:>36} {statistics.median(latencies) * 1e6:>10.1f} {latencies[int(rounds * 0.99)] * 1e6:>10.1f}")
+
+def run_benchmark(count=200_000, rounds=20_000):
+    payload = struct.pack(TICK, 1.5, 1_000_000, 100)
+    print(f"{os.cpu_count()} CPUs, {len(payload)} byte messages, spin "
+          f"{'off (1 CPU)' if (os.cpu_count() or 1) == 1 else 'on'}")
+    print(f"{'throughput':>36} {'messages/s':>14} {'all seen':>9}")
+    _throughput("Pipe send_bytes/recv_bytes",
+                lambda ctx: (*ctx.Pipe(duplex=False), (count, payload)), _pipe_sender, count, _count_until_empty)
+
+    def ring(ctx, **options):
+        r = ShmRing(1 << 20, ctx=ctx, **options)
+        return r, r
+
+    _throughput("ShmRing send_bytes/recv_bytes", lambda ctx: (*ring(ctx), (count, payload)), _ring_sender, count,
+                _count_until_empty)
+    _throughput("ShmRing send_record/recv_record", lambda ctx: (*ring(ctx, record_format=TICK), (count, 1)),
+                _ring_record_sender, count, _count_record)
+    _throughput("ShmRing send_records/recv_records 256", lambda ctx: (*ring(ctx, record_format=TICK), (count, 256)),
+                _ring_record_sender, count, _count_records)
+
+    print(f"\n{'round trip latency':>36} {'p50 us':>10} {'p99 us':>10}")
+    ctx = get_context("fork")
+    parent_conn, child_conn = ctx.Pipe()
+    echo = ctx.Process(target=_pipe_echo, args=(child_conn,))
+    echo.start()
+    _latency("Pipe", parent_conn.send_bytes, parent_conn.recv_bytes, rounds, payload)
+    parent_conn.send_bytes(b"")
+    echo.join()
+
+    requests, replies = ShmRing(1 << 16, ctx=ctx), ShmRing(1 << 16, ctx=ctx)
+    echo = ctx.Process(target=_ring_echo, args=(requests, replies))
+    echo.start()
+    _latency("ShmRing pair", requests.send_bytes, replies.recv_bytes, rounds, payload)
+    requests.send_bytes(b"")
+    echo.join()
+    requests.close()
+    replies.close()
+
+
+if __name__ == '__main__':
+    def consumer(ring):
+        try:
+            while True:
+                print(f"[{os.getpid()}] received {ring.recv()}")
+        except EOFError:
+            print(f"[{os.getpid()}] producer closed the ring.")
+
+    ring = ShmRing(4096)
+    child = Process(target=consumer, args=(ring,))
+    child.start()
+    for command in ("resize", {"op": "greyscale", "size": (64, 48)}, b"raw bytes"):
+        ring.send(command)
+    ring.close()
+    child.join()
+
+    print("\nBenchmark: Pipe vs shared memory ring buffer")
+    run_benchmark()
@@ -111,4 +111,10 @@ if __name__ == '__main__':
     
     print(f"\nFound {len(prime_numbers)} primes between {start_num} and {end_num}.")
     print(f"Total time taken: {end_time - start_time:.4f} seconds.")
-    print("First 10 primes:", prime_numbers[:10])
\ No newline at end of file
+    print("First 10 primes:", prime_numbers[:10])
+
+# every number is pickled, trial divided and sent back on its own here, see 4_pool_sieve.py for a segmented
+# sieve that sends each worker a range and gets back a count or a bitset, and 4_pool_shared_memory.py for
+# writing map results into a shared memory block instead of pickling them back. The default chunksize cuts the
+# input into equal counts although the last numbers cost the most, see 4_pool_guided.py for chunks sized by
+# measured cost
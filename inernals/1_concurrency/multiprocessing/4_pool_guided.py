@@ -0,0 +1,269 @@
+"""
+Adaptive chunk sizes and guided scheduling for Pool.map
+
+pool.map(is_prime, numbers_to_check) in 4_pool_1.py uses the default chunksize: the input is cut into about
+4 * processes equal chunks by *count*. The cost of is_prime grows with the number, so the chunks at the end are
+the heaviest, and they are also handed out last: the other workers run out of work and sit idle while one worker
+finishes the last heavy chunk (the straggler).
+
+guided_map() chooses the chunks from measured cost instead:-
+1. Overhead: a few empty round trips through the pool measure what one task costs by itself. A chunk has to
+   take at least `overhead_ratio` times that, so the IPC overhead stays a small part of the total.
+2. Sampling: `samples` small blocks of consecutive items, spread evenly over the input, are timed in the
+   workers (a block rather than a single item, so one cheap even number doesn't fool it). Between two sample
+   points the cost per item is taken as their average, which gives a cost profile over the whole input (it
+   sees that the end of a skewed input is more expensive). The sampled results are kept, not computed again.
+3. Guided schedule: like OpenMP's schedule(guided), every next chunk gets remaining_work / (2 * processes) of
+   the estimated remaining work, converted to an item count with the local cost. Chunks start big (little
+   overhead) and shrink toward the end, so the last chunks are small and all workers finish at about the same
+   time.
+
+The schedule is returned next to the results: every chunk with its size, estimated and measured time and the
+worker that ran it, and a summary with the straggler time (time between the first and the last worker running
+out of work).
+"""
+
+import math
+import multiprocessing
+import os
+import sys
+import time
+from importlib.util import module_from_spec, spec_from_file_location
+
+
+# --- worker side ---
+def _noop(_):
+    return None
+
+def _timed_block(task):
+    fn, items = task
+    start = time.perf_counter()
+    results = [fn(item) for item in items]
+    return results, (time.perf_counter() - start) / len(items)
+
+def _run_chunk(task):
+    fn, start, items, skip = task
+    began = time.monotonic()  # CLOCK_MONOTONIC is system wide on Linux, comparable between workers
+    results = [None if offset in skip else fn(item) for offset, item in enumerate(items)]
+    return start, results, began, time.monotonic(), os.getpid()
+
+
+def _straggler(last_end, processes, started):
+    """Time between the first and the last worker running out of work (started: when the chunks were handed out).
+    A worker that got no chunk at all was out of work from the start."""
+    first = min(last_end.values()) if len(last_end) >= processes else started
+    return max(last_end.values()) - first
+
+
+def measure_overhead(pool, processes, rounds=20):
+    """Seconds of pure scheduling overhead for one task (a no-op round trip through the pool)."""
+    pool.map(_noop, range(processes))  # make sure every worker is up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        pool.apply(_noop, (None,))
+    return (time.perf_counter() - start) / rounds
+
+
+def plan_chunks(length, sample_index, sample_cost, processes, min_chunk_cost, factor=2.0):
+    """
+    Guided schedule over [0, length) from the sampled costs. Returns a list of (start, size, estimated seconds).
+    sample_index must be sorted and start at 0.
+    """
+    # piecewise constant cost profile: segment j = [sample_index[j], sample_index[j+1]) has one cost per item
+    bounds = list(sample_index) + [length]
+    costs = []
+    for j in range(len(sample_index)):
+        right = sample_cost[j + 1] if j + 1 < len(sample_cost) else sample_cost[j]
+        costs.append(max(1e-9, (sample_cost[j] + right) / 2))
+    remaining = sum((bounds[j + 1] - bounds[j]) * costs[j] for j in range(len(costs)))
+
+    chunks = []
+    start, segment = 0, 0
+    while start < length:
+        target = max(min_chunk_cost, remaining / (factor * processes))
+        size, estimate = 0, 0.0
+        # walk over the cost segments until the chunk holds `target` seconds of estimated work
+        while start + size < length and estimate < target:
+            while bounds[segment + 1] <= start + size:
+                segment += 1
+            room = bounds[segment + 1] - (start + size)
+            take = min(room, max(1, math.ceil((target - estimate) / costs[segment])))
+            size += take
+            estimate += take * costs[segment]
+        chunks.append((start, size, estimate))
+        remaining -= estimate
+        start += size
+    return chunks
+
+
+def guided_map(pool, fn, items, samples=None, sample_block=None, overhead_ratio=50, factor=2.0, processes=None):
+    """
+    pool.map(fn, items) with cost based, shrinking chunks. items must support len() and slicing.
+    processes is the pool's worker count (like Pool, os.cpu_count() when not given). Returns (results, schedule).
+    """
+    started = time.perf_counter()
+    length = len(items)
+    processes = processes or os.cpu_count() or 1
+    if length == 0:
+        return [], {"chunks": [], "processes": processes}
+
+    overhead = measure_overhead(pool, processes)
+    if samples is None:
+        samples = max(8, 4 * processes)
+    samples = min(samples, length)
+    if sample_block is None:
+        # sampling should stay around 1% of the input
+        sample_block = max(1, min(64, length // (samples * 100)))
+    sample_block = min(sample_block, length)  # a block longer than the input would start before item 0
+    sample_index = sorted({round(i * (length - sample_block) / max(1, samples - 1)) for i in range(samples)})
+    sampled = pool.map(_timed_block, [(fn, items[i:i + sample_block]) for i in sample_index], chunksize=1)
+    sample_cost = [seconds for _, seconds in sampled]
+    sampling_seconds = time.perf_counter() - started
+
+    chunks = plan_chunks(length, sample_index, sample_cost, processes, overhead * overhead_ratio, factor)
+
+    results = [None] * length
+    sampled_set = set()
+    for i, (block_results, _) in zip(sample_index, sampled):
+        results[i:i + len(block_results)] = block_results
+        sampled_set.update(range(i, i + len(block_results)))
+    tasks = []
+    for start, size, _ in chunks:
+        skip = frozenset(i - start for i in sampled_set if start <= i < start + size)
+        tasks.append((fn, start, items[start:start + size], skip))
+
+    # imap (not imap_unordered) hands the chunks out in schedule order: big ones first, small ones last
+    executed = []
+    chunks_started = time.monotonic()
+    for start, chunk_results, began, ended, pid in pool.imap(_run_chunk, tasks):
+        for offset, value in enumerate(chunk_results):
+            if start + offset not in sampled_set:
+                results[start + offset] = value
+        executed.append((began, ended, pid))
+
+    last_end = {}
+    busy = {}
+    for began, ended, pid in executed:
+        last_end[pid] = max(last_end.get(pid, 0.0), ended)
+        busy[pid] = busy.get(pid, 0.0) + ended - began
+    schedule = {
+        "processes": processes,
+        "items": length,
+        "overhead_per_task": overhead,
+        "min_chunk_seconds": overhead * overhead_ratio,
+        "samples": len(sample_index),
+        "sample_block": sample_block,
+        "sampling_seconds": sampling_seconds,
+        "chunks": [{"start": start, "size": size, "estimated": estimate, "measured": ended - began, "pid": pid}
+                   for (start, size, estimate), (began, ended, pid) in zip(chunks, executed)],
+        "straggler_seconds": _straggler(last_end, processes, chunks_started),
+        "busy_seconds": busy,
+        "total_seconds": time.perf_counter() - started,
+    }
+    return results, schedule
+
+
+def format_schedule(schedule, max_rows=12):
+    chunks = schedule["chunks"]
+    lines = [f"{len(chunks)} chunks for {schedule['items']:,} items on {schedule['processes']} processes, "
+             f"task overhead {schedule['overhead_per_task'] * 1e6:.0f} us, "
+             f"min chunk {schedule['min_chunk_seconds'] * 1000:.1f} ms, "
+             f"{schedule['samples']} samples of {schedule['sample_block']} items in "
+             f"{schedule['sampling_seconds'] * 1000:.0f} ms",
+             f"{'#':>4} {'start':>10} {'size':>8} {'est ms':>8} {'real ms':>8} {'pid':>7}"]
+    shown = chunks if len(chunks) <= max_rows else chunks[:max_rows // 2] + [None] + chunks[-(max_rows // 2):]
+    for chunk in shown:
+        if chunk is None:
+            lines.append(f"{'...':>4}")
+            continue
+        index = chunks.index(chunk)
+        lines.append(f"{index:>4} {chunk['start']:>10,} {chunk['size']:>8,} {chunk['estimated'] * 1000:>8.1f} "
+                     f"{chunk['measured'] * 1000:>8.1f} {chunk['pid']:>7}")
+    lines.append(f"straggler time {schedule['straggler_seconds'] * 1000:.1f} ms")
+    return "\n".join(lines)
+
+
+# --- Benchmark: default chunksize vs chunksize=1 vs guided ---
+def uniform_work(n):
+    total = 0
+    for i in range(200):
+        total += i * n
+    return total
+
+def skewed_work(n):
+    # cost grows linearly with n, like is_prime on growing numbers but without the cheap even numbers
+    total = 0
+    for i in range(n // 50):
+        total += i
+    return total
+
+def _load_pool_1():
+    spec = spec_from_file_location("pool_1", os.path.join(os.path.dirname(os.path.abspath(__file__)), "4_pool_1.py"))
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    # registered so pickle can send pool_1.is_prime by reference to the (forked) workers
+    sys.modules["pool_1"] = module
+    return module
+
+def _timed_pool_map(pool, fn, items, chunksize, processes):
+    """pool.map with a per chunk timing, to get the straggler time of the plain map as well."""
+    tasks = [(fn, start, items[start:start + chunksize], frozenset()) for start in range(0, len(items), chunksize)]
+    start = time.perf_counter()
+    began_at = time.monotonic()
+    last_end = {}
+    results = []
+    for _, chunk_results, began, ended, pid in pool.imap(_run_chunk, tasks):
+        results += chunk_results
+        last_end[pid] = max(last_end.get(pid, 0.0), ended)
+    return results, time.perf_counter() - start, len(tasks), _straggler(last_end, processes, began_at)
+
+def check_small_inputs(pool, processes):
+    """guided_map against a plain list comprehension on inputs shorter than the sample block and the sample count."""
+    for length in (0, 1, 2, 10, 63):
+        items = list(range(length))
+        for sample_block in (None, 1, length, length + 10, 64):
+            results, _ = guided_map(pool, uniform_work, items, sample_block=sample_block, processes=processes)
+            assert results == [uniform_work(item) for item in items], (length, sample_block)
+
+def run_benchmark(processes=4):
+    pool_1 = _load_pool_1()
+    workloads = (
+        ("uniform", uniform_work, range(200_000)),
+        ("skewed", skewed_work, range(0, 60_000, 3)),
+        ("is_prime", pool_1.is_prime, range(2, 2_000_001)),
+    )
+    print(f"{processes} worker processes on {os.cpu_count()} CPUs "
+          f"(with fewer CPUs than workers the straggler time shows the imbalance, the wall time can't)")
+    print(f"{'workload':>9} {'variant':>16} {'seconds':>8} {'chunks':>7} {'straggler ms':>13} {'same result':>12}")
+    # fork: the workers inherit sys.modules["pool_1"]
+    with multiprocessing.get_context("fork").Pool(processes) as pool:
+        for name, fn, items in workloads:
+            default_chunksize = max(1, math.ceil(len(items) / (processes * 4)))  # what Pool.map picks
+            expected, elapsed, chunks, straggler = _timed_pool_map(pool, fn, items, default_chunksize, processes)
+            print(f"{name:>9} {'pool.map default':>16} {elapsed:>8.2f} {chunks:>7} {straggler * 1000:>13.1f} "
+                  f"{'-':>12}")
+            if len(items) <= 200_000:
+                results, elapsed, chunks, straggler = _timed_pool_map(pool, fn, items, 1, processes)
+                print(f"{name:>9} {'chunksize=1':>16} {elapsed:>8.2f} {chunks:>7} {straggler * 1000:>13.1f} "
+                      f"{str(results == expected):>12}")
+            start = time.perf_counter()
+            results, schedule = guided_map(pool, fn, items, processes=processes)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>9} {'guided':>16} {elapsed:>8.2f} {len(schedule['chunks']):>7} "
+                  f"{schedule['straggler_seconds'] * 1000:>13.1f} {str(results == expected):>12}")
+        print("\nschedule chosen for the last workload:")
+        print(format_schedule(schedule))
+
+
+if __name__ == '__main__':
+    numbers_to_check = range(2, 1_000_001)
+    pool_1 = _load_pool_1()
+    processes = multiprocessing.cpu_count()
+    with multiprocessing.get_context("fork").Pool(processes) as pool:
+        is_prime_results, schedule = guided_map(pool, pool_1.is_prime, numbers_to_check, processes=processes)
+        check_small_inputs(pool, processes)
+    print(f"Found {sum(is_prime_results)} primes between 2 and 1000000.")
+    print(format_schedule(schedule))
+
+    print("\nBenchmark: default chunksize vs guided scheduling")
+    run_benchmark()
@@ -0,0 +1,221 @@
+"""
+Pool.map results written straight into shared memory
+
+In 4_pool_1.py every is_prime result travels back the long way: the worker pickles a list of bools per chunk,
+it goes through the Pool's result queue (a pipe), the parent unpickles it and copies it into one big Python
+list. For 1,000,000 numbers that's a list of a million references (8 MB) plus the pickling on both sides, for
+what is really 1 MB of information.
+
+shared_map() avoids all of that:-
+- The parent creates one multiprocessing.shared_memory block big enough for all the results
+  (length * itemsize), typed with an array typecode ("?", "b", "i", "q", "d", ...) or a NumPy dtype.
+- The input is split into index ranges. A task is only (shm name, start, stop, items[start:stop]); for a range()
+  input the slice is itself a small range object, so the task is a few dozen bytes.
+- The worker attaches to the block once (cached per process), and writes fn(item) into
+  view[start:stop] directly. The only thing sent back is the count of items written.
+- When the map finishes the parent has a zero-copy view over the block: a memoryview cast to the typecode,
+  or a NumPy array using the block as its buffer.
+
+SharedResult owns the block: use it as a context manager (or call release()) to close and unlink it. Copy
+anything you want to keep (e.g. bytes(result.view) or view.tolist()) before releasing.
+"""
+
+import math
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+from importlib.util import module_from_spec, spec_from_file_location
+from multiprocessing import resource_tracker, shared_memory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _itemsize(kind):
+    if isinstance(kind, str):
+        return memoryview(bytes(8)).cast(kind).itemsize
+    return np.dtype(kind).itemsize
+
+def _make_view(buf, kind, length):
+    if isinstance(kind, str):
+        return buf[:length * _itemsize(kind)].cast(kind)
+    return np.ndarray((length,), dtype=kind, buffer=buf)
+
+
+class SharedResult:
+    def __init__(self, length, kind="?"):
+        if not isinstance(kind, str) and np is None:
+            raise ImportError("a NumPy dtype needs numpy installed, use an array typecode instead")
+        self.length = length
+        self.kind = kind
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, length * _itemsize(kind)))
+        self.view = _make_view(self.shm.buf, kind, length)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def nbytes(self):
+        return self.length * _itemsize(self.kind)
+
+    def release(self):
+        """Drops the view and frees the shared memory block."""
+        if self.view is None:
+            return
+        if isinstance(self.view, memoryview):
+            self.view.release()
+        self.view = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def __len__(self):
+        return self.length
+
+
+# --- worker side ---
+_attached = {}  # shm name -> (SharedMemory, view), one attach per block per worker process
+_MAX_ATTACHED = 4
+
+def _attach_untracked(name):
+    """
+    Attach without registering the block with a resource tracker: the parent owns and unlinks it. A worker forked
+    before the parent's tracker was running starts a tracker of its own, which would unlink the block (or warn
+    about it) when the worker exits.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        pass
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+def _attach(name, kind, length):
+    entry = _attached.get(name)
+    if entry is None:
+        shm = _attach_untracked(name)
+        entry = _attached[name] = (shm, _make_view(shm.buf, kind, length))
+        while len(_attached) > _MAX_ATTACHED:
+            # blocks of earlier maps, the parent has most likely unlinked them already
+            old_shm, old_view = _attached.pop(next(iter(_attached)))
+            if isinstance(old_view, memoryview):
+                old_view.release()
+            del old_view
+            try:
+                old_shm.close()
+            except BufferError:
+                pass  # a NumPy view is still referenced somewhere, the mapping goes away with the process
+    return entry[1]
+
+def _fill(task):
+    name, kind, length, fn, start, items = task
+    view = _attach(name, kind, length)
+    i = start
+    for item in items:
+        view[i] = fn(item)
+        i += 1
+    return i - start
+
+
+def shared_map(pool, fn, items, kind="?", chunksize=None, processes=None):
+    """
+    Like pool.map(fn, items), but the results land in a SharedResult (typecode or NumPy dtype `kind`).
+    items must support len() and slicing (list, tuple, range, ...). processes is the pool's worker count, only
+    used for the default chunksize (like Pool, os.cpu_count() when not given).
+    """
+    length = len(items)
+    result = SharedResult(length, kind)
+    if chunksize is None:
+        # same rule of thumb as Pool.map: about 4 chunks per worker
+        chunksize = max(1, math.ceil(length / ((processes or os.cpu_count() or 1) * 4)))
+    tasks = [(result.name, kind, length, fn, start, items[start:start + chunksize])
+             for start in range(0, length, chunksize)]
+    complete = False
+    try:
+        written = sum(pool.imap_unordered(_fill, tasks))
+        if written != length:
+            raise RuntimeError(f"workers wrote {written} of {length} results")
+        complete = True
+    finally:
+        if not complete:
+            result.release()  # nobody else holds the block, unlink it
+    return result
+
+
+# --- Benchmark: pool.map(is_prime) from 4_pool_1.py vs shared_map ---
+def _load_pool_1():
+    spec = spec_from_file_location("pool_1", os.path.join(os.path.dirname(os.path.abspath(__file__)), "4_pool_1.py"))
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    # registered so pickle can send pool_1.is_prime by reference to the (forked) workers
+    sys.modules["pool_1"] = module
+    return module
+
+def run_benchmark(end_num=1_000_000):
+    pool_1 = _load_pool_1()
+    numbers = range(2, end_num + 1)
+    processes = multiprocessing.cpu_count()
+    chunksize = max(1, math.ceil(len(numbers) / (processes * 4)))
+    print(f"{processes} worker processes, {len(numbers):,} numbers, chunksize {chunksize}")
+    print(f"{'variant':>20} {'seconds':>8} {'task bytes':>11} {'result bytes':>13} {'parent peak MB':>15} "
+          f"{'primes':>8}")
+
+    # fork: the workers inherit sys.modules["pool_1"]. The pool is created before tracemalloc starts so only
+    # the parent's allocations are traced
+    with multiprocessing.get_context("fork").Pool(processes) as pool:
+        tracemalloc.start()
+        start = time.perf_counter()
+        flags = pool.map(pool_1.is_prime, numbers, chunksize)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        primes = sum(flags)
+        # what crossed the pipes: the chunks of numbers out, a list of bools per chunk back
+        task_bytes = sum(len(pickle.dumps(list(numbers[i:i + chunksize]))) for i in range(0, len(numbers), chunksize))
+        result_bytes = sum(len(pickle.dumps(flags[i:i + chunksize])) for i in range(0, len(flags), chunksize))
+        del flags
+        print(f"{'pool.map':>20} {elapsed:>8.2f} {task_bytes:>11,} {result_bytes:>13,} {peak / 1e6:>15.2f} "
+              f"{primes:>8,}")
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with shared_map(pool, pool_1.is_prime, numbers, "?", chunksize) as result:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            primes = sum(result.view)
+            tasks = [(result.name, "?", len(numbers), pool_1.is_prime, i, numbers[i:i + chunksize])
+                     for i in range(0, len(numbers), chunksize)]
+            task_bytes = sum(len(pickle.dumps(task)) for task in tasks)
+            result_bytes = len(tasks) * len(pickle.dumps(chunksize))
+            print(f"{'shared_map':>20} {elapsed:>8.2f} {task_bytes:>11,} {result_bytes:>13,} {peak / 1e6:>15.2f} "
+                  f"{primes:>8,}")
+            print(f"results: {result.nbytes:,} bytes in shared memory, read in place by the parent")
+
+
+if __name__ == '__main__':
+    def square(x):
+        return x * x
+
+    numbers = range(10)
+    with multiprocessing.Pool(processes=2) as pool:
+        with shared_map(pool, square, numbers, "q", chunksize=3) as result:
+            print("squares:", result.view.tolist())
+
+    print("\nBenchmark: pool.map vs shared memory results")
+    run_benchmark()
@@ -0,0 +1,243 @@
+"""
+Segmented sieve prime engine
+
+4_pool_1.py runs pool.map(is_prime, range(2, 1_000_001)). Every single number is pickled and sent to a worker,
+trial divided on its own (up to sqrt(n) divisions), and a bool is pickled back, so the parent receives a list of
+a million booleans. Most of the time goes into per-item overhead, not into finding primes.
+
+The engine here splits the range into contiguous segments instead, one task per segment:-
+- Every worker computes the small "base" primes up to sqrt(hi) once (Pool initializer).
+- A segment is sieved the way Eratosthenes does it: for every base prime p, cross out p*p, p*p+2p, ... inside
+  the segment. Only odd numbers are stored, one byte per odd number, so a segment of 2**21 odd numbers covers
+  4 million integers with 2 MB of memory, no matter how large the whole range is. That is what lets it scale
+  to 10**9.
+- Crossing out is one slice assignment per base prime: seg[start::p] = zeros. The loop over the multiples
+  runs in C, not in Python.
+- Optional NumPy backend (used when numpy is installed): the segment is a numpy bool array, count_nonzero
+  and packbits do the counting and packing.
+- A worker sends back either a count (one int per segment) or a compact bitset (1 bit per odd number,
+  i.e. 1 bit for every 2 integers) instead of a bool per number.
+
+For range-scan jobs in general: send ranges to the workers, not items, and send back aggregates or packed
+results, not one object per item.
+"""
+
+import math
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+from importlib.util import module_from_spec, spec_from_file_location
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SEGMENT_ODDS = 1 << 21  # odd numbers per segment, i.e. ~4.2 million integers
+
+# bytes 0/1 -> ASCII "0"/"1", used to pack the byte per odd number flags into bits without numpy
+_TO_ASCII_BITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def base_primes(limit):
+    """Odd primes <= limit, with a plain sieve. limit is ~sqrt of the range, so this is small."""
+    if limit < 3:
+        return []
+    flags = bytearray([1]) * (limit + 1)
+    flags[0:2] = b"\x00\x00"
+    for p in range(2, math.isqrt(limit) + 1):
+        if flags[p]:
+            flags[p * p::p] = bytes(len(range(p * p, limit + 1, p)))
+    return [p for p in range(3, limit + 1, 2) if flags[p]]
+
+
+def _first_index(p, first_odd):
+    # index (in odd numbers from first_odd) of the first odd multiple of p that is >= max(p*p, first_odd)
+    start = max(p * p, (first_odd + p - 1) // p * p)
+    if start % 2 == 0:
+        start += p
+    return (start - first_odd) // 2
+
+def sieve_segment_python(lo, hi, primes):
+    """bytearray with one byte per odd number in [lo, hi): 1 = prime."""
+    first_odd = lo | 1
+    size = max(0, (hi - first_odd + 1) // 2)
+    seg = bytearray([1]) * size
+    zeros = memoryview(bytes(size))
+    for p in primes:
+        if p * p >= hi:
+            break
+        start = _first_index(p, first_odd)
+        if start < size:
+            seg[start::p] = zeros[:len(range(start, size, p))]
+    if first_odd == 1 and size:
+        seg[0] = 0  # 1 is not a prime
+    return seg
+
+def sieve_segment_numpy(lo, hi, primes):
+    first_odd = lo | 1
+    size = max(0, (hi - first_odd + 1) // 2)
+    seg = np.ones(size, dtype=bool)
+    for p in primes:
+        if p * p >= hi:
+            break
+        seg[_first_index(p, first_odd)::p] = False
+    if first_odd == 1 and size:
+        seg[0] = False
+    return seg
+
+
+# --- worker side ---
+_primes = None
+_backend = None
+
+def _init_worker(limit, backend):
+    global _primes, _backend
+    _primes = base_primes(math.isqrt(limit))
+    _backend = backend
+
+def _sieve_task(task):
+    lo, hi, mode = task
+    two = 1 if lo <= 2 < hi else 0  # the only even prime isn't in the odd-only segment
+    if _backend == "numpy":
+        seg = sieve_segment_numpy(lo, hi, _primes)
+        if mode == "count":
+            return int(np.count_nonzero(seg)) + two
+        return lo, hi, np.packbits(seg, bitorder="little").tobytes()
+    seg = sieve_segment_python(lo, hi, _primes)
+    if mode == "count":
+        return seg.count(1) + two
+    # bit i of the result is seg[i]: reverse the "0101" string so seg[0] becomes the lowest bit
+    bits = seg.translate(_TO_ASCII_BITS)[::-1]
+    return lo, hi, int(bits, 2).to_bytes((len(seg) + 7) // 8, "little") if bits else b""
+
+
+class SegmentedSieve:
+    def __init__(self, processes=None, segment_odds=SEGMENT_ODDS, backend="auto"):
+        if backend == "auto":
+            backend = "numpy" if np is not None else "python"
+        if backend == "numpy" and np is None:
+            raise ImportError("backend='numpy' needs numpy installed")
+        if backend not in ("python", "numpy"):
+            raise ValueError(f"unknown backend {backend!r}")
+        self.processes = processes or multiprocessing.cpu_count()
+        self.segment_odds = segment_odds
+        self.backend = backend
+
+    def _tasks(self, lo, hi, mode):
+        span = 2 * self.segment_odds  # a segment always starts on an even number
+        lo = max(lo, 0)
+        tasks = []
+        start = lo
+        while start < hi:
+            stop = min(hi, (start // span + 1) * span)
+            tasks.append((start, stop, mode))
+            start = stop
+        return tasks
+
+    def _map(self, lo, hi, mode):
+        tasks = self._tasks(lo, hi, mode)
+        if not tasks:
+            return []
+        with multiprocessing.Pool(self.processes, initializer=_init_worker, initargs=(hi, self.backend)) as pool:
+            # one segment per task message, a segment is already millions of numbers
+            return pool.map(_sieve_task, tasks, chunksize=1)
+
+    def segment_counts(self, lo, hi):
+        """Number of primes per segment of [lo, hi), in order."""
+        return self._map(lo, hi, "count")
+
+    def count(self, lo, hi):
+        """Number of primes in [lo, hi)."""
+        return sum(self.segment_counts(lo, hi))
+
+    def bitsets(self, lo, hi):
+        """List of (seg_lo, seg_hi, bits), bit i set <=> (seg_lo | 1) + 2*i is prime. 2 is not included."""
+        return self._map(lo, hi, "bitset")
+
+    def primes(self, lo, hi):
+        """Yields the primes in [lo, hi) in order, decoded from the bitsets."""
+        if lo <= 2 < hi:
+            yield 2
+        for seg_lo, seg_hi, bits in self.bitsets(lo, hi):
+            yield from iter_bitset(seg_lo, seg_hi, bits)
+
+
+def iter_bitset(seg_lo, seg_hi, bits):
+    first_odd = seg_lo | 1
+    for byte_index, byte in enumerate(bits):
+        while byte:
+            low = byte & -byte
+            n = first_odd + 2 * (byte_index * 8 + low.bit_length() - 1)
+            if n >= seg_hi:
+                return
+            yield n
+            byte ^= low
+
+
+# --- Benchmark: pool.map(is_prime) from 4_pool_1.py vs the segmented sieve ---
+def _load_pool_1():
+    spec = spec_from_file_location("pool_1", os.path.join(os.path.dirname(os.path.abspath(__file__)), "4_pool_1.py"))
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    # registered so pickle can send pool_1.is_prime by reference to the (forked) workers
+    sys.modules["pool_1"] = module
+    return module
+
+def run_benchmark(end_num=1_000_000, scale_limits=(10 ** 7, 10 ** 8, 10 ** 9)):
+    processes = multiprocessing.cpu_count()
+    numbers = range(2, end_num + 1)
+    print(f"{processes} worker processes, sieve backend: {'numpy' if np is not None else 'python'}")
+    print(f"{'variant':>28} {'range':>14} {'primes':>11} {'seconds':>8} {'result bytes':>13}")
+
+    pool_1 = _load_pool_1()
+    # fork: the workers inherit sys.modules["pool_1"], a spawned worker couldn't import it by that name
+    start = time.perf_counter()
+    with multiprocessing.get_context("fork").Pool(processes) as pool:
+        flags = pool.map(pool_1.is_prime, numbers)
+    elapsed = time.perf_counter() - start
+    baseline = sum(flags)
+    print(f"{'pool.map(is_prime)':>28} {f'2..{end_num:,}':>14} {baseline:>11,} {elapsed:>8.2f} "
+          f"{len(pickle.dumps(flags)):>13,}")
+
+    sieve = SegmentedSieve(processes)
+    start = time.perf_counter()
+    counts = sieve.segment_counts(2, end_num + 1)
+    elapsed = time.perf_counter() - start
+    print(f"{'segmented sieve, counts':>28} {f'2..{end_num:,}':>14} {sum(counts):>11,} {elapsed:>8.2f} "
+          f"{len(pickle.dumps(counts)):>13,}")
+
+    start = time.perf_counter()
+    segments = sieve.bitsets(2, end_num + 1)
+    elapsed = time.perf_counter() - start
+    found = 1 + sum(sum(1 for _ in iter_bitset(*segment)) for segment in segments)
+    print(f"{'segmented sieve, bitsets':>28} {f'2..{end_num:,}':>14} {found:>11,} {elapsed:>8.2f} "
+          f"{len(pickle.dumps(segments)):>13,}")
+    print(f"all variants agree: {baseline == sum(counts) == found}")
+
+    for limit in scale_limits:
+        start = time.perf_counter()
+        total = sieve.count(0, limit + 1)
+        elapsed = time.perf_counter() - start
+        print(f"{'segmented sieve, counts':>28} {f'0..10^{round(math.log10(limit))}':>14} {total:>11,} "
+              f"{elapsed:>8.2f} {'':>13}")
+
+
+if __name__ == '__main__':
+    start_num = 2
+    end_num = 1_000_000
+    sieve = SegmentedSieve()
+    print(f"Using a pool of {sieve.processes} worker processes ({sieve.backend} backend).")
+
+    start_time = time.time()
+    prime_numbers = list(sieve.primes(start_num, end_num + 1))
+    end_time = time.time()
+
+    print(f"\nFound {len(prime_numbers)} primes between {start_num} and {end_num}.")
+    print(f"Total time taken: {end_time - start_time:.4f} seconds.")
+    print("First 10 primes:", prime_numbers[:10])
+
+    print("\nBenchmark: is_prime per number vs segmented sieve")
+    run_benchmark()
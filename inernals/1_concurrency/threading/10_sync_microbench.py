@@ -0,0 +1,318 @@
+"""
+Microbenchmarks for the synchronization primitives
+
+How expensive is a Lock compared to an RLock? What does a Condition round trip cost, or waking a thread with an
+Event? The answer changes between Python versions, so this suite measures it and keeps the numbers.
+
+What is measured:-
+- uncontended: one thread, acquire/release (or the single operation) in a tight loop.
+  Lock, RLock, RLock re-entered to depth 4 and 16 (as in 4_rlock_basic.py, cost per acquire),
+  Semaphore, BoundedSemaphore, Event.is_set, threading.local attribute read/write next to a plain object
+  attribute as the baseline.
+- contended: `threads` threads hammer the same primitive. Reported as ns per operation of all threads together.
+- latency: one thread wakes another and the time until the other one runs is measured. Event set -> wait()
+  returns, and a Condition notify/wait ping-pong (one round trip = two handoffs).
+
+Every benchmark is run as `samples` timed batches after a warm up batch, with the garbage collector off.
+Throughput benchmarks report ns per operation of each batch, latency benchmarks report each handoff, and the
+table shows min / p50 / p90 / p99 of those.
+
+Baselines:
+    python 10_sync_microbench.py --save base.json      # e.g. on Python 3.11
+    python 10_sync_microbench.py --compare base.json   # e.g. after the upgrade
+--compare marks every benchmark whose p50 is more than --threshold (default 10%) slower than the baseline as
+REGRESSION (and faster as improved), and exits with status 1 if anything regressed.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import threading
+import time
+
+_now = time.perf_counter_ns
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "min": values[0],
+        "p50": _percentile(values, 0.5),
+        "p90": _percentile(values, 0.9),
+        "p99": _percentile(values, 0.99),
+        "mean": sum(values) / len(values),
+        "samples": len(values),
+    }
+
+
+# --- uncontended, each returns ns per operation for one batch of n ---
+def bench_lock(n):
+    lock = threading.Lock()
+    start = _now()
+    for _ in range(n):
+        with lock:
+            pass
+    return (_now() - start) / n
+
+def bench_rlock(n):
+    lock = threading.RLock()
+    start = _now()
+    for _ in range(n):
+        with lock:
+            pass
+    return (_now() - start) / n
+
+def _bench_rlock_depth(depth):
+    def bench(n):
+        lock = threading.RLock()
+        acquire, release = lock.acquire, lock.release
+        rounds = max(1, n // depth)
+        start = _now()
+        for _ in range(rounds):
+            for _ in range(depth):
+                acquire()
+            for _ in range(depth):
+                release()
+        return (_now() - start) / (rounds * depth)
+    return bench
+
+def bench_semaphore(n):
+    sem = threading.Semaphore(1)
+    start = _now()
+    for _ in range(n):
+        with sem:
+            pass
+    return (_now() - start) / n
+
+def bench_bounded_semaphore(n):
+    sem = threading.BoundedSemaphore(1)
+    start = _now()
+    for _ in range(n):
+        with sem:
+            pass
+    return (_now() - start) / n
+
+def bench_event_is_set(n):
+    event = threading.Event()
+    is_set = event.is_set
+    start = _now()
+    for _ in range(n):
+        is_set()
+    return (_now() - start) / n
+
+class _Plain:
+    pass
+
+def bench_object_attr_read(n):
+    data = _Plain()
+    data.x = 1
+    start = _now()
+    for _ in range(n):
+        data.x
+    return (_now() - start) / n
+
+def bench_local_read(n):
+    data = threading.local()
+    data.x = 1
+    start = _now()
+    for _ in range(n):
+        data.x
+    return (_now() - start) / n
+
+def bench_local_write(n):
+    data = threading.local()
+    start = _now()
+    for i in range(n):
+        data.x = i
+    return (_now() - start) / n
+
+
+# --- contended: `threads` threads share one primitive, ns per operation of all threads together ---
+def _contended(make, threads):
+    def bench(n):
+        primitive = make()
+        per_thread = max(1, n // threads)
+        barrier = threading.Barrier(threads + 1)
+
+        def worker():
+            barrier.wait()
+            for _ in range(per_thread):
+                with primitive:
+                    pass
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        barrier.wait()
+        start = _now()
+        for t in workers:
+            t.join()
+        return (_now() - start) / (per_thread * threads)
+    return bench
+
+
+# --- latency: every sample is one handoff between two threads ---
+def latency_event_wakeup(samples):
+    go = threading.Event()
+    woke = threading.Event()
+    sent_at = [0]
+    latencies = []
+
+    def waiter():
+        for _ in range(samples):
+            go.wait()
+            latencies.append(_now() - sent_at[0])
+            go.clear()
+            woke.set()
+
+    t = threading.Thread(target=waiter)
+    t.start()
+    for _ in range(samples):
+        woke.clear()
+        sent_at[0] = _now()
+        go.set()
+        woke.wait()
+    t.join()
+    return latencies
+
+def latency_condition_roundtrip(samples):
+    cond = threading.Condition()
+    turn = ["main"]
+    latencies = []
+
+    def partner():
+        with cond:
+            for _ in range(samples):
+                cond.wait_for(lambda: turn[0] == "partner")
+                turn[0] = "main"
+                cond.notify()
+
+    t = threading.Thread(target=partner)
+    t.start()
+    with cond:
+        for _ in range(samples):
+            start = _now()
+            turn[0] = "partner"
+            cond.notify()
+            cond.wait_for(lambda: turn[0] == "main")
+            latencies.append(_now() - start)
+    t.join()
+    return latencies
+
+
+def build_suite(threads=4):
+    permits = max(1, threads // 2)  # Semaphore(0) with one thread would never be acquired
+    throughput = {
+        "uncontended/Lock": bench_lock,
+        "uncontended/RLock": bench_rlock,
+        "uncontended/RLock depth 4": _bench_rlock_depth(4),
+        "uncontended/RLock depth 16": _bench_rlock_depth(16),
+        "uncontended/Semaphore": bench_semaphore,
+        "uncontended/BoundedSemaphore": bench_bounded_semaphore,
+        "uncontended/Event.is_set": bench_event_is_set,
+        "uncontended/object attr read": bench_object_attr_read,
+        "uncontended/local attr read": bench_local_read,
+        "uncontended/local attr write": bench_local_write,
+        f"contended {threads}t/Lock": _contended(threading.Lock, threads),
+        f"contended {threads}t/RLock": _contended(threading.RLock, threads),
+        f"contended {threads}t/Semaphore(1)": _contended(lambda: threading.Semaphore(1), threads),
+        f"contended {threads}t/Semaphore({permits})": _contended(lambda: threading.Semaphore(permits), threads),
+    }
+    latency = {
+        "latency/Event set->wait": latency_event_wakeup,
+        "latency/Condition round trip": latency_condition_roundtrip,
+    }
+    return throughput, latency
+
+def run_suite(samples=30, batch=20_000, latency_samples=2_000, threads=4, only=None):
+    throughput, latency = build_suite(threads)
+    results = {}
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for name, bench in throughput.items():
+            if only and only not in name:
+                continue
+            bench(batch // 10)  # warm up
+            results[name] = summarize([bench(batch) for _ in range(samples)])
+        for name, bench in latency.items():
+            if only and only not in name:
+                continue
+            bench(latency_samples // 10)
+            results[name] = summarize(bench(latency_samples))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return results
+
+def environment():
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "switch_interval": sys.getswitchinterval(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def compare(results, baseline, threshold=0.10):
+    """Returns {name: (old p50, new p50, change, verdict)} for the benchmarks present in both runs."""
+    report = {}
+    for name, stats in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        change = (stats["p50"] - old["p50"]) / old["p50"] if old["p50"] else 0.0
+        verdict = "REGRESSION" if change > threshold else "improved" if change < -threshold else "ok"
+        report[name] = (old["p50"], stats["p50"], change, verdict)
+    return report
+
+def print_results(results, comparison=None):
+    header = f"{'benchmark':<36} {'min ns':>9} {'p50 ns':>9} {'p90 ns':>9} {'p99 ns':>9}"
+    if comparison is not None:
+        header += f" {'base p50':>9} {'change':>8}  verdict"
+    print(header)
+    for name, s in results.items():
+        line = f"{name:<36} {s['min']:>9.1f} {s['p50']:>9.1f} {s['p90']:>9.1f} {s['p99']:>9.1f}"
+        if comparison is not None and name in comparison:
+            old, _, change, verdict = comparison[name]
+            line += f" {old:>9.1f} {change * 100:>7.1f}%  {verdict}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="threading primitive microbenchmarks")
+    parser.add_argument("--samples", type=int, default=30, help="timed batches per throughput benchmark")
+    parser.add_argument("--batch", type=int, default=20_000, help="operations per batch")
+    parser.add_argument("--latency-samples", type=int, default=2_000)
+    parser.add_argument("--threads", type=int, default=4, help="threads for the contended benchmarks")
+    parser.add_argument("--only", help="run only benchmarks whose name contains this text")
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="JSON baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p50 change that counts as a regression")
+    args = parser.parse_args()
+
+    env = environment()
+    print(f"Python {env['python']} ({env['implementation']}) on {env['platform']}, "
+          f"switch interval {env['switch_interval']}s")
+    results = run_suite(args.samples, args.batch, args.latency_samples, args.threads, args.only)
+
+    comparison = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"baseline: Python {baseline['environment']['python']} from {baseline['environment']['date']}")
+        comparison = compare(results, baseline["results"], args.threshold)
+    print_results(results, comparison)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"environment": env, "results": results}, f, indent=2)
+        print(f"baseline written to {args.save}")
+    if comparison and any(verdict == "REGRESSION" for *_, verdict in comparison.values()):
+        sys.exit(1)
@@ -0,0 +1,345 @@
+"""
+asyncio crawl engine, an alternative to one threading.Thread per link (1_base.py)
+
+1_base.py starts a thread for every link. Each thread has its own stack (reserved up front by the OS) and
+the threads spend almost all of their time blocked on the network. Past a few hundred URLs that's a lot
+of memory and scheduler work for threads that are just waiting.
+
+A crawl is pure I/O, so one event loop can keep thousands of requests in flight on a single thread:
+- Every request is a coroutine. While it waits for the network it gives control back to the loop.
+- Bounded concurrency: a fixed number of worker coroutines pull URLs from an asyncio.Queue, so at most
+  max_concurrency requests are in flight no matter how many URLs are given.
+- Connection reuse per host: finished connections (HTTP/1.1 keep-alive) go back to an idle list for
+  their (host, port) and the next request to that host reuses them instead of doing a new handshake.
+  per_host_limit caps how many connections are open to one host at once.
+- Per-request timeout: once a request has its per-host slot it runs under asyncio.wait_for(..., timeout),
+  waiting behind per_host_limit doesn't count. A timed out connection is closed, never reused.
+- A reused connection the server has closed in the meantime (reset, or no status line at all) is not a
+  failed URL: the request is sent once more on a new connection.
+- Streaming: crawl() is an async generator, results are yielded as soon as each request finishes
+  (not in input order).
+
+Only the standard library is used: a minimal HTTP/1.1 client on asyncio streams (Content-Length and
+chunked bodies, no body for 1xx/204/304). https URLs use the default SSL context.
+"""
+
+import asyncio
+import http.client
+import resource
+import ssl
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlsplit
+
+
+@dataclass
+class CrawlResult:
+    url: str
+    status: Optional[int] = None
+    content_length: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+
+async def crawl_link(link, delay=3):
+    """Same semantics as crawl() in 1_base.py, but it yields to the event loop while it waits."""
+    print(f"Starting to crawl {link}")
+    await asyncio.sleep(delay)  # Simulate network delay
+    print(f"Finished crawling {link}")
+
+
+class _HostPool:
+    def __init__(self, limit):
+        self.idle = []  # (reader, writer)
+        self.slots = asyncio.Semaphore(limit)
+
+
+class AsyncCrawler:
+    def __init__(self, max_concurrency=100, per_host_limit=20, timeout=10.0, user_agent="internals-crawler"):
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self._pools = defaultdict(lambda: _HostPool(self.per_host_limit))
+        self._ssl = ssl.create_default_context()
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    async def crawl(self, urls):
+        """Async generator that yields a CrawlResult for every url as soon as it finishes."""
+        pending = asyncio.Queue()
+        results = asyncio.Queue()
+        count = 0
+        for url in urls:
+            pending.put_nowait(url)
+            count += 1
+
+        async def worker():
+            while True:
+                try:
+                    url = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await results.put(await self.fetch(url))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.max_concurrency, count))]
+        try:
+            for _ in range(count):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def fetch(self, url):
+        start = time.perf_counter()
+        try:
+            status, body = await self.fetch_page(url)
+            return CrawlResult(url, status, len(body), time.perf_counter() - start)
+        except asyncio.TimeoutError:
+            return CrawlResult(url, elapsed=time.perf_counter() - start, error=f"timeout after {self.timeout}s")
+        except Exception as e:  # anything else still ends in a CrawlResult, crawl() waits for one per url
+            return CrawlResult(url, elapsed=time.perf_counter() - start, error=repr(e))
+
+    async def fetch_page(self, url):
+        """(status, body) of url, or raises. Same pooled connections and timeout as fetch()."""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"unsupported scheme in {url}")
+        https = parts.scheme == "https"
+        host = parts.hostname
+        port = parts.port or (443 if https else 80)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        request = (f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUser-Agent: {self.user_agent}\r\n"
+                   f"Accept: */*\r\nConnection: keep-alive\r\n\r\n").encode("latin-1")
+        pool = self._pools[(host, port, https)]
+        async with pool.slots:
+            # the timeout starts with the slot: a request queued behind per_host_limit hasn't been sent yet
+            return await asyncio.wait_for(self._request(pool, host, port, https, request), self.timeout)
+
+    async def _request(self, pool, host, port, https, request):
+        retried = False
+        while True:
+            reader = writer = None
+            reused = reusable = False
+            try:
+                if pool.idle and not retried:
+                    reader, writer = pool.idle.pop()
+                    reused = True
+                    self.connections_reused += 1
+                else:
+                    reader, writer = await asyncio.open_connection(host, port, ssl=self._ssl if https else None)
+                    self.connections_opened += 1
+                writer.write(request)
+                try:
+                    status, headers, body = await self._read_response(reader)
+                except ConnectionError:
+                    if not reused:
+                        raise
+                    # the server closed the idle keep-alive connection, a GET can be sent again
+                    retried = True
+                    continue
+                reusable = headers.get("connection", "").lower() != "close"
+                return status, body
+            finally:
+                if writer is not None:
+                    if reusable:
+                        pool.idle.append((reader, writer))
+                    else:
+                        # also reached on timeout (CancelledError), a broken response or a retry
+                        writer.close()
+
+    @staticmethod
+    async def _read_response(reader):
+        status = 100
+        while 100 <= status < 200:  # 1xx responses are interim, the final response follows them
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError("connection closed by server")
+            parts = status_line.split()
+            if len(parts) < 2 or not parts[0].startswith(b"HTTP/") or not parts[1].isdigit():
+                raise ValueError(f"malformed status line {status_line[:100]!r}")
+            status = int(parts[1])
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+        if status in (204, 304):
+            body = b""  # never has a body, whatever the headers say
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            headers["connection"] = "close"
+        return status, headers, body
+
+    async def close(self):
+        for pool in self._pools.values():
+            for _, writer in pool.idle:
+                writer.close()
+            pool.idle.clear()
+
+
+# --- Local stand-in HTTP server with configurable latency ---
+class StandInServer:
+    """Keep-alive HTTP/1.1 server on its own event loop thread. Every response waits `latency` seconds."""
+
+    def __init__(self, latency=0.05, body_size=2048, host="127.0.0.1"):
+        self.latency = latency
+        self.body = b"x" * body_size
+        self.host = host
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def url(self, path="/"):
+        return f"http://{self.host}:{self.port}{path}"
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, 0, backlog=4096))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        server.close()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = True
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    if line.lower().startswith(b"connection:") and b"close" in line.lower():
+                        keep_alive = False
+                await asyncio.sleep(self.latency)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n"
+                             b"Connection: %s\r\n\r\n%s"
+                             % (len(self.body), b"keep-alive" if keep_alive else b"close", self.body))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+# --- Benchmark: thread per link vs asyncio engine ---
+def _threaded_crawl(urls, timeout=30):
+    """1_base.py style: one thread per link, each with its own connection."""
+    results = []
+    lock = threading.Lock()
+
+    def crawl(link):
+        parts = urlsplit(link)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+        try:
+            conn.request("GET", parts.path or "/")
+            response = conn.getresponse()
+            body = response.read()
+            result = CrawlResult(link, response.status, len(body))
+        except OSError as e:
+            result = CrawlResult(link, error=repr(e))
+        finally:
+            conn.close()
+        with lock:
+            results.append(result)
+
+    threads = []
+    peak_threads = 0
+    for link in urls:
+        t = threading.Thread(target=crawl, args=(link,))
+        try:
+            t.start()
+        except RuntimeError as e:
+            print(f"thread per link: could only start {len(threads)} threads: {e}")
+            break
+        threads.append(t)
+        peak_threads = max(peak_threads, threading.active_count())
+    for t in threads:
+        t.join()
+    return results, peak_threads
+
+async def _async_crawl(urls, max_concurrency):
+    crawler = AsyncCrawler(max_concurrency=max_concurrency, per_host_limit=max_concurrency)
+    results = [result async for result in crawler.crawl(urls)]
+    await crawler.close()
+    return results, crawler.connections_opened
+
+def run_benchmark(sizes=(100, 1_000, 10_000), latency=0.05, max_concurrency=500):
+    print(f"{'urls':>7} {'variant':>16} {'seconds':>8} {'urls/s':>9} {'errors':>7} {'threads/conns':>14} "
+          f"{'max RSS MB':>11}")
+    with StandInServer(latency=latency) as server:
+        for size in sizes:
+            urls = [server.url(f"/page/{i}") for i in range(size)]
+
+            start = time.perf_counter()
+            results, connections = asyncio.run(_async_crawl(urls, max_concurrency))
+            elapsed = time.perf_counter() - start
+            errors = sum(1 for r in results if r.error)
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{size:>7} {'asyncio':>16} {elapsed:>8.2f} {size / elapsed:>9.0f} {errors:>7} "
+                  f"{connections:>14} {rss:>11.1f}")
+
+            start = time.perf_counter()
+            results, peak_threads = _threaded_crawl(urls)
+            elapsed = time.perf_counter() - start
+            errors = size - sum(1 for r in results if not r.error)
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{size:>7} {'thread per link':>16} {elapsed:>8.2f} {size / elapsed:>9.0f} {errors:>7} "
+                  f"{peak_threads:>14} {rss:>11.1f}")
+    # max RSS only ever grows, so the asyncio row of each size is measured before its threaded row
+
+
+if __name__ == "__main__":
+    links = [
+        "https://python.org",
+        "https://github.com",
+        "https://stackoverflow.com"
+    ]
+
+    async def main():
+        # same as 1_base.py, all three crawls overlap on one thread
+        await asyncio.gather(*(crawl_link(link, delay=2) for link in links))
+        print('Total running thread', threading.active_count())  # 1, only the main thread
+
+    asyncio.run(main())
+
+    print("\nBenchmark: thread per link vs asyncio engine (local stand-in server)")
+    run_benchmark()
@@ -14,6 +14,9 @@ Imagine a system that handles incoming requests. We want to:
 3. Store this data in a way that's thread-safe and isolated, so one thread's count doesn't affect another's.
 
 Using threading.local is the ideal solution because it gives each thread its own private storage space for the ID and counter.
+
+The counts here die with their thread and can't be aggregated. 2_local_data_metrics.py keeps the per-thread
+storage but registers each thread's shard so the counts can be merged on demand, with lock-free worker IDs.
 """
 
 import threading
@@ -0,0 +1,265 @@
+"""
+Per-thread metrics registry built on threading.local
+
+2_local_data_complex.py keeps tasks_processed in thread_data, which is great for isolation but the counts
+can never be added up: once a thread exits its thread_data is gone. get_next_worker_id() also takes a global
+lock every time a worker starts.
+
+MetricsRegistry keeps the threading.local idea for the hot path and adds a way to read everything back:-
+- Every thread gets its own ThreadMetrics shard (counters + histograms) stored in threading.local.
+  inc() and observe() only touch the calling thread's shard, so no lock is taken while recording.
+- When a thread records its first metric, its shard is appended to the registry's list of shards. That is
+  the only lock, and it's taken once per thread, not once per metric.
+- snapshot() merges all shards on demand. The registry still holds the shards of threads that have exited,
+  so their numbers are included. Shards of dead threads are folded into one "retired" total so memory
+  doesn't grow with every short-lived thread.
+- Worker IDs come from itertools.count(). next() on it is a single C call, so under the GIL no two threads
+  can get the same ID and no Python level lock is needed.
+
+Reading while other threads write: snapshot() copies each shard with dict.copy()/list(...), which are
+single C level operations, so it never sees a dict changing size mid-iteration. The numbers are a
+point-in-time view, exact once the writers are done.
+"""
+
+import bisect
+import itertools
+import random
+import threading
+import time
+
+# upper bounds (seconds) of the default latency histogram buckets, the last bucket is +inf
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_worker_ids = itertools.count(1)
+
+def get_next_worker_id():
+    """Lock-free: itertools.count.__next__ is atomic under the GIL."""
+    return next(_worker_ids)
+
+
+class Histogram:
+    __slots__ = ("bounds", "buckets", "count", "total")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def merge(self, other):
+        self.buckets = [a + b for a, b in zip(self.buckets, list(other.buckets))]
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, q):
+        """Upper bound of the bucket that contains the q-th percentile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds + (float("inf"),), self.buckets):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+        }
+
+
+class ThreadMetrics:
+    """One thread's private shard. Only its owner thread writes to it."""
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.worker_id = get_next_worker_id()
+        self.counters = {}
+        self.histograms = {}
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards = []
+        self._register_lock = threading.Lock()
+        self._retired_counters = {}
+        self._retired_histograms = {}
+        self._retired_threads = 0
+
+    def _shard(self):
+        try:
+            return self._local.metrics
+        except AttributeError:
+            shard = ThreadMetrics(threading.current_thread())
+            with self._register_lock:
+                self._shards.append(shard)
+            self._local.metrics = shard
+            return shard
+
+    @property
+    def worker_id(self):
+        return self._shard().worker_id
+
+    def inc(self, name, n=1):
+        counters = self._shard().counters
+        counters[name] = counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        histograms = self._shard().histograms
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def time(self, name):
+        """Context manager that observes the elapsed time of its block into histogram `name`."""
+        return _Timer(self, name)
+
+    def _retire_dead_shards(self):
+        # caller holds _register_lock. A dead thread can't write anymore, so its shard can be folded
+        alive = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                alive.append(shard)
+                continue
+            self._retired_threads += 1
+            for name, value in shard.counters.items():
+                self._retired_counters[name] = self._retired_counters.get(name, 0) + value
+            for name, histogram in shard.histograms.items():
+                merged = self._retired_histograms.get(name)
+                if merged is None:
+                    merged = self._retired_histograms[name] = Histogram(self.buckets)
+                merged.merge(histogram)
+        self._shards = alive
+
+    def snapshot(self, per_thread=False):
+        with self._register_lock:
+            self._retire_dead_shards()
+            shards = list(self._shards)
+            counters = dict(self._retired_counters)
+            histograms = {}
+            for name, histogram in self._retired_histograms.items():
+                histograms[name] = Histogram(self.buckets)
+                histograms[name].merge(histogram)
+            retired_threads = self._retired_threads
+
+        threads = {}
+        for shard in shards:
+            shard_counters = shard.counters.copy()
+            for name, value in shard_counters.items():
+                counters[name] = counters.get(name, 0) + value
+            for name, histogram in shard.histograms.copy().items():
+                merged = histograms.get(name)
+                if merged is None:
+                    merged = histograms[name] = Histogram(self.buckets)
+                merged.merge(histogram)
+            if per_thread:
+                threads[shard.worker_id] = {"thread": shard.thread.name, "counters": shard_counters}
+
+        result = {
+            "counters": counters,
+            "histograms": {name: h.to_dict() for name, h in histograms.items()},
+            "live_threads": len(shards),
+            "retired_threads": retired_threads,
+        }
+        if per_thread:
+            result["threads"] = threads
+        return result
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# --- Benchmark: global locked metrics vs per-thread registry ---
+def bench_locked(num_threads, ops):
+    counters = {}
+    lock = threading.Lock()
+
+    def worker():
+        for i in range(ops):
+            with lock:
+                counters["requests"] = counters.get("requests", 0) + 1
+                counters["bytes"] = counters.get("bytes", 0) + i
+
+    return _run(worker, num_threads), counters["requests"]
+
+def bench_registry(num_threads, ops):
+    registry = MetricsRegistry()
+
+    def worker():
+        inc = registry.inc
+        for i in range(ops):
+            inc("requests")
+            inc("bytes", i)
+
+    elapsed = _run(worker, num_threads)
+    return elapsed, registry.snapshot()["counters"]["requests"]
+
+def _run(worker, num_threads):
+    threads = [threading.Thread(target=worker) for _ in range(num_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+def run_benchmark(ops=100_000):
+    print(f"{'threads':>8} {'variant':>14} {'seconds':>8} {'Mops/s':>7} {'correct':>8}")
+    for num_threads in (1, 4, 16):
+        for name, bench in (("global lock", bench_locked), ("thread-local", bench_registry)):
+            elapsed, total = bench(num_threads, ops)
+            print(f"{num_threads:>8} {name:>14} {elapsed:>8.3f} {2 * ops * num_threads / elapsed / 1e6:>7.2f} "
+                  f"{str(total == ops * num_threads):>8}")
+
+
+if __name__ == "__main__":
+    metrics = MetricsRegistry()
+
+    def process_task():
+        with metrics.time("task_seconds"):
+            time.sleep(random.uniform(0.01, 0.05))
+        metrics.inc("tasks_processed")
+
+    def worker_thread(num_tasks: int):
+        print(f"Worker {metrics.worker_id} has started.")
+        for _ in range(num_tasks):
+            process_task()
+
+    threads = [threading.Thread(target=worker_thread, args=(5 + i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+    print("while running:", metrics.snapshot(per_thread=True)["counters"])
+    for t in threads:
+        t.join()
+
+    # the workers have exited, their numbers are still there
+    print("after exit:", metrics.snapshot())
+
+    print("\nBenchmark: recording 2 counters per op")
+    run_benchmark()
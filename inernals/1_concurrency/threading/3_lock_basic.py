@@ -40,4 +40,6 @@ thread2.join()
 
 print(f"Final counter value: {count}")
 
-# manually acquire and releasing is error prone
\ No newline at end of file
+# manually acquire and releasing is error prone
+# taking count_lock for every single increment also serializes all threads on one lock, see 3_lock_sharded_counter.py
+# to see how long threads actually wait for count_lock (and where), see 3_lock_instrumented.py
@@ -24,6 +24,7 @@ thread1.join()
 thread2.join()
 
 print(f"Final counter value: {count}")
+# For hot counters (e.g. request counters) prefer a sharded counter, see 3_lock_sharded_counter.py
 
 
 """
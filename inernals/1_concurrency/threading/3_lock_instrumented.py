@@ -0,0 +1,593 @@
+"""
+Instrumented Lock, RLock, Condition, Semaphore and Event
+
+3_lock_basic.py .. 7_event_object.py show how the primitives work, but not how long the threads spend blocked on
+them. A lock convoy (every thread queueing behind one hot lock) shows up as latency, not as an error.
+
+The classes here are drop-in replacements (same methods, usable with `with`) that record per call site:-
+- wait time: how long acquire()/wait() blocked
+- hold time: time between acquire and release (Lock, RLock, Semaphore)
+- contention: acquire first tries a non-blocking acquire. If that fails another thread holds the primitive,
+  the acquire is counted as contended and only then is the blocking wait timed.
+- call site: file:line (function) of the code that acquired, found by walking up the stack past threading.py
+  and the instrumentation methods, so `with cond:` is reported at the with statement, not inside threading.py.
+
+Waits and holds go into bucketed Histograms (the one from 2_local_data_metrics.py), so the memory per call site
+is fixed no matter how many acquires there are.
+
+Recording must not add contention to the primitive it measures, so (like MetricsRegistry in
+2_local_data_metrics.py) every thread records into its own per-site table, without a lock. summary() merges the
+tables, and folds the ones of exited threads into a retired total. A call site is recorded as (code object,
+line number) and only formatted as file:line (function) on read.
+
+enable()/disable() switch recording at runtime. When disabled, acquire() is one global check plus the real
+acquire: stack walking and timing only happen while enabled.
+
+Primitives with the same name share one set of stats (e.g. every "account" lock of a bank). The default name is
+the place where the primitive was created. report() ranks the names by total wait time.
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+from importlib.util import module_from_spec, spec_from_file_location
+
+_spec = spec_from_file_location("local_data_metrics", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                    "2_local_data_metrics.py"))
+_metrics = module_from_spec(_spec)
+_spec.loader.exec_module(_metrics)
+Histogram = _metrics.Histogram
+
+# lock waits are usually far below the 100us first bucket of the default latency buckets
+WAIT_BUCKETS = (1e-6, 1e-5, 5e-5, 1e-4, 5e-4, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_enabled = False
+_registry = {}  # name -> PrimitiveStats
+_registry_lock = threading.Lock()
+_internal_code = set()  # code objects of the methods below, filled in after the classes are defined
+_perf_counter = time.perf_counter
+_get_ident = threading.get_ident
+_threading_file = threading.__file__
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    with _registry_lock:
+        for stats in _registry.values():
+            stats.reset()
+
+
+def _call_site():
+    """(code, line) of the first frame outside the instrumentation and threading.py, formatted by _format_site."""
+    frame = sys._getframe(2)
+    while frame is not None and (frame.f_code in _internal_code or frame.f_code.co_filename == _threading_file):
+        frame = frame.f_back
+    if frame is None:
+        return None
+    return frame.f_code, frame.f_lineno
+
+def _format_site(site):
+    if site is None:
+        return "<unknown>"
+    code, line = site
+    return f"{os.path.basename(code.co_filename)}:{line} ({code.co_name})"
+
+
+class SiteStats:
+    __slots__ = ("acquires", "contended", "timeouts", "wait", "hold")
+
+    def __init__(self):
+        self.acquires = 0
+        self.contended = 0
+        self.timeouts = 0
+        self.wait = Histogram(WAIT_BUCKETS)
+        self.hold = Histogram(WAIT_BUCKETS)
+
+    def merge(self, other):
+        self.acquires += other.acquires
+        self.contended += other.contended
+        self.timeouts += other.timeouts
+        self.wait.merge(other.wait)
+        self.hold.merge(other.hold)
+
+
+class PrimitiveStats:
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        self._register_lock = threading.Lock()  # plain Lock, the stats must not instrument themselves
+        self._local = threading.local()  # .sites: the calling thread's own {site: SiteStats}
+        self._shards = []  # (thread, sites) of every thread that recorded, only that thread writes to sites
+        self._retired = {}  # sites of exited threads, merged
+
+    def _sites(self):
+        try:
+            return self._local.sites
+        except AttributeError:
+            # first record from this thread: register its table once
+            sites = {}
+            with self._register_lock:
+                self._shards.append((threading.current_thread(), sites))
+            self._local.sites = sites
+            return sites
+
+    def record_wait(self, site, wait, contended, acquired=True):
+        sites = self._sites()
+        stats = sites.get(site)
+        if stats is None:
+            stats = sites[site] = SiteStats()
+        stats.acquires += 1
+        if contended:
+            stats.contended += 1
+            stats.wait.observe(wait)
+        if not acquired:
+            stats.timeouts += 1
+
+    def record_hold(self, site, hold):
+        sites = self._sites()
+        stats = sites.get(site)
+        if stats is None:
+            stats = sites[site] = SiteStats()
+        stats.hold.observe(hold)
+
+    def reset(self):
+        with self._register_lock:
+            # every thread registers a fresh table on its next record
+            self._local = threading.local()
+            self._shards = []
+            self._retired = {}
+
+    def _merged_sites(self):
+        merged = {}
+        with self._register_lock:
+            alive = []
+            for thread, sites in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, sites))
+                    continue
+                # a dead thread can't record anymore, fold its table
+                for site, stats in sites.items():
+                    retired = self._retired.get(site)
+                    if retired is None:
+                        retired = self._retired[site] = SiteStats()
+                    retired.merge(stats)
+            self._shards = alive
+            tables = [self._retired] + [sites.copy() for _, sites in alive]
+            for sites in tables:
+                for site, stats in sites.items():
+                    total = merged.get(site)
+                    if total is None:
+                        total = merged[site] = SiteStats()
+                    total.merge(stats)
+        return {_format_site(site): stats for site, stats in merged.items()}
+
+    def summary(self):
+        sites = list(self._merged_sites().items())
+        wait, hold = Histogram(WAIT_BUCKETS), Histogram(WAIT_BUCKETS)
+        acquires = contended = timeouts = 0
+        for _, s in sites:
+            acquires += s.acquires
+            contended += s.contended
+            timeouts += s.timeouts
+            wait.merge(s.wait)
+            hold.merge(s.hold)
+        sites.sort(key=lambda item: item[1].wait.total, reverse=True)
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "acquires": acquires,
+            "contended": contended,
+            "timeouts": timeouts,
+            "total_wait": wait.total,
+            "wait": wait.to_dict(),
+            "hold": hold.to_dict(),
+            "sites": [(site, {"acquires": s.acquires, "contended": s.contended, "total_wait": s.wait.total,
+                              "total_hold": s.hold.total}) for site, s in sites],
+        }
+
+
+def _stats_for(name, kind):
+    if name is None:
+        name = f"{kind}@{_format_site(_call_site())}"
+    with _registry_lock:
+        stats = _registry.get(name)
+        if stats is None:
+            stats = _registry[name] = PrimitiveStats(name, kind)
+        return stats
+
+
+class InstrumentedLock:
+    _kind = "Lock"
+    _factory = staticmethod(threading.Lock)
+
+    def __init__(self, name=None):
+        self._lock = self._factory()
+        self.stats = _stats_for(name, self._kind)
+        self._acquired_at = None
+        self._site = None
+
+    def _timed_acquire(self, blocking, timeout):
+        """Acquires self._lock and records the wait. Returns True if acquired."""
+        if self._lock.acquire(False):
+            wait, contended, acquired = 0.0, False, True
+        elif not blocking:
+            wait, contended, acquired = 0.0, True, False
+        else:
+            start = _perf_counter()
+            acquired = self._lock.acquire(True, timeout)
+            wait, contended = _perf_counter() - start, True
+        site = _call_site()
+        self.stats.record_wait(site, wait, contended, acquired)
+        if acquired:
+            self._acquired_at = _perf_counter()
+            self._site = site
+        return acquired
+
+    def _end_hold(self):
+        # caller still holds the lock, returns (site, hold) to record after the release
+        hold = _perf_counter() - self._acquired_at
+        site = self._site
+        self._acquired_at = None
+        return site, hold
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not _enabled:
+            return self._lock.acquire(blocking, timeout)
+        return self._timed_acquire(blocking, timeout)
+
+    def release(self):
+        if self._acquired_at is None:
+            self._lock.release()
+            return
+        site, hold = self._end_hold()
+        self._lock.release()
+        self.stats.record_hold(site, hold)
+
+    def locked(self):
+        return self._lock.locked()
+
+    # acquire() and release() inlined: one Python call less per `with` block, most of the cost when disabled
+    def __enter__(self):
+        if not _enabled:
+            return self._lock.acquire()
+        return self._timed_acquire(True, -1)
+
+    def __exit__(self, *exc):
+        if self._acquired_at is None:
+            self._lock.release()
+        else:
+            self.release()
+
+    # used by threading.Condition: waiting releases the lock without counting the wait as hold time
+    def _is_owned(self):
+        return self._lock.locked()
+
+    def _release_save(self):
+        self.release()
+
+    def _acquire_restore(self, state):
+        self._lock.acquire()
+        if _enabled:
+            self._acquired_at = _perf_counter()
+
+
+class InstrumentedRLock(InstrumentedLock):
+    _kind = "RLock"
+    _factory = staticmethod(threading.RLock)  # re-entrancy stays in the C RLock, also when disabled
+
+    def __init__(self, name=None):
+        super().__init__(name)
+        # timed path only: the thread whose outermost acquire is being timed, and its depth
+        self._owner = None
+        self._depth = 0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not _enabled:
+            return self._lock.acquire(blocking, timeout)
+        me = _get_ident()
+        if self._owner == me:
+            self._lock.acquire()
+            self._depth += 1
+            return True
+        if not self._timed_acquire(blocking, timeout):
+            return False
+        self._owner = me
+        self._depth = 1
+        return True
+
+    def release(self):
+        if self._owner is None or self._owner != _get_ident():
+            self._lock.release()  # untimed acquire, the RLock itself rejects a thread that doesn't own it
+            return
+        self._depth -= 1
+        if self._depth:
+            self._lock.release()
+            return
+        self._owner = None
+        super().release()
+
+    def locked(self):
+        if self._lock._is_owned():
+            return True
+        if self._lock.acquire(False):
+            self._lock.release()
+            return False
+        return True
+
+    def __enter__(self):
+        if not _enabled:
+            return self._lock.acquire()
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        if self._owner is None:
+            self._lock.release()
+        else:
+            self.release()
+
+    # threading.Condition's protocol, delegated to the RLock's own: waiting releases every level at once
+    def _is_owned(self):
+        return self._lock._is_owned()
+
+    def _release_save(self):
+        if self._owner is None or self._owner != _get_ident():
+            return self._lock._release_save(), 0
+        depth, self._owner, self._depth = self._depth, None, 0
+        site, hold = self._end_hold()
+        state = self._lock._release_save()
+        self.stats.record_hold(site, hold)
+        return state, depth
+
+    def _acquire_restore(self, saved):
+        state, depth = saved
+        self._lock._acquire_restore(state)
+        if depth and _enabled:
+            self._owner = _get_ident()
+            self._depth = depth
+            self._acquired_at = _perf_counter()
+
+
+class InstrumentedCondition(threading.Condition):
+    """Condition over an InstrumentedRLock. wait() time is recorded under the condition's own name."""
+
+    def __init__(self, lock=None, name=None):
+        self.stats = _stats_for(name, "Condition")
+        if lock is None:
+            lock = InstrumentedRLock(name=f"{self.stats.name}.lock")
+        super().__init__(lock)
+
+    def wait(self, timeout=None):
+        if not _enabled:
+            return super().wait(timeout)
+        site = _call_site()
+        start = _perf_counter()
+        notified = super().wait(timeout)
+        # a wait() always blocks, so it always counts as contended
+        self.stats.record_wait(site, _perf_counter() - start, True, notified)
+        return notified
+
+
+class InstrumentedSemaphore(InstrumentedLock):
+    """
+    Hold time is measured first-in first-out: a release() ends the oldest outstanding acquire, because a
+    semaphore may be released by a different thread than the one that acquired it.
+    """
+    _kind = "Semaphore"
+
+    def __init__(self, value=1, name=None):
+        self._lock = self._make(value)
+        self.stats = _stats_for(name, self._kind)
+        self._holds = collections.deque()  # (acquired_at, site)
+        self._acquired_at = None
+
+    @staticmethod
+    def _make(value):
+        return threading.Semaphore(value)
+
+    def acquire(self, blocking=True, timeout=None):
+        if not _enabled:
+            return self._lock.acquire(blocking, timeout)
+        if self._lock.acquire(False):
+            wait, contended, acquired = 0.0, False, True
+        elif not blocking:
+            wait, contended, acquired = 0.0, True, False
+        else:
+            start = _perf_counter()
+            acquired = self._lock.acquire(True, timeout)
+            wait, contended = _perf_counter() - start, True
+        site = _call_site()
+        self.stats.record_wait(site, wait, contended, acquired)
+        if acquired:
+            self._holds.append((_perf_counter(), site))
+        return acquired
+
+    def release(self, n=1):
+        ends = []
+        for _ in range(n):
+            try:
+                ends.append(self._holds.popleft())
+            except IndexError:
+                break
+        self._lock.release(n)
+        now = _perf_counter()
+        for acquired_at, site in ends:
+            self.stats.record_hold(site, now - acquired_at)
+
+    def locked(self):
+        if self._lock.acquire(False):
+            self._lock.release()
+            return False
+        return True
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class InstrumentedBoundedSemaphore(InstrumentedSemaphore):
+    _kind = "BoundedSemaphore"
+
+    @staticmethod
+    def _make(value):
+        return threading.BoundedSemaphore(value)
+
+
+class InstrumentedEvent:
+    def __init__(self, name=None):
+        self._event = threading.Event()
+        self.stats = _stats_for(name, "Event")
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    def wait(self, timeout=None):
+        if not _enabled:
+            return self._event.wait(timeout)
+        site = _call_site()
+        if self._event.is_set():
+            self.stats.record_wait(site, 0.0, False)
+            return True
+        start = _perf_counter()
+        flag = self._event.wait(timeout)
+        self.stats.record_wait(site, _perf_counter() - start, True, flag)
+        return flag
+
+
+for _cls in (InstrumentedLock, InstrumentedRLock, InstrumentedCondition, InstrumentedSemaphore, InstrumentedEvent):
+    _internal_code.update(f.__code__ for f in vars(_cls).values() if hasattr(f, "__code__"))
+
+
+def snapshot():
+    with _registry_lock:
+        stats = list(_registry.values())
+    summaries = [s.summary() for s in stats]
+    summaries.sort(key=lambda s: s["total_wait"], reverse=True)
+    return summaries
+
+def report(top=10, sites_per_lock=3):
+    """Text table of the primitives with the most total wait time, with their worst call sites."""
+    lines = [f"{'name':<44} {'kind':<10} {'acquires':>9} {'contended':>10} {'total wait s':>13} "
+             f"{'p99 wait ms':>12} {'p99 hold ms':>12}"]
+    for s in snapshot()[:top]:
+        if not s["acquires"]:
+            continue
+        contended = s["contended"] / s["acquires"] * 100
+        lines.append(f"{s['name'][:44]:<44} {s['kind']:<10} {s['acquires']:>9} {contended:>9.1f}% "
+                     f"{s['total_wait']:>13.4f} {s['wait']['p99'] * 1000:>12.3f} {s['hold']['p99'] * 1000:>12.3f}")
+        for site, site_stats in s["sites"][:sites_per_lock]:
+            lines.append(f"    {site:<60} acquires={site_stats['acquires']} contended={site_stats['contended']} "
+                         f"wait={site_stats['total_wait']:.4f}s hold={site_stats['total_hold']:.4f}s")
+    return "\n".join(lines)
+
+
+# --- Benchmark: overhead when disabled and enabled ---
+def _time_uncontended(lock, n):
+    start = _perf_counter()
+    for _ in range(n):
+        with lock:
+            pass
+    return (_perf_counter() - start) / n
+
+def _time_contended(lock, n, num_threads=4):
+    def worker():
+        for _ in range(n):
+            with lock:
+                pass
+
+    threads = [threading.Thread(target=worker) for _ in range(num_threads)]
+    start = _perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return (_perf_counter() - start) / (n * num_threads)
+
+def run_benchmark(n=200_000):
+    variants = (
+        ("threading.Lock", lambda: threading.Lock(), False),
+        ("InstrumentedLock off", lambda: InstrumentedLock(name="bench-off"), False),
+        ("InstrumentedLock on", lambda: InstrumentedLock(name="bench-on"), True),
+        ("threading.RLock", lambda: threading.RLock(), False),
+        ("InstrumentedRLock off", lambda: InstrumentedRLock(name="bench-rlock-off"), False),
+        ("InstrumentedRLock on", lambda: InstrumentedRLock(name="bench-rlock-on"), True),
+    )
+    print(f"{'primitive':>24} {'uncontended ns':>15} {'4 threads ns':>13}")
+    for name, make, on in variants:
+        enable() if on else disable()
+        uncontended = _time_uncontended(make(), n)
+        contended = _time_contended(make(), n // 4)
+        print(f"{name:>24} {uncontended * 1e9:>15.0f} {contended * 1e9:>13.0f}")
+    disable()
+
+
+if __name__ == "__main__":
+    # the counter of 3_lock_basic.py next to a lock that is held while doing slow work (a convoy)
+    count_lock = InstrumentedLock(name="count_lock")
+    slow_lock = InstrumentedLock(name="slow_lock")
+    ready = InstrumentedEvent(name="ready")
+    slots = InstrumentedSemaphore(2, name="slots")
+    cond = InstrumentedCondition(name="items")
+    items = []
+    count = 0
+
+    def inc_counter():
+        global count
+        ready.wait()
+        for _ in range(20000):
+            with count_lock:
+                count += 1
+
+    def slow_worker():
+        ready.wait()
+        for _ in range(5):
+            with slow_lock:
+                time.sleep(0.01)  # I/O while holding the lock: everybody else queues up
+            with slots:
+                time.sleep(0.005)
+
+    def consumer():
+        with cond:
+            cond.wait_for(lambda: items)
+            items.pop()
+
+    enable()
+    threads = [threading.Thread(target=inc_counter) for _ in range(2)]
+    threads += [threading.Thread(target=slow_worker) for _ in range(4)]
+    threads += [threading.Thread(target=consumer) for _ in range(2)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    ready.set()
+    for _ in range(2):
+        time.sleep(0.02)
+        with cond:
+            items.append("item")
+            cond.notify()
+    for t in threads:
+        t.join()
+
+    print(f"Final counter value: {count}")
+    print(report())
+
+    print("\nBenchmark: cost per acquire/release pair")
+    run_benchmark()
@@ -0,0 +1,182 @@
+"""
+Sharded (striped) counter
+
+In 3_lock_basic.py every increment does count_lock.acquire() / count_lock.release(), 100,000 times per thread.
+All threads fight over the same lock, so the "parallel" counting is fully serialized and most of the time is spent
+handing the lock from one thread to another (lock convoy).
+
+The idea behind a sharded counter:-
+1. Split the single counter into many cells instead of one shared integer.
+2. Every thread only writes to its own cell, so the hot path (increment) needs no lock at all.
+3. Reading the value merges (sums) all the cells. Reads are rare compared to writes, so making them a bit
+   more expensive is a good trade.
+
+How ShardedCounter works:-
+- A threading.local holds a reference to the calling thread's cell (a one element list).
+- The first time a thread touches the counter, its cell is created and registered in a shared list.
+  This is the only place a lock is taken, once per thread for its whole lifetime.
+- inc()/add(n) update the thread's own cell. Only the owning thread ever writes to a cell, so no other
+  thread can interleave with the read-modify-write.
+- value() sums every registered cell. The cells of threads that have exited are folded into a base total
+  (a dead thread can't write anymore) and unregistered, so their counts are never lost and the list of
+  cells, and the cost of value(), doesn't grow with every thread that ever touched the counter.
+- add(n) lets a thread fold a whole batch into one update (e.g. count locally in a loop, then add once).
+
+Trade-off: value() is a snapshot. While writers are running it can miss increments that are happening at
+the same moment, exactly like reading a single counter without taking its lock. Once the writers are
+joined the value is exact.
+"""
+
+import threading
+import time
+
+
+class ShardedCounter:
+    """A counter where every thread increments its own cell and reads merge all cells."""
+
+    def __init__(self, initial=0):
+        self._local = threading.local()
+        self._cells = []  # (thread, cell) of the threads that may still write
+        self._register_lock = threading.Lock()
+        self._base = initial
+
+    def _new_cell(self):
+        # first touch from this thread: register its cell once
+        cell = [0]
+        with self._register_lock:
+            self._fold_dead_cells()
+            self._cells.append((threading.current_thread(), cell))
+        self._local.cell = cell
+        return cell
+
+    def _fold_dead_cells(self):
+        # caller holds _register_lock
+        alive = []
+        for thread, cell in self._cells:
+            if thread.is_alive():
+                alive.append((thread, cell))
+            else:
+                self._base += cell[0]
+        self._cells = alive
+
+    def inc(self):
+        self.add(1)
+
+    def add(self, n):
+        """Adds n to the calling thread's cell. No lock is taken on this path."""
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._new_cell()
+        cell[0] += n
+
+    def value(self):
+        """Merges all cells (including ones owned by exited threads) into a single total."""
+        with self._register_lock:
+            self._fold_dead_cells()
+            return self._base + sum(cell[0] for _, cell in self._cells)
+
+    def reset(self):
+        with self._register_lock:
+            for _, cell in self._cells:
+                cell[0] = 0
+            self._base = 0
+
+    def __int__(self):
+        return self.value()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(value={self.value()}, cells={len(self._cells)})"
+
+
+# Same shape as inc_counter in 3_lock_basic.py / 3_lock_basic_with.py, but using the sharded counter
+request_counter = ShardedCounter()
+
+def inc_counter():
+    for _ in range(100000):
+        request_counter.inc()
+
+def inc_counter_bulk():
+    # bulk version: count locally and publish once
+    local_count = 0
+    for _ in range(100000):
+        local_count += 1
+    request_counter.add(local_count)
+
+
+# --- Benchmark: single lock vs sharded counter ---
+INCREMENTS_PER_THREAD = 100000
+
+def _run_threads(target, num_threads):
+    threads = [threading.Thread(target=target) for _ in range(num_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+def bench_single_lock(num_threads):
+    state = {"count": 0}
+    count_lock = threading.Lock()
+
+    def worker():
+        for _ in range(INCREMENTS_PER_THREAD):
+            with count_lock:
+                state["count"] += 1
+
+    elapsed = _run_threads(worker, num_threads)
+    return elapsed, state["count"]
+
+def bench_sharded(num_threads):
+    counter = ShardedCounter()
+
+    def worker():
+        inc = counter.inc
+        for _ in range(INCREMENTS_PER_THREAD):
+            inc()
+
+    elapsed = _run_threads(worker, num_threads)
+    return elapsed, counter.value()
+
+def bench_sharded_bulk(num_threads, batch=100):
+    counter = ShardedCounter()
+
+    def worker():
+        add = counter.add
+        for _ in range(INCREMENTS_PER_THREAD // batch):
+            add(batch)
+
+    elapsed = _run_threads(worker, num_threads)
+    return elapsed, counter.value()
+
+def run_benchmark(thread_counts=(2, 8, 32)):
+    print(f"{'threads':>8} {'variant':>16} {'seconds':>9} {'Mops/s':>8} {'correct':>8}")
+    for num_threads in thread_counts:
+        expected = num_threads * INCREMENTS_PER_THREAD
+        for name, bench in (("single lock", bench_single_lock),
+                            ("sharded", bench_sharded),
+                            ("sharded add(100)", bench_sharded_bulk)):
+            elapsed, total = bench(num_threads)
+            ops = expected / elapsed / 1e6
+            print(f"{num_threads:>8} {name:>16} {elapsed:>9.4f} {ops:>8.2f} {str(total == expected):>8}")
+
+
+if __name__ == "__main__":
+    thread1 = threading.Thread(target=inc_counter)
+    thread2 = threading.Thread(target=inc_counter)
+    thread3 = threading.Thread(target=inc_counter_bulk)
+
+    thread1.start()
+    thread2.start()
+    thread3.start()
+
+    thread1.join()
+    thread2.join()
+    thread3.join()
+
+    print(f"Final counter value: {request_counter.value()}")
+    # 300000, the cells of the finished threads are still merged on read
+
+    print("\nBenchmark: single count_lock vs sharded counter")
+    run_benchmark()
@@ -6,21 +6,32 @@ If both transfer and deposit use a standard Lock, a transfer call will acquire t
 The deposit call will try to acquire the same lock, causing a deadlock because the thread is waiting for itself to release a lock it already holds.
 """
 
-# Here spot it's a deadlock
+# Here spot it's a deadlock:- transfer used to hold only self.lock and then call other_account.deposit,
+# which takes other_account.lock. account1 -> account2 and account2 -> account1 running at the same time
+# each hold one lock and wait for the other one forever.
+# Fix:- always acquire both locks in the same global order (by account id). deposit() then re-acquires
+# the other account's lock that transfer already holds, which is exactly why these are RLocks.
+# For millions of accounts and batched settlement see 4_rlock_transfer_ledger.py
+import itertools
 import threading
 
+_account_ids = itertools.count()
+
 class BankAccount:
     def __init__(self, initial_banace=0):
+        self.id = next(_account_ids)
         self.balance = initial_banace
         self.lock = threading.RLock()
 
     def deposit(self, amount):
+        # no print here: transfer() calls deposit() while holding both locks, and I/O under a lock
+        # stretches the critical section for every other thread waiting on it
         with self.lock:
             self.balance += amount
-            print(f'Amount {amount} has deposited successfully')
 
     def transfer(self, amount, other_account):
-        with self.lock:
+        first, second = sorted((self, other_account), key=lambda account: account.id)
+        with first.lock, second.lock:
             if self.balance < amount:
                 raise ValueError('Insufficient funds')
             self.balance -= amount
@@ -32,5 +43,7 @@ account2 = BankAccount(500)
 thread = threading.Thread(target= lambda: account1.transfer(200, account2))
 thread2 = threading.Thread(target=lambda: account2.transfer(100, account1))
 thread.start()
+thread2.start()
 thread.join()
+thread2.join()
 print(f"Final balances: Account1={account1.balance}, Account2={account2.balance}")
\ No newline at end of file
@@ -1,33 +1,262 @@
 # problem Statement
 
-# You have cache which has get, set, clear and reconfigure method. reconfigure will call the clear internally
+# You have cache which has get, set, clear and reconfigure method. reconfigure can call the clear internally
+
+"""
+Problems with the first version of ReconfigurableCache:-
+1. self._lock = threading.RLock assigned the class itself, not a lock instance, so `with self._lock` fails.
+2. next(self._cache) fails because a dict is not an iterator (it would need next(iter(self._cache))),
+   and even then it evicts the *oldest inserted* key, not the least recently used one.
+3. reconfigure() cleared the whole cache on every resize, so every reconfigure caused a cold start.
+
+The cache engine below fixes these:-
+- LRU in O(1): every shard keeps an OrderedDict. A hit does move_to_end(key), eviction does popitem(last=False).
+- Optional TTL per entry: every entry stores (value, expires_at). Expired entries are dropped lazily on get.
+- Lock striping: keys are spread over N shards by hash(key). Each shard has its own RLock, so threads that
+  touch different shards don't block each other. LRU order is kept per shard (approximate global LRU).
+- Counters per shard: hits, misses, evictions, expirations. stats() merges them.
+- reconfigure(new_size) only trims the least recently used entries of each shard, so the hottest
+  entries survive a resize. The shard count follows the size (up to num_shards, but every shard holds at
+  least MIN_SHARD_SIZE entries): when it changes the entries are re-hashed into new shards, oldest first and
+  taking turns between the old shards, so the per-shard trim still drops roughly the least recently used
+  ones. With tiny shards an uneven hash spread would leave some full while others stay empty, and the
+  cache would hold far fewer than max_size entries.
+
+Why RLock:- reconfigure(new_size, clear=True) holds the cache lock and then calls clear(), which takes the
+same lock again from the same thread. A standard Lock would deadlock there.
+"""
+
 import threading
+import time
+import random
+from collections import OrderedDict
+from itertools import zip_longest
+
+MIN_SHARD_SIZE = 64  # fewer shards rather than shards this small
+_MISSING = object()
+_RETIRED = object()  # returned by a shard that was replaced by reconfigure(), the caller looks up the new one
+
+
+class _CacheShard:
+    """One stripe of the cache: an LRU ordered dict protected by its own lock."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.data = OrderedDict()  # key -> (value, expires_at or None)
+        self.lock = threading.RLock()
+        self.retired = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, now):
+        with self.lock:
+            if self.retired:
+                return _RETIRED
+            entry = self.data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return _MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del self.data[key]
+                self.expirations += 1
+                self.misses += 1
+                return _MISSING
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, expires_at):
+        with self.lock:
+            if self.retired:
+                return _RETIRED
+            self.data[key] = (value, expires_at)
+            self.data.move_to_end(key)
+            self._evict_to(self.max_size)
+            return None
+
+    def delete(self, key):
+        with self.lock:
+            if self.retired:
+                return _RETIRED
+            return self.data.pop(key, _MISSING) is not _MISSING
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def resize(self, max_size):
+        with self.lock:
+            self.max_size = max_size
+            self._evict_to(max_size)
+
+    def _evict_to(self, size):
+        # popitem(last=False) removes the least recently used key in O(1)
+        while len(self.data) > size:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+
+def _check_size(size):
+    if size < 1:
+        raise ValueError(f"cache size must be at least 1, got {size}")
+
 
 class ReconfigurableCache:
-    def __init__(self, max_size=1000):
-        self._cache = {}
+    def __init__(self, max_size=1000, num_shards=16, default_ttl=None, clock=time.monotonic):
+        _check_size(max_size)
+        self._lock = threading.RLock()
         self._max_size = max_size
-        self._lock = threading.RLock
+        self._max_shards = num_shards
+        self._default_ttl = default_ttl
+        self._clock = clock
+        # counters of the shards replaced by reconfigure(), stats() adds them
+        self._retired_stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        self._shards = self._new_shards(max_size)
 
-    def get(self, key):
-        with self._lock:
-            return self._cache.get(key)
-    
-    def set(self, key, val):
-        with self._lock:
-            if len(self._cache) >= self._max_size:
-                oldest_key = next(self._cache)
-                del self._cache[oldest_key]
+    def _new_shards(self, max_size):
+        count = max(1, min(self._max_shards, max_size // MIN_SHARD_SIZE))
+        base, extra = divmod(max_size, count)
+        return [_CacheShard(base + (1 if i < extra else 0)) for i in range(count)]
+
+    def _shard(self, key):
+        shards = self._shards  # one read, reconfigure() may replace the list
+        return shards[hash(key) % len(shards)]
+
+    def get(self, key, default=None):
+        value = _RETIRED
+        while value is _RETIRED:
+            value = self._shard(key).get(key, self._clock())
+        return default if value is _MISSING else value
+
+    def set(self, key, val, ttl=None):
+        """Stores val under key. ttl (seconds) overrides the cache's default_ttl for this entry."""
+        if ttl is None:
+            ttl = self._default_ttl
+        expires_at = None if ttl is None else self._clock() + ttl
+        while self._shard(key).set(key, val, expires_at) is _RETIRED:
+            pass
 
-            self._cache[key] = val
+    def delete(self, key):
+        deleted = _RETIRED
+        while deleted is _RETIRED:
+            deleted = self._shard(key).delete(key)
+        return deleted
 
     def clear(self):
         with self._lock:
-            self._cache.clear()
-    
-    def reconfigure(self, new_size):
+            for shard in self._shards:
+                shard.clear()
+
+    def reconfigure(self, new_size, clear=False):
+        """Changes the capacity and keeps the most recently used entries of every shard."""
+        _check_size(new_size)
         with self._lock:
+            if clear:
+                self.clear()
             self._max_size = new_size
-            self.clear()
+            new_shards = self._new_shards(new_size)
+            if len(new_shards) == len(self._shards):
+                for shard, new_shard in zip(self._shards, new_shards):
+                    shard.resize(new_shard.max_size)
+            else:
+                self._reshard(new_shards)
+
+    def _reshard(self, new_shards):
+        # caller holds self._lock. Every old shard stays locked until the new list is in place, a get/set/delete
+        # waiting on one of them then sees it retired and retries on the new shards.
+        old_shards = self._shards
+        for shard in old_shards:
+            shard.lock.acquire()
+        try:
+            count = len(new_shards)
+            for items in zip_longest(*(shard.data.items() for shard in old_shards)):
+                for item in items:
+                    if item is not None:
+                        key, entry = item
+                        new_shards[hash(key) % count].data[key] = entry
+            for shard in new_shards:
+                shard._evict_to(shard.max_size)
+            for shard in old_shards:
+                shard.retired = True
+                shard.data.clear()
+                for name in self._retired_stats:
+                    self._retired_stats[name] += getattr(shard, name)
+            self._shards = new_shards
+        finally:
+            for shard in reversed(old_shards):
+                shard.lock.release()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._retired_stats)
+            shards = self._shards
+        size = 0
+        for shard in shards:
+            with shard.lock:
+                for name in counts:
+                    counts[name] += getattr(shard, name)
+                size += len(shard.data)
+        lookups = counts["hits"] + counts["misses"]
+        return {
+            "size": size,
+            "max_size": self._max_size,
+            **counts,
+            "hit_ratio": counts["hits"] / lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return sum(len(shard.data) for shard in self._shards)
+
+
+# --- Benchmark: get/set throughput under 1-32 threads ---
+def _cache_worker(cache, ops, key_space, seed):
+    rnd = random.Random(seed)
+    get, put = cache.get, cache.set
+    for _ in range(ops):
+        # skewed keys: low keys are much hotter than high ones
+        key = int(key_space * rnd.random() ** 3)
+        if rnd.random() < 0.8:
+            if get(key) is None:
+                put(key, key)
+        else:
+            put(key, key)
+
+def run_benchmark(thread_counts=(1, 2, 4, 8, 16, 32), total_ops=200_000, max_size=5_000):
+    print(f"{'threads':>8} {'shards':>7} {'ops/s':>12} {'hit ratio':>10}")
+    for num_threads in thread_counts:
+        for num_shards in (1, 16):
+            cache = ReconfigurableCache(max_size=max_size, num_shards=num_shards)
+            ops = total_ops // num_threads
+            threads = [threading.Thread(target=_cache_worker, args=(cache, ops, max_size * 4, i))
+                       for i in range(num_threads)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+            stats = cache.stats()
+            print(f"{num_threads:>8} {num_shards:>7} {ops * num_threads / elapsed:>12,.0f} {stats['hit_ratio']:>10.2%}")
+
+
+if __name__ == "__main__":
+    cache = ReconfigurableCache(max_size=4, num_shards=1)
+    for key in "abcd":
+        cache.set(key, key.upper())
+    cache.get("a")          # 'a' is now the most recently used key
+    cache.set("e", "E")     # evicts 'b', the least recently used key
+    print("after eviction:", list(cache._shards[0].data))
+
+    cache.reconfigure(2)    # keeps the two hottest entries instead of clearing everything
+    print("after reconfigure(2):", list(cache._shards[0].data))
+
+    cache.set("session", "token", ttl=0.05)
+    time.sleep(0.1)
+    print("expired entry:", cache.get("session"))
+    print(cache.stats())
 
-    
\ No newline at end of file
+    print("\nBenchmark: get/set throughput")
+    run_benchmark()
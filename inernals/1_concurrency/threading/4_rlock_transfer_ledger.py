@@ -0,0 +1,202 @@
+"""
+TransferLedger:- BankAccount (4_rlock_example_bank.py) scaled to millions of accounts
+
+Why BankAccount objects don't scale:-
+1. Every account is a Python object with a __dict__ and its own RLock, that's a few hundred bytes per account.
+   Millions of accounts means hundreds of MB just for bookkeeping.
+2. One lock acquisition pair per transfer, plus a print under the lock.
+3. Lock ordering has to be remembered at every call site, otherwise opposite transfers deadlock.
+
+How the ledger works:-
+- Balances live in one array('q') (signed 64 bit integers, e.g. cents). 8 bytes per account, no per-account object.
+- Lock striping: instead of one lock per account there are num_stripes locks and account i is protected by
+  stripe i % num_stripes. Memory for locks is fixed no matter how many accounts there are.
+- Ordered multi-lock acquisition: an operation collects the stripes it needs, de-duplicates them and
+  acquires them in ascending stripe index. Every thread uses the same order, so no cycle (deadlock) can form.
+- Batched submission: submit_batch() takes many transfers, locks the union of their stripes once (in order)
+  and applies them all inside that single critical section. Lock cost is paid per batch, not per transfer.
+- Transfers that would overdraw are rejected (InsufficientFunds for a single transfer, False in a batch result),
+  nothing is printed while a lock is held. An amount <= 0 is a ValueError (a negative amount would pass the
+  overdraft check and move money the other way).
+"""
+
+import contextlib
+import io
+import os
+import random
+import threading
+import time
+import tracemalloc
+from array import array
+from importlib.util import module_from_spec, spec_from_file_location
+
+
+class InsufficientFunds(ValueError):
+    pass
+
+
+class TransferLedger:
+    def __init__(self, num_accounts, initial_balance=0, num_stripes=1024):
+        self.num_accounts = num_accounts
+        self._balances = array('q', [initial_balance]) * num_accounts
+        self._num_stripes = max(1, min(num_stripes, num_accounts))
+        self._stripes = [threading.Lock() for _ in range(self._num_stripes)]
+
+    def _check(self, account):
+        if not 0 <= account < self.num_accounts:
+            raise IndexError(f"unknown account {account}")
+
+    def _acquire(self, stripe_ids):
+        """Acquires the given stripes in ascending order and returns them for release."""
+        locks = [self._stripes[i] for i in sorted(stripe_ids)]
+        for lock in locks:
+            lock.acquire()
+        return locks
+
+    @staticmethod
+    def _release(locks):
+        for lock in reversed(locks):
+            lock.release()
+
+    def balance(self, account):
+        self._check(account)
+        with self._stripes[account % self._num_stripes]:
+            return self._balances[account]
+
+    def deposit(self, account, amount):
+        self._check(account)
+        with self._stripes[account % self._num_stripes]:
+            self._balances[account] += amount
+
+    def transfer(self, src, dst, amount):
+        self._check(src)
+        self._check(dst)
+        if amount <= 0:
+            raise ValueError(f"transfer amount must be > 0, got {amount}")
+        locks = self._acquire({src % self._num_stripes, dst % self._num_stripes})
+        try:
+            balances = self._balances
+            if balances[src] < amount:
+                raise InsufficientFunds(f"account {src} has insufficient funds")
+            balances[src] -= amount
+            balances[dst] += amount
+        finally:
+            self._release(locks)
+
+    def submit_batch(self, transfers):
+        """
+        Applies a batch of (src, dst, amount) transfers in order under one ordered lock acquisition.
+        Returns a list of booleans, False for transfers rejected for insufficient funds.
+        """
+        transfers = list(transfers)  # iterated twice, a generator would be empty the second time
+        n, stripes = self.num_accounts, self._num_stripes
+        needed = set()
+        for src, dst, amount in transfers:
+            if not (0 <= src < n and 0 <= dst < n):
+                raise IndexError(f"unknown account in transfer {src} -> {dst}")
+            if amount <= 0:
+                raise ValueError(f"transfer amount must be > 0, got {amount} in {src} -> {dst}")
+            needed.add(src % stripes)
+            needed.add(dst % stripes)
+
+        results = []
+        locks = self._acquire(needed)
+        try:
+            balances = self._balances
+            for src, dst, amount in transfers:
+                if balances[src] < amount:
+                    results.append(False)
+                    continue
+                balances[src] -= amount
+                balances[dst] += amount
+                results.append(True)
+        finally:
+            self._release(locks)
+        return results
+
+    def total(self):
+        """Sum of all balances, taken with every stripe held so it is a consistent snapshot."""
+        locks = self._acquire(range(self._num_stripes))
+        try:
+            return sum(self._balances)
+        finally:
+            self._release(locks)
+
+    def memory_bytes(self):
+        return self._balances.itemsize * len(self._balances)
+
+
+# --- Benchmark: random transfers across many threads ---
+def _random_transfers(num_accounts, count, seed):
+    rnd = random.Random(seed)
+    return [(rnd.randrange(num_accounts), rnd.randrange(num_accounts), rnd.randint(1, 100))
+            for _ in range(count)]
+
+def bench_ledger(ledger, num_threads, transfers_per_thread, batch_size=None):
+    work = [_random_transfers(ledger.num_accounts, transfers_per_thread, seed) for seed in range(num_threads)]
+
+    def worker(transfers):
+        if batch_size:
+            for start in range(0, len(transfers), batch_size):
+                ledger.submit_batch(transfers[start:start + batch_size])
+        else:
+            for src, dst, amount in transfers:
+                try:
+                    ledger.transfer(src, dst, amount)
+                except InsufficientFunds:
+                    pass
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in work]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+def run_benchmark(num_accounts=1_000_000, total_transfers=400_000):
+    # memory: 100k dict based BankAccount objects vs the same number of array slots
+    # (file names start with a digit, so the module is loaded from its path)
+    spec = spec_from_file_location("bank", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                        "4_rlock_example_bank.py"))
+    bank = module_from_spec(spec)
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(bank)
+    tracemalloc.start()
+    accounts = [bank.BankAccount(1000) for _ in range(100_000)]
+    objects_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del accounts
+    print(f"memory for 100k accounts: BankAccount objects {objects_bytes / 1e6:.1f} MB, "
+          f"ledger array {TransferLedger(100_000).memory_bytes() / 1e6:.1f} MB")
+
+    print(f"\n{'threads':>8} {'mode':>12} {'transfers/s':>13} {'conserved':>10}")
+    for num_threads in (1, 4, 16, 64):
+        for batch_size in (None, 256):
+            ledger = TransferLedger(num_accounts, initial_balance=1000)
+            expected_total = 1000 * num_accounts
+            per_thread = total_transfers // num_threads
+            elapsed = bench_ledger(ledger, num_threads, per_thread, batch_size)
+            mode = f"batch {batch_size}" if batch_size else "single"
+            print(f"{num_threads:>8} {mode:>12} {per_thread * num_threads / elapsed:>13,.0f} "
+                  f"{str(ledger.total() == expected_total):>10}")
+
+
+if __name__ == "__main__":
+    ledger = TransferLedger(num_accounts=2, initial_balance=0)
+    ledger.deposit(0, 1000)
+    ledger.deposit(1, 500)
+
+    # the two opposite transfers that could deadlock with per-account locks taken in call order
+    thread = threading.Thread(target=lambda: ledger.transfer(0, 1, 200))
+    thread2 = threading.Thread(target=lambda: ledger.transfer(1, 0, 100))
+    thread.start()
+    thread2.start()
+    thread.join()
+    thread2.join()
+    print(f"Final balances: Account1={ledger.balance(0)}, Account2={ledger.balance(1)}")
+
+    print(ledger.submit_batch([(0, 1, 50), (1, 0, 10_000), (1, 0, 25)]))  # [True, False, True]
+
+    print("\nBenchmark: random transfers")
+    run_benchmark()
@@ -0,0 +1,266 @@
+"""
+BoundedBuffer:- the buffered queue from 5_scenario_1.py, built with two Condition objects
+
+Problems with the producer/consumer in 5_condition_object.py:-
+1. One Condition is shared for "queue is full" and "queue is empty". notify() can wake the wrong kind of
+   thread (a producer wakes another producer), which then goes straight back to sleep.
+2. `if` around wait() instead of `while`. After waking up, the thread doesn't re-check the state, so a
+   spurious wakeup or another consumer that got there first breaks it (popleft on an empty deque).
+3. Items move one at a time, so every item costs a lock round-trip and possibly a thread wakeup.
+
+How BoundedBuffer works:-
+- One Lock protects the deque. Two Conditions share that lock:
+    not_full  -> producers wait here while the buffer is full
+    not_empty -> consumers wait here while the buffer is empty
+  A producer only ever notifies consumers and a consumer only ever notifies producers.
+  wait_drained() waits on a third Condition, drained, notified when a get empties the buffer, so it
+  never takes the wakeup meant for a producer.
+- Every wait() sits inside a `while` loop that re-checks the state (handles spurious wakeups and
+  multiple consumers racing for the same item).
+- put_many()/get_many() move a whole batch under one lock acquisition and notify(n) as many waiters as
+  there are new items/free slots. Fewer handoffs means fewer context switches per item.
+- close(): producers can't add anything anymore (put raises BufferClosed), consumers keep getting the
+  remaining items and get BufferClosed once the buffer is drained.
+
+Timeouts follow queue.Queue: put raises queue.Full, get raises queue.Empty.
+"""
+
+import collections
+import queue
+import threading
+import time
+
+
+class BufferClosed(Exception):
+    """Raised by put on a closed buffer, and by get once a closed buffer is drained."""
+
+
+class BoundedBuffer:
+    def __init__(self, capacity=10):
+        if capacity <= 0:
+            raise ValueError("capacity must be > 0")
+        self.capacity = capacity
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._not_empty = threading.Condition(self._lock)
+        self._drained = threading.Condition(self._lock)
+        self._closed = False
+        self.wakeups = 0  # number of times a waiting thread returned from wait()
+
+    def _wait(self, condition, deadline, timeout_error):
+        if deadline is None:
+            condition.wait()
+        else:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise timeout_error
+            condition.wait(remaining)
+        self.wakeups += 1
+
+    @staticmethod
+    def _deadline(timeout):
+        return None if timeout is None else time.monotonic() + timeout
+
+    def put(self, item, timeout=None):
+        deadline = self._deadline(timeout)
+        with self._lock:
+            while len(self._items) >= self.capacity and not self._closed:
+                self._wait(self._not_full, deadline, queue.Full)
+            if self._closed:
+                raise BufferClosed("put on a closed buffer")
+            self._items.append(item)
+            self._not_empty.notify()
+
+    def put_many(self, items, timeout=None):
+        """Puts all items, blocking for space as needed. Returns the number of items added.
+
+        On timeout queue.Full is raised and the items added so far stay in the buffer.
+        """
+        items = list(items)
+        deadline = self._deadline(timeout)
+        added = 0
+        with self._lock:
+            while added < len(items):
+                while len(self._items) >= self.capacity and not self._closed:
+                    self._wait(self._not_full, deadline, queue.Full)
+                if self._closed:
+                    raise BufferClosed("put on a closed buffer")
+                free = self.capacity - len(self._items)
+                chunk = items[added:added + free]
+                self._items.extend(chunk)
+                added += len(chunk)
+                self._not_empty.notify(len(chunk))
+        return added
+
+    def get(self, timeout=None):
+        deadline = self._deadline(timeout)
+        with self._lock:
+            while not self._items:
+                if self._closed:
+                    raise BufferClosed("buffer is closed and drained")
+                self._wait(self._not_empty, deadline, queue.Empty)
+            item = self._items.popleft()
+            self._not_full.notify()
+            if not self._items:
+                self._drained.notify_all()
+            return item
+
+    def get_many(self, max_items, timeout=None):
+        """Blocks until at least one item is available, then returns up to max_items of them."""
+        deadline = self._deadline(timeout)
+        with self._lock:
+            while not self._items:
+                if self._closed:
+                    raise BufferClosed("buffer is closed and drained")
+                self._wait(self._not_empty, deadline, queue.Empty)
+            count = min(max_items, len(self._items))
+            batch = [self._items.popleft() for _ in range(count)]
+            self._not_full.notify(count)
+            if not self._items:
+                self._drained.notify_all()
+            return batch
+
+    def close(self):
+        """Stops producers and lets consumers drain what is left."""
+        with self._lock:
+            self._closed = True
+            self._not_full.notify_all()
+            self._not_empty.notify_all()
+
+    def wait_drained(self, timeout=None):
+        """Blocks until consumers have taken every item. Returns False on timeout."""
+        deadline = self._deadline(timeout)
+        with self._lock:
+            while self._items:
+                try:
+                    self._wait(self._drained, deadline, queue.Empty)
+                except queue.Empty:
+                    return False
+            return True
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        """Yields items until the buffer is closed and drained."""
+        while True:
+            try:
+                yield self.get()
+            except BufferClosed:
+                return
+
+
+# --- Benchmark: queue.Queue vs BoundedBuffer (single and batched) ---
+class _CountingCondition(threading.Condition):
+    """Condition that counts wakeups, used to instrument queue.Queue's internal conditions."""
+
+    wakeups = 0
+
+    def wait(self, timeout=None):
+        result = super().wait(timeout)
+        _CountingCondition.wakeups += 1
+        return result
+
+def _counting_queue(maxsize):
+    q = queue.Queue(maxsize)
+    q.not_empty = _CountingCondition(q.mutex)
+    q.not_full = _CountingCondition(q.mutex)
+    q.all_tasks_done = _CountingCondition(q.mutex)
+    return q
+
+def _run(producers, consumers):
+    threads = [threading.Thread(target=target) for target in producers + consumers]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+def bench_queue(num_items, num_producers, num_consumers, capacity):
+    q = _counting_queue(capacity)
+    _CountingCondition.wakeups = 0
+    per_producer = num_items // num_producers
+    done = threading.Barrier(num_producers, action=lambda: [q.put(None) for _ in range(num_consumers)])
+
+    def producer():
+        for i in range(per_producer):
+            q.put(i)
+        done.wait()
+
+    def consumer():
+        while q.get() is not None:
+            pass
+
+    elapsed = _run([producer] * num_producers, [consumer] * num_consumers)
+    return elapsed, _CountingCondition.wakeups
+
+def bench_buffer(num_items, num_producers, num_consumers, capacity, batch=None):
+    buf = BoundedBuffer(capacity)
+    per_producer = num_items // num_producers
+    done = threading.Barrier(num_producers, action=buf.close)
+
+    def producer():
+        if batch:
+            for start in range(0, per_producer, batch):
+                buf.put_many(range(start, min(start + batch, per_producer)))
+        else:
+            for i in range(per_producer):
+                buf.put(i)
+        done.wait()
+
+    def consumer():
+        try:
+            while True:
+                if batch:
+                    buf.get_many(batch)
+                else:
+                    buf.get()
+        except BufferClosed:
+            pass
+
+    elapsed = _run([producer] * num_producers, [consumer] * num_consumers)
+    return elapsed, buf.wakeups
+
+def run_benchmark(num_items=200_000, capacity=256):
+    print(f"{'prod/cons':>10} {'variant':>22} {'items/s':>12} {'wakeups/item':>13}")
+    for num_producers, num_consumers in ((1, 1), (2, 4), (4, 8)):
+        total = num_items // num_producers * num_producers
+        for name, bench in (("queue.Queue", lambda: bench_queue(num_items, num_producers, num_consumers, capacity)),
+                            ("BoundedBuffer", lambda: bench_buffer(num_items, num_producers, num_consumers, capacity)),
+                            ("BoundedBuffer batch=64", lambda: bench_buffer(num_items, num_producers, num_consumers,
+                                                                            capacity, batch=64))):
+            elapsed, wakeups = bench()
+            print(f"{f'{num_producers}/{num_consumers}':>10} {name:>22} {total / elapsed:>12,.0f} {wakeups / total:>13.4f}")
+
+
+if __name__ == "__main__":
+    buffer = BoundedBuffer(capacity=10)
+
+    def producer():
+        buffer.put_many(range(15))
+        for i in range(15, 20):
+            buffer.put(i)
+        buffer.close()
+        print("Producer: added 20 items and closed the buffer")
+
+    def consumer(name):
+        # iterating stops once the buffer is closed and drained
+        for item in buffer:
+            print(f"Consumer {name}: Processed item {item}")
+
+    threads = [threading.Thread(target=producer)]
+    threads += [threading.Thread(target=consumer, args=(f"C-{i}",)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print("\nAll tasks completed.")
+
+    print("\nBenchmark: items per second and wakeups per item")
+    run_benchmark()
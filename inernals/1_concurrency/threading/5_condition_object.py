@@ -39,7 +39,8 @@ condition = threading.Condition()
 def producer():
     for i in range(20):
         with condition:
-            if len(queue) == 10:
+            # while, not if: re-check the state after every wakeup (see 5_condition_bounded_buffer.py)
+            while len(queue) == 10:
                 print('Producer queue is full.......waiting......')
                 condition.wait()
             queue.append(i)
@@ -53,7 +54,7 @@ def consumer():
     while True:
         with condition:
             # Wait if the queue is empty
-            if not queue:
+            while not queue:
                 print("Consumer: Queue is empty. Waiting...")
                 condition.wait()
             
@@ -0,0 +1,355 @@
+"""
+Connection pool on top of the connection_semaphore pattern (6_semaphore.py)
+
+In 6_semaphore.py the semaphore only limits how many threads talk to the database at the same time.
+No connection object is kept, so every caller would open (and pay for) a brand new connection.
+
+ConnectionPool keeps the semaphore for the limit and adds the connection reuse:-
+- BoundedSemaphore(max_size): one permit per connection that may exist while checked out. acquire(timeout)
+  waits on it, so a burst of callers queues up instead of opening more than max_size connections. Bounded,
+  so a release too many raises instead of quietly raising the limit.
+- Idle list: released connections go back to a LIFO list (the most recently used connection is the
+  warmest one). acquire() takes an idle one before it calls the factory.
+- Health check on checkout: an idle connection is checked with health_check(conn) before it's handed out,
+  a failing one is closed and the next one (or a new one) is used.
+- Idle eviction: a reaper thread closes connections that have been idle longer than idle_timeout
+  (None: never), but never goes below min_size open connections. min_size connections are opened up front.
+  Checkout leaves expiry to the reaper, so the min_size warm connections stay usable however long they were
+  idle (the health check still catches dead ones).
+- Refill: when a failed health check or a broken release closes a connection, the reaper opens new ones
+  until min_size are open again, in the background, so no caller pays for the factory.
+- acquire(timeout) overrides acquire_timeout for one call, acquire(timeout=None) waits forever.
+- Metrics: wait time (time blocked on the semaphore), checkout time (how long a caller held a connection),
+  current and time-weighted utilization (in_use / max_size).
+"""
+
+import collections
+import contextlib
+import random
+import threading
+import time
+
+_DEFAULT = object()  # acquire() without a timeout argument: the pool's acquire_timeout applies
+REFILL_RETRY = 1.0  # seconds until the reaper tries again when the factory failed during a refill
+
+
+class PoolTimeout(TimeoutError):
+    """No connection became available within the acquire timeout."""
+
+
+class ConnectionPool:
+    def __init__(self, factory, min_size=1, max_size=3, acquire_timeout=None, idle_timeout=60.0,
+                 health_check=None):
+        if not 0 <= min_size <= max_size:
+            raise ValueError("need 0 <= min_size <= max_size")
+        if idle_timeout is not None and idle_timeout <= 0:
+            raise ValueError("idle_timeout must be greater than 0, or None to never evict")
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+
+        self._semaphore = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = collections.deque()  # (conn, released_at), most recently used on the right
+        self._open = 0
+        self._in_use = 0
+        self._checked_out_at = {}  # id(conn) -> time of checkout
+        self._closed = threading.Event()
+        self._wakeup = threading.Event()  # set to run the reaper now: a connection was closed, or close()
+
+        # metrics
+        self.created = 0
+        self.destroyed = 0
+        self.failed_health_checks = 0
+        self.timeouts = 0
+        self._wait_times = collections.deque(maxlen=10_000)
+        self._checkout_times = collections.deque(maxlen=10_000)
+        self._busy_integral = 0.0  # integral of in_use over time
+        self._last_change = self._started = time.monotonic()
+
+        for _ in range(min_size):
+            conn = self._create()
+            self._idle.append((conn, time.monotonic()))
+
+        self._reaper = threading.Thread(target=self._reap_idle, daemon=True)
+        self._reaper.start()
+
+    def _create(self):
+        conn = self.factory()
+        with self._lock:
+            self._open += 1
+            self.created += 1
+        return conn
+
+    def _destroy(self, conn, refill=False):
+        with self._lock:
+            self._open -= 1
+            self.destroyed += 1
+            if refill and self._open < self.min_size:
+                self._wakeup.set()
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"Pool: error while closing connection: {e}")
+
+    def _track_in_use(self, delta):
+        # caller holds self._lock
+        now = time.monotonic()
+        self._busy_integral += self._in_use * (now - self._last_change)
+        self._last_change = now
+        self._in_use += delta
+
+    def acquire(self, timeout=_DEFAULT):
+        if self._closed.is_set():
+            raise RuntimeError("pool is closed")
+        if timeout is _DEFAULT:
+            timeout = self.acquire_timeout
+        start = time.monotonic()
+        if not self._semaphore.acquire(timeout=timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"no connection available within {timeout}s")
+        waited = time.monotonic() - start
+
+        try:
+            conn = self._checkout_idle()
+            if conn is None:
+                conn = self._create()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        with self._lock:
+            self._wait_times.append(waited)
+            self._checked_out_at[id(conn)] = time.monotonic()
+            self._track_in_use(+1)
+        return conn
+
+    def _checkout_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn, _ = self._idle.pop()
+            if self.health_check is not None:
+                try:
+                    healthy = self.health_check(conn)
+                except Exception:
+                    healthy = False
+                if not healthy:
+                    with self._lock:
+                        self.failed_health_checks += 1
+                    self._destroy(conn, refill=True)
+                    continue
+            return conn
+
+    def release(self, conn, broken=False):
+        """Returns conn to the pool. Pass broken=True to close it instead of reusing it."""
+        now = time.monotonic()
+        with self._lock:
+            if id(conn) not in self._checked_out_at:
+                raise ValueError("connection is not checked out from this pool (released twice?)")
+            checked_out_at = self._checked_out_at.pop(id(conn))
+            self._checkout_times.append(now - checked_out_at)
+            self._track_in_use(-1)
+            keep = not broken and not self._closed.is_set()
+            if keep:
+                self._idle.append((conn, now))
+        if not keep:
+            self._destroy(conn, refill=True)
+        self._semaphore.release()
+
+    @contextlib.contextmanager
+    def connection(self, timeout=_DEFAULT):
+        conn = self.acquire(timeout)
+        broken = False
+        try:
+            yield conn
+        except ConnectionError:
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def _reap_idle(self):
+        interval = None if self.idle_timeout is None else max(0.01, self.idle_timeout / 2)
+        timeout = interval
+        while True:
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            if self._closed.is_set():
+                return
+            if self.idle_timeout is not None:
+                now = time.monotonic()
+                expired = []
+                with self._lock:
+                    # oldest idle connections are on the left
+                    while (self._idle and self._open - len(expired) > self.min_size
+                           and now - self._idle[0][1] > self.idle_timeout):
+                        expired.append(self._idle.popleft()[0])
+                for conn in expired:
+                    self._destroy(conn)
+            refilled = self._refill()
+            timeout = interval if refilled else min(interval or REFILL_RETRY, REFILL_RETRY)
+
+    def _refill(self):
+        """Opens connections until min_size are open. False if the factory failed, the reaper retries later."""
+        while not self._closed.is_set():
+            with self._lock:
+                if self._open >= self.min_size:
+                    return True
+            try:
+                conn = self._create()
+            except Exception as e:
+                print(f"Pool: could not open a connection to refill the pool: {e}")
+                return False
+            with self._lock:
+                keep = not self._closed.is_set()
+                if keep:
+                    self._idle.append((conn, time.monotonic()))
+            if not keep:
+                self._destroy(conn)
+        return True
+
+    def close(self):
+        self._closed.set()
+        self._wakeup.set()
+        self._reaper.join()
+        with self._lock:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self._destroy(conn)
+
+    def stats(self):
+        with self._lock:
+            self._track_in_use(0)
+            elapsed = self._last_change - self._started
+            waits = sorted(self._wait_times)
+            checkouts = sorted(self._checkout_times)
+
+            def pct(values, q):
+                return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+            return {
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "created": self.created,
+                "destroyed": self.destroyed,
+                "failed_health_checks": self.failed_health_checks,
+                "timeouts": self.timeouts,
+                "wait_avg": sum(waits) / len(waits) if waits else 0.0,
+                "wait_p99": pct(waits, 0.99),
+                "checkout_avg": sum(checkouts) / len(checkouts) if checkouts else 0.0,
+                "checkout_p99": pct(checkouts, 0.99),
+                "utilization": self._in_use / self.max_size,
+                "avg_utilization": self._busy_integral / elapsed / self.max_size if elapsed else 0.0,
+            }
+
+
+# --- In-process fake database connection ---
+class FakeConnection:
+    """Pays a setup cost on creation, like a TCP + TLS + auth handshake."""
+
+    def __init__(self, setup_time=0.05, query_time=0.005):
+        time.sleep(setup_time)
+        self.query_time = query_time
+        self.alive = True
+
+    def query(self, sql):
+        if not self.alive:
+            raise ConnectionError("connection is closed")
+        time.sleep(self.query_time)
+        return [("ok", sql)]
+
+    def ping(self):
+        return self.alive
+
+    def close(self):
+        self.alive = False
+
+
+# --- Benchmark: semaphore only (new connection per call) vs pool ---
+DB_CONNECTIONS_LIMIT = 3
+
+def _burst(run_query, num_threads, queries_per_thread):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for _ in range(queries_per_thread):
+            start = time.perf_counter()
+            run_query()
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(num_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, sorted(latencies)
+
+def run_benchmark(num_threads=10, queries_per_thread=20):
+    connection_semaphore = threading.Semaphore(DB_CONNECTIONS_LIMIT)
+
+    def semaphore_only():
+        with connection_semaphore:
+            conn = FakeConnection()
+            conn.query("SELECT 1")
+            conn.close()
+
+    total = num_threads * queries_per_thread
+    print(f"{'variant':>15} {'queries/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'connections':>12}")
+    elapsed, lat = _burst(semaphore_only, num_threads, queries_per_thread)
+    print(f"{'semaphore only':>15} {total / elapsed:>10.1f} {lat[len(lat) // 2] * 1000:>8.1f} "
+          f"{lat[int(len(lat) * 0.99)] * 1000:>8.1f} {total:>12}")
+
+    pool = ConnectionPool(FakeConnection, min_size=1, max_size=DB_CONNECTIONS_LIMIT,
+                          idle_timeout=30, health_check=FakeConnection.ping)
+
+    def pooled():
+        with pool.connection() as conn:
+            conn.query("SELECT 1")
+
+    elapsed, lat = _burst(pooled, num_threads, queries_per_thread)
+    stats = pool.stats()
+    print(f"{'pool':>15} {total / elapsed:>10.1f} {lat[len(lat) // 2] * 1000:>8.1f} "
+          f"{lat[int(len(lat) * 0.99)] * 1000:>8.1f} {stats['created']:>12}")
+    pool.close()
+    print(f"pool: wait avg {stats['wait_avg'] * 1000:.1f} ms (p99 {stats['wait_p99'] * 1000:.1f} ms), "
+          f"checkout avg {stats['checkout_avg'] * 1000:.1f} ms, avg utilization {stats['avg_utilization']:.0%}")
+
+
+if __name__ == "__main__":
+    pool = ConnectionPool(FakeConnection, min_size=1, max_size=DB_CONNECTIONS_LIMIT,
+                          acquire_timeout=5, idle_timeout=0.5, health_check=FakeConnection.ping)
+
+    def get_db_connection(thread_name):
+        print(f"Thread {thread_name}: Waiting to acquire a connection...")
+        with pool.connection() as conn:
+            print(f"Thread {thread_name}: Acquired a connection! Doing some work...")
+            conn.query("SELECT * FROM orders")
+            time.sleep(random.uniform(0.1, 0.3))
+        print(f"Thread {thread_name}: Finished work and returned the connection to the pool.")
+
+    threads = [threading.Thread(target=get_db_connection, args=(f"T-{i}",)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(pool.stats())
+
+    time.sleep(1.5)  # idle connections above min_size get evicted
+    print("after idle eviction:", {k: v for k, v in pool.stats().items() if k in ("open", "idle", "destroyed")})
+    pool.close()
+
+    print("\nBenchmark: burst of queries")
+    run_benchmark()
@@ -4,6 +4,13 @@ import threading
 import time
 import os
 import queue
+import glob
+import gzip
+import heapq
+import lzma
+import random
+import shutil
+import uuid
 from datetime import datetime
 import logging
 
@@ -11,98 +18,554 @@ import logging
 LOG_FILE = "app.log"
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB for this example
 ROTATION_INTERVAL = 60  # seconds
-INGESTION_QUEUE = queue.Queue()
+INGESTION_QUEUE_SIZE = 64  # bounded, so a slow ingestion pushes back on the compressor instead of growing forever
+INGESTION_QUEUE = queue.Queue(maxsize=INGESTION_QUEUE_SIZE)
+
+# --- Writer configuration ---
+FLUSH_BYTES = 64 * 1024  # flush once this many bytes are written since the last flush
+FLUSH_INTERVAL = 0.2  # seconds, flush at least this often while messages are arriving
+MAX_BATCH = 1024  # max messages drained from the buffer in one go
+DURABILITY = "flush"  # "flush": hand data to the OS, "fsync": also force it to disk on every flush
+
+# --- Rotation configuration ---
+COMPRESSION = "gzip"  # "gzip", "lzma" or None, applied to rotated segments on a background thread
+_COMPRESSORS = {
+    "gzip": (gzip.open, ".gz"),
+    "lzma": (lzma.open, ".xz"),
+}
+
+# --- Ingestion configuration ---
+INGEST_WORKERS = 4
+INGEST_MAX_RETRIES = 5
+INGEST_BASE_DELAY = 0.5  # seconds, first retry delay, doubled on every failure
+INGEST_MAX_DELAY = 30  # seconds, upper bound for a single retry delay
+CHECKPOINT_FILE = "ingested.checkpoint"  # one finished segment name per line
 
 # --- Shared resources ---
-_log_lock = threading.Lock() # Protects log file writes
+_log_lock = threading.Lock() # Protects log file writes of the synchronous (legacy) log()
 
 # --- Mock Ingestion Service ---
 # In a real system, this would be a separate microservice
 # with its own threads, network calls, and retries.
-def mock_ingest_service():
-    while True:
+def mock_ingest(rotated_file, latency=1.0, failure_rate=0.1):
+    """Simulates the network call that ships one rotated segment."""
+    time.sleep(latency)
+    if random.random() < failure_rate:
+        raise ConnectionError("ingest endpoint unavailable")
+
+
+class IngestionService:
+    """
+    A pool of ingestion workers on top of the bounded INGESTION_QUEUE.
+
+    - Workers block on queue.get() (no timeout polling) and exit on a _STOP sentinel.
+    - A failed file is not put straight back into the queue. It goes into a retry heap ordered by
+      due time, with exponential backoff and full jitter: delay = uniform(0, min(max_delay, base * 2**attempt)).
+      One retry thread sleeps on a Condition until the earliest retry is due.
+    - After max_retries the file is kept on disk and listed in dead_letters. So are the retries still
+      pending at stop(), recover() picks them up again on the next run.
+    - Every finished segment is appended to the checkpoint file before the segment is deleted,
+      so a restart skips segments that were already ingested.
+    - Queue items are (rotated_file, enqueued_at): the queue lag is the time a segment waited in
+      the queue for a worker, enqueued_at taken from time.monotonic() when it was put.
+    """
+
+    def __init__(self, ingest_fn=mock_ingest, num_workers=INGEST_WORKERS, source_queue=INGESTION_QUEUE,
+                 checkpoint_file=CHECKPOINT_FILE, max_retries=INGEST_MAX_RETRIES,
+                 base_delay=INGEST_BASE_DELAY, max_delay=INGEST_MAX_DELAY):
+        self.ingest_fn = ingest_fn
+        self.num_workers = num_workers
+        self.source_queue = source_queue
+        self.checkpoint_file = checkpoint_file
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self._retry_cond = threading.Condition(self._lock)
+        self._retry_heap = []  # (due_time, seq, rotated_file)
+        self._retry_seq = 0
+        self._attempts = {}  # rotated_file -> failed attempts so far
+        self._running = False
+        self._workers = []
+        self._retry_thread = None
+        self._completed = self._load_checkpoint()
+        self._checkpoint = None
+
+        # metrics
+        self.started_at = None
+        self.ingested_files = 0
+        self.ingested_bytes = 0
+        self.skipped_files = 0
+        self.failures = 0
+        self.dead_letters = []
+        self.max_queue_lag = 0.0
+        self._lag_total = 0.0
+        self._lag_count = 0
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_file) as f:
+                return {line.strip() for line in f if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def start(self):
+        self._checkpoint = open(self.checkpoint_file, "a")
+        self._running = True
+        self.started_at = time.monotonic()
+        self._retry_thread = threading.Thread(target=self._retry_scheduler, daemon=True)
+        self._retry_thread.start()
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker, name=f"ingest-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        return self
+
+    def stop(self):
+        """Stops the workers once they have taken everything queued before this call."""
+        # the retry thread goes first: a retry it queued after the workers exited would never be taken,
+        # and with a full queue its put() would block stop() forever
+        with self._lock:
+            self._running = False
+            self._retry_cond.notify()
+        self._retry_thread.join()
+        with self._lock:
+            pending, self._retry_heap = self._retry_heap, []
+            for _, _, rotated_file in sorted(pending):
+                self._give_up(rotated_file, "ingestion stopped before its retry")
+        for _ in self._workers:
+            self.source_queue.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+        self._checkpoint.close()
+        self._workers = []
+
+    def recover(self, pattern):
+        """Queues rotated segments left on disk by a previous run, skipping checkpointed ones."""
+        for rotated_file in sorted(glob.glob(pattern)):
+            self.source_queue.put((rotated_file, time.monotonic()))
+
+    def _worker(self):
+        while True:
+            item = self.source_queue.get()
+            if item is _STOP:
+                self.source_queue.task_done()
+                return
+            rotated_file, enqueued_at = item
+            lag = time.monotonic() - enqueued_at
+            name = os.path.basename(rotated_file)
+            if name in self._completed:
+                # finished before a restart, only the delete did not happen
+                print(f"Ingestion Service: '{rotated_file}' already ingested, skipping.")
+                self._remove(rotated_file)
+                with self._lock:
+                    self.skipped_files += 1
+                self.source_queue.task_done()
+                continue
+
+            try:
+                size = os.path.getsize(rotated_file)
+                self.ingest_fn(rotated_file)
+            except Exception as e:
+                self._on_failure(rotated_file, e)
+                continue
+
+            with self._lock:
+                # checkpoint first, then delete: a crash in between only leaves a file that is skipped later
+                self._completed.add(name)
+                self._checkpoint.write(name + "\n")
+                self._checkpoint.flush()
+                self._attempts.pop(rotated_file, None)
+                self.ingested_files += 1
+                self.ingested_bytes += size
+                self.max_queue_lag = max(self.max_queue_lag, lag)
+                self._lag_total += lag
+                self._lag_count += 1
+            self._remove(rotated_file)
+            self.source_queue.task_done()
+
+    def _remove(self, rotated_file):
         try:
-            rotated_file = INGESTION_QUEUE.get(timeout=5)
-            print(f"Ingestion Service: Received file '{rotated_file}'. Ingesting...")
-            
-            # Simulate network call and ingestion
-            time.sleep(1) 
-            
-            print(f"Ingestion Service: Successfully ingested and deleting '{rotated_file}'.")
             os.remove(rotated_file)
-            INGESTION_QUEUE.task_done()
-        except queue.Empty:
+        except FileNotFoundError:
             pass
-        except Exception as e:
-            print(f"Ingestion Service: Failed to ingest file. Retrying later. Error: {e}")
-            # In a real system, you would push the file back to the queue or a dead-letter queue
-            INGESTION_QUEUE.put(rotated_file)
+
+    def _on_failure(self, rotated_file, error):
+        with self._lock:
+            self.failures += 1
+            attempt = self._attempts.get(rotated_file, 0) + 1
+            self._attempts[rotated_file] = attempt
+            if attempt > self.max_retries:
+                self._give_up(rotated_file, f"after {attempt} attempts. Error: {error}")
+                return
+            if not self._running:
+                self._give_up(rotated_file, f"ingestion is stopping, no retry. Error: {error}")
+                return
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+            print(f"Ingestion Service: Failed to ingest '{rotated_file}'. Retry {attempt} in {delay:.2f}s. Error: {error}")
+            self._retry_seq += 1
+            heapq.heappush(self._retry_heap, (time.monotonic() + delay, self._retry_seq, rotated_file))
+            self._retry_cond.notify()
+        # the queue task stays unfinished until the retry is queued again, so source_queue.join() waits for it
+
+    def _give_up(self, rotated_file, reason):
+        # caller holds self._lock. The file stays on disk, the queue task of its failed attempt is finished
+        print(f"Ingestion Service: Giving up on '{rotated_file}' {reason}")
+        self.dead_letters.append(rotated_file)
+        self._attempts.pop(rotated_file, None)
+        self.source_queue.task_done()
+
+    def _retry_scheduler(self):
+        while True:
+            with self._lock:
+                while self._running:
+                    if self._retry_heap:
+                        wait = self._retry_heap[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._retry_cond.wait(wait)
+                    else:
+                        self._retry_cond.wait()
+                if not self._running:
+                    return
+                _, _, rotated_file = heapq.heappop(self._retry_heap)
+            self.source_queue.put((rotated_file, time.monotonic()))
+            self.source_queue.task_done()  # the failed attempt is now represented by the new entry
+
+    def metrics(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+            return {
+                "workers": self.num_workers,
+                "ingested_files": self.ingested_files,
+                "ingested_bytes": self.ingested_bytes,
+                "skipped_files": self.skipped_files,
+                "failures": self.failures,
+                "dead_letters": len(self.dead_letters),
+                "pending_retries": len(self._retry_heap),
+                "queue_depth": self.source_queue.qsize(),
+                "files_per_second": self.ingested_files / elapsed if elapsed else 0.0,
+                "bytes_per_second": self.ingested_bytes / elapsed if elapsed else 0.0,
+                "avg_queue_lag": self._lag_total / self._lag_count if self._lag_count else 0.0,
+                "max_queue_lag": self.max_queue_lag,
+            }
 
 # --- The Client-Side Agent ---
+_STOP = object()  # sentinel that tells the writer/compressor threads to exit
+
+
 class LogAgent:
-    def __init__(self):
+    """
+    log() only puts (timestamp, message) into an in-memory buffer and returns.
+    The writer thread drains the buffer in batches, formats the lines and writes them
+    through one long-lived file handle, flushing on a size or time threshold.
+
+    Rotation is event driven: the writer is the only thread touching the file, so it knows
+    exactly how many bytes the current segment holds. It rotates as soon as the segment reaches
+    max_file_size or is older than rotation_interval, with no polling thread and no stat calls.
+    Callers of log() never wait for a rotation, and the writer itself only pauses for a
+    flush + rename + open. Compressing the rotated segment happens on the compressor thread,
+    which then hands the compressed file to the ingestion queue.
+    """
+
+    def __init__(self, log_file=LOG_FILE, flush_bytes=FLUSH_BYTES, flush_interval=FLUSH_INTERVAL,
+                 durability=DURABILITY, max_file_size=MAX_FILE_SIZE, rotation_interval=ROTATION_INTERVAL,
+                 compression=COMPRESSION, ingestion_queue=INGESTION_QUEUE):
+        if durability not in ("flush", "fsync"):
+            raise ValueError(f"Unknown durability mode: {durability}")
+        if compression is not None and compression not in _COMPRESSORS:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.log_file = log_file
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.max_file_size = max_file_size
+        self.rotation_interval = rotation_interval
+        self.compression = compression
+        self.ingestion_queue = ingestion_queue
+        self._buffer = queue.SimpleQueue()
+        self._compress_queue = queue.SimpleQueue()
+        # segment names are checkpoint keys: the run id keeps them unique across restarts,
+        # the sequence number within one second of this run
+        self._run_id = uuid.uuid4().hex[:8]
+        self._rotation_seq = 0
+        self._open_segment()
+        self._unflushed_bytes = 0
+        self._last_flush = time.monotonic()
+
+        # rotation metrics
+        self.rotations = 0
+        self.max_rotation_pause = 0.0  # seconds the writer spent in the longest rotation
+        self.raw_bytes_rotated = 0
+        self.compressed_bytes_rotated = 0
+
         self.writer_thread = threading.Thread(target=self._log_writer, daemon=True)
-        self.rotator_thread = threading.Thread(target=self._file_rotator, daemon=True)
+        self.compressor_thread = threading.Thread(target=self._compressor, daemon=True)
         self.writer_thread.start()
-        self.rotator_thread.start()
+        self.compressor_thread.start()
 
     def log(self, message):
         """Public method for the application to log messages."""
-        with _log_lock:
-            with open(LOG_FILE, "a") as f:
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                f.write(f"[{timestamp}] {message}\n")
+        self._buffer.put((time.time(), message))
+
+    def flush(self, timeout=None):
+        """Blocks until everything logged before this call has been flushed."""
+        done = threading.Event()
+        self._buffer.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Drains the buffer, flushes and closes the file handle, then finishes pending compressions."""
+        if not self.writer_thread.is_alive():
+            return
+        self._buffer.put(_STOP)
+        self.writer_thread.join()
+        self._compress_queue.put(_STOP)
+        self.compressor_thread.join()
+
+    def _open_segment(self):
+        # binary: the byte counts below (flush_bytes, max_file_size) are bytes on disk, not characters
+        self._file = open(self.log_file, "ab")
+        # in append mode the position is the end of the file, so no stat call is needed
+        self._segment_bytes = self._file.tell()
+        self._segment_started = time.monotonic()
+
+    def _next_timeout(self):
+        """How long the writer may block on an empty buffer before a flush or rotation is due."""
+        deadlines = []
+        if self._unflushed_bytes:
+            deadlines.append(self._last_flush + self.flush_interval)
+        if self._segment_bytes and self.rotation_interval:
+            deadlines.append(self._segment_started + self.rotation_interval)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
 
     def _log_writer(self):
         """Worker thread that continuously writes logs from an internal buffer."""
-        # For simplicity, we directly write to file here.
-        # In a real system, this would read from an in-memory queue.
-        while True:
-            time.sleep(0.1)
-
-    def _file_rotator(self):
-        """Worker thread that handles log rotation based on size or time."""
+        last_second = None
+        prefix = ""
         while True:
-            time.sleep(1) # Check frequently
             try:
-                # Atomicity check: use a lock to ensure no writes happen during rotation
-                with _log_lock:
-                    if os.path.getsize(LOG_FILE) >= MAX_FILE_SIZE:
-                        self._perform_rotation()
-            except FileNotFoundError:
-                # Handle the case where the file is rotated or not yet created
-                pass
-            except Exception as e:
-                print(f"File Rotator: Error during rotation: {e}")
+                item = self._buffer.get(timeout=self._next_timeout())
+            except queue.Empty:
+                # flush or rotation deadline reached with nothing new arriving
+                self._flush()
+                self._maybe_rotate()
+                continue
+
+            lines = []
+            waiters = []
+            stop = False
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    ts, message = item
+                    # strftime is expensive, format the prefix once per second
+                    second = int(ts)
+                    if second != last_second:
+                        last_second = second
+                        prefix = datetime.fromtimestamp(second).strftime('[%Y-%m-%d %H:%M:%S] ')
+                    lines.append(f"{prefix}{message}\n")
+                if stop or len(lines) >= MAX_BATCH:
+                    break
+                try:
+                    item = self._buffer.get_nowait()
+                except queue.Empty:
+                    break
+
+            if lines:
+                data = "".join(lines).encode("utf-8")
+                self._file.write(data)
+                self._unflushed_bytes += len(data)
+                self._segment_bytes += len(data)
+            if (waiters or stop or self._unflushed_bytes >= self.flush_bytes
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush()
+            if not stop:
+                self._maybe_rotate()
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                self._file.close()
+                return
+
+    def _flush(self):
+        if self._unflushed_bytes:
+            self._file.flush()
+            if self.durability == "fsync":
+                os.fsync(self._file.fileno())
+        self._unflushed_bytes = 0
+        self._last_flush = time.monotonic()
+
+    def _maybe_rotate(self):
+        if not self._segment_bytes:
+            return
+        too_big = self._segment_bytes >= self.max_file_size
+        too_old = self.rotation_interval and time.monotonic() - self._segment_started >= self.rotation_interval
+        if too_big or too_old:
+            self._perform_rotation()
 
     def _perform_rotation(self):
-        """Performs the atomic file rotation."""
+        """Performs the atomic file rotation on the writer thread."""
+        start = time.perf_counter()
+        self._flush()
+        self._file.close()
+
         timestamp = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
-        new_filename = f"{LOG_FILE}.{timestamp}"
-        
+        self._rotation_seq += 1
+        new_filename = f"{self.log_file}.{timestamp}.{self._run_id}.{self._rotation_seq}"
+        rotated_bytes = self._segment_bytes
+
         # Atomic rename on Linux: os.rename() is atomic
         # On Windows, you might need a different approach for true atomicity
         try:
-            os.rename(LOG_FILE, new_filename)
-            print(f"Rotated '{LOG_FILE}' to '{new_filename}'.")
-            # Push the rotated file path to the ingestion queue
-            INGESTION_QUEUE.put(new_filename)
+            os.rename(self.log_file, new_filename)
         except FileNotFoundError:
-            print(f"Error: Log file '{LOG_FILE}' not found during rotation.")
-            return
+            print(f"Error: Log file '{self.log_file}' not found during rotation.")
+            new_filename = None
 
         # Create a new, empty log file for continued logging
-        with open(LOG_FILE, "w") as f:
-            pass
+        self._open_segment()
+        self.rotations += 1
+        self.max_rotation_pause = max(self.max_rotation_pause, time.perf_counter() - start)
+
+        if new_filename is not None:
+            self._compress_queue.put((new_filename, rotated_bytes))
+
+    def _compressor(self):
+        """Worker thread that compresses rotated segments and pushes them to the ingestion queue."""
+        while True:
+            item = self._compress_queue.get()
+            if item is _STOP:
+                return
+            rotated_file, rotated_bytes = item
+            try:
+                ready_file = self._compress(rotated_file)
+            except Exception as e:
+                # ship the uncompressed segment rather than losing it
+                print(f"Compressor: Failed to compress '{rotated_file}': {e}")
+                ready_file = rotated_file
+            self.raw_bytes_rotated += rotated_bytes
+            self.compressed_bytes_rotated += os.path.getsize(ready_file)
+            # Push the rotated file path to the ingestion queue
+            self.ingestion_queue.put((ready_file, time.monotonic()))
+
+    def _compress(self, rotated_file):
+        if self.compression is None:
+            return rotated_file
+        opener, suffix = _COMPRESSORS[self.compression]
+        compressed_file = rotated_file + suffix
+        with open(rotated_file, "rb") as src, opener(compressed_file, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.remove(rotated_file)
+        return compressed_file
+
+
+# --- Benchmark: old synchronous log() vs batched writer ---
+def _legacy_log(log_file, message):
+    """The original log(): open, format and write one line on the caller's thread under _log_lock."""
+    with _log_lock:
+        with open(log_file, "a") as f:
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            f.write(f"[{timestamp}] {message}\n")
+
+def _measure(log_fn, num_threads, per_thread):
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def app_thread(thread_id):
+        local = []
+        for i in range(per_thread):
+            start = time.perf_counter_ns()
+            log_fn(f"thread {thread_id} message {i} with a realistic amount of request context attached")
+            local.append(time.perf_counter_ns() - start)
+        with latencies_lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=app_thread, args=(i,)) for i in range(num_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, sorted(latencies)
+
+def run_benchmark(num_threads=4, per_thread=5_000):
+    import tempfile
+
+    total = num_threads * per_thread
+    print(f"{'variant':>18} {'msgs/s':>12} {'p50 us':>8} {'p99 us':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_file = os.path.join(tmp, "legacy.log")
+        elapsed, lat = _measure(lambda m: _legacy_log(legacy_file, m), num_threads, per_thread)
+        print(f"{'before (sync)':>18} {total / elapsed:>12,.0f} "
+              f"{lat[len(lat) // 2] / 1000:>8.1f} {lat[int(len(lat) * 0.99)] / 1000:>8.1f}")
+
+        for durability in ("flush", "fsync"):
+            agent = LogAgent(os.path.join(tmp, f"batched-{durability}.log"), durability=durability)
+            start = time.perf_counter()
+            _, lat = _measure(agent.log, num_threads, per_thread)
+            agent.close()  # include the time to get every message onto the file
+            elapsed = time.perf_counter() - start
+            print(f"{'after (' + durability + ')':>18} {total / elapsed:>12,.0f} "
+                  f"{lat[len(lat) // 2] / 1000:>8.1f} {lat[int(len(lat) * 0.99)] / 1000:>8.1f}")
+
+def run_rotation_benchmark(num_messages=200_000, max_file_size=1024 * 1024):
+    import tempfile
+
+    print(f"{'compression':>12} {'rotations':>10} {'max pause ms':>13} {'p99 log() us':>13} "
+          f"{'raw MB':>8} {'on disk MB':>11}")
+    for compression in (None, "gzip", "lzma"):
+        with tempfile.TemporaryDirectory() as tmp:
+            ingested = queue.Queue()
+            agent = LogAgent(os.path.join(tmp, "app.log"), max_file_size=max_file_size,
+                             compression=compression, ingestion_queue=ingested)
+            _, lat = _measure(agent.log, 1, num_messages)
+            agent.close()
+            print(f"{str(compression):>12} {agent.rotations:>10} {agent.max_rotation_pause * 1000:>13.3f} "
+                  f"{lat[int(len(lat) * 0.99)] / 1000:>13.1f} {agent.raw_bytes_rotated / 1e6:>8.2f} "
+                  f"{agent.compressed_bytes_rotated / 1e6:>11.2f}")
+
+
+def run_ingest_benchmark(num_files=40, latency=0.05, failure_rate=0.1):
+    import tempfile
+
+    print(f"{'workers':>8} {'seconds':>8} {'files/s':>8} {'retries':>8} {'avg lag s':>10} {'max lag s':>10}")
+    for num_workers in (1, 4, 8):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = queue.Queue(maxsize=INGESTION_QUEUE_SIZE)
+            service = IngestionService(
+                ingest_fn=lambda path: mock_ingest(path, latency=latency, failure_rate=failure_rate),
+                num_workers=num_workers, source_queue=source,
+                checkpoint_file=os.path.join(tmp, "ingested.checkpoint"), base_delay=0.01, max_delay=0.1)
+            service.start()
+            start = time.perf_counter()
+            for i in range(num_files):
+                # a burst of rotations
+                path = os.path.join(tmp, f"app.log.{i}.gz")
+                with open(path, "wb") as f:
+                    f.write(os.urandom(4096))
+                source.put((path, time.monotonic()))
+            source.join()
+            elapsed = time.perf_counter() - start
+            service.stop()
+            m = service.metrics()
+            print(f"{num_workers:>8} {elapsed:>8.2f} {num_files / elapsed:>8.1f} {m['failures']:>8} "
+                  f"{m['avg_queue_lag']:>10.3f} {m['max_queue_lag']:>10.3f}")
 
 # --- Main Application Logic (Simulating a service) ---
 if __name__ == "__main__":
     # Start the log agent
     log_agent = LogAgent()
     
-    # Start the mock ingestion service thread
-    ingestor = threading.Thread(target=mock_ingest_service, daemon=True)
-    ingestor.start()
+    # Start the ingestion workers, picking up segments a previous run left behind
+    ingestor = IngestionService().start()
+    ingestor.recover(f"{LOG_FILE}.*")
 
     print("Log Agent started. Generating log messages...")
     try:
@@ -114,6 +577,19 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("Application shutting down.")
     finally:
+        # Write out everything still sitting in the buffer
+        log_agent.close()
         # Wait for any pending ingestion to complete
         INGESTION_QUEUE.join()
-        print("All pending files have been ingested.")
\ No newline at end of file
+        ingestor.stop()
+        print("All pending files have been ingested.")
+        print(ingestor.metrics())
+
+    print("\nBenchmark: log() throughput and latency")
+    run_benchmark()
+
+    print("\nBenchmark: rotation pause and compressed segment size")
+    run_rotation_benchmark()
+
+    print("\nBenchmark: ingestion workers under a burst of rotations")
+    run_ingest_benchmark()
\ No newline at end of file
@@ -32,7 +32,7 @@ def worker():
     while not stop_event.is_set():
         # Do some work
         print(f"Worker {threading.current_thread().name} is working...")
-        time.sleep(1)
+        time.sleep(1)  # stop is only noticed once per second, see 7_event_worker_lifecycle.py for stop_event.wait(1)
 
     print(f"Worker {threading.current_thread().name} received stop signal and is shutting down.")
 
@@ -0,0 +1,199 @@
+"""
+Worker lifecycle without poll-and-sleep
+
+The workers in 7_event_object.py do:
+    while not stop_event.is_set():
+        ...work...
+        time.sleep(1)
+The stop signal is only looked at once per second, so stop can take up to a full second per worker,
+and every check while idle is a wasted wakeup. Making the sleep shorter makes stop faster but burns CPU.
+
+The fix is to never sleep blindly. A worker should block on "work arrived OR stop requested" in one call:
+- Queue workers block on queue.get(). stop() puts one _STOP sentinel per worker into the same queue, so a
+  blocked worker wakes up immediately. Because the queue is FIFO, everything submitted before stop() is
+  handled first (drain). With drain=False the workers skip what is left and report it as dropped.
+  submit() checks for stop and puts under the lock stop() queues the sentinels with, so an item is either
+  queued in front of them or refused, never left behind them.
+- Periodic workers use stop_event.wait(interval) instead of time.sleep(interval). wait() returns True the
+  moment the event is set, so a periodic worker also stops within milliseconds.
+- start_event works like in 7_event_object.py: workers are created first and all begin together.
+"""
+
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class WorkerGroup:
+    def __init__(self, handler, num_workers=3, name="Worker"):
+        self.handler = handler
+        self.num_workers = num_workers
+        self.name = name
+        self.start_event = threading.Event()
+        self.stop_event = threading.Event()
+        self._queue = queue.Queue()
+        self._submit_lock = threading.Lock()  # submit() can't put behind the _STOP sentinels of stop()
+        self._threads = []
+        self._drain = True
+        self.processed = 0
+        self.dropped = 0
+        self._count_lock = threading.Lock()
+        self.shutdown_latency = None
+
+    def start(self):
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker, name=f"{self.name}-{i}")
+            thread.start()
+            self._threads.append(thread)
+        self.start_event.set()  # unblock all workers at once
+        return self
+
+    def submit(self, item):
+        with self._submit_lock:
+            if self.stop_event.is_set():
+                raise RuntimeError("worker group is stopping")
+            self._queue.put(item)
+
+    def stop(self, drain=True, timeout=None):
+        """Signals the workers and waits for them. Returns the shutdown latency in seconds."""
+        start = time.perf_counter()
+        self._drain = drain
+        with self._submit_lock:
+            # an item is either queued before the sentinels (processed or dropped) or refused
+            self.stop_event.set()
+            for _ in self._threads:
+                self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self.shutdown_latency = time.perf_counter() - start
+        return self.shutdown_latency
+
+    def _worker(self):
+        self.start_event.wait()
+        processed = dropped = 0
+        while True:
+            item = self._queue.get()  # blocks on work and on the stop sentinel at the same time
+            if item is _STOP:
+                break
+            if self.stop_event.is_set() and not self._drain:
+                dropped += 1
+                continue
+            try:
+                self.handler(item)
+            except Exception as e:
+                print(f"{threading.current_thread().name}: error handling {item!r}: {e}")
+            processed += 1
+        with self._count_lock:
+            self.processed += processed
+            self.dropped += dropped
+
+
+class PeriodicWorkerGroup:
+    """Runs fn every interval seconds on each worker until stopped."""
+
+    def __init__(self, fn, interval=1.0, num_workers=3, name="Periodic"):
+        self.fn = fn
+        self.interval = interval
+        self.num_workers = num_workers
+        self.name = name
+        self.start_event = threading.Event()
+        self.stop_event = threading.Event()
+        self._threads = []
+        self.shutdown_latency = None
+
+    def start(self):
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker, name=f"{self.name}-{i}")
+            thread.start()
+            self._threads.append(thread)
+        self.start_event.set()
+        return self
+
+    def stop(self, timeout=None):
+        start = time.perf_counter()
+        self.stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self.shutdown_latency = time.perf_counter() - start
+        return self.shutdown_latency
+
+    def _worker(self):
+        self.start_event.wait()
+        # wait() returns True as soon as stop_event is set, unlike time.sleep()
+        while not self.stop_event.wait(self.interval):
+            self.fn()
+
+
+# --- Benchmark: shutdown latency and idle CPU, poll-and-sleep vs blocking ---
+def _poll_and_sleep_group(num_workers, poll_interval):
+    stop_event = threading.Event()
+    work = queue.Queue()
+
+    def worker():
+        while not stop_event.is_set():
+            try:
+                work.get_nowait()
+            except queue.Empty:
+                time.sleep(poll_interval)
+
+    threads = [threading.Thread(target=worker) for _ in range(num_workers)]
+    for t in threads:
+        t.start()
+
+    def stop():
+        start = time.perf_counter()
+        stop_event.set()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - start
+
+    return stop
+
+def _blocking_group(num_workers):
+    group = WorkerGroup(lambda item: None, num_workers=num_workers).start()
+    return group.stop
+
+def _periodic_group(num_workers):
+    group = PeriodicWorkerGroup(lambda: None, interval=1.0, num_workers=num_workers).start()
+    return group.stop
+
+def run_benchmark(num_workers=16, idle_seconds=2.0):
+    variants = (
+        ("poll, sleep(1)", lambda: _poll_and_sleep_group(num_workers, 1.0)),
+        ("poll, sleep(0.001)", lambda: _poll_and_sleep_group(num_workers, 0.001)),
+        ("blocking queue", lambda: _blocking_group(num_workers)),
+        ("event.wait(1)", lambda: _periodic_group(num_workers)),
+    )
+    print(f"{'variant':>20} {'idle CPU %':>11} {'shutdown ms':>12}")
+    for name, make in variants:
+        stop = make()
+        time.sleep(0.1)  # let every worker reach its idle state
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        time.sleep(idle_seconds)
+        idle_cpu = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start) * 100
+        latency = stop()
+        print(f"{name:>20} {idle_cpu:>11.2f} {latency * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    def handle(item):
+        print(f"Worker {threading.current_thread().name} is working on {item}...")
+        time.sleep(0.1)
+
+    group = WorkerGroup(handle, num_workers=3, name="Thread")
+    for i in range(6):
+        group.submit(f"task-{i}")
+
+    print("Main thread: Signaling all workers to start!")
+    group.start()
+
+    time.sleep(0.15)
+    print("Main thread: Signaling all workers to stop!")
+    latency = group.stop(drain=True)
+    print(f"Main thread: All workers have finished. processed={group.processed} dropped={group.dropped} "
+          f"shutdown took {latency * 1000:.1f} ms")
+
+    print("\nBenchmark: shutdown latency and idle CPU")
+    run_benchmark()
@@ -0,0 +1,242 @@
+"""
+One scheduler thread instead of one threading.Timer per retry
+
+In 8_timer_object.py connect_to_server() starts a brand new threading.Timer (a full OS thread) for every retry,
+and the attempt counter is a single global `retries` shared by everybody.
+With thousands of endpoints that's thousands of OS threads that do nothing but sleep.
+
+TimerScheduler:-
+- All pending timers live in one heap ordered by due time: (due, seq, handle).
+- One scheduler thread waits on a Condition until the earliest timer is due (or until a new, earlier timer is
+  added, which notifies it). It never polls.
+- Due callbacks are handed to a bounded pool of worker threads (ThreadPoolExecutor(max_workers)), so a slow
+  callback can't delay the other timers and the number of threads stays fixed.
+- cancel() only marks the handle. The scheduler drops cancelled entries when they reach the top of the heap
+  (lazy deletion), so cancelling is O(1).
+
+RetryTask keeps the retry state per task (attempt number, next delay) instead of a global, and schedules the
+next attempt with exponential backoff and full jitter: delay = uniform(0, min(max_delay, base_delay * 2**attempt)).
+"""
+
+import heapq
+import itertools
+import random
+import resource
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TimerHandle:
+    __slots__ = ("due", "callback", "args", "cancelled")
+
+    def __init__(self, due, callback, args):
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerScheduler:
+    def __init__(self, max_workers=4):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = True
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="timer-worker")
+        self.dispatched = 0
+        self.max_lateness = 0.0  # worst difference between due time and dispatch time
+        self._thread = threading.Thread(target=self._run, name="timer-scheduler", daemon=True)
+        self._thread.start()
+
+    def call_later(self, delay, callback, *args):
+        handle = TimerHandle(time.monotonic() + delay, callback, args)
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("scheduler is shut down")
+            heapq.heappush(self._heap, (handle.due, next(self._seq), handle))
+            # only wake the scheduler if the new timer is now the earliest one
+            if self._heap[0][2] is handle:
+                self._cond.notify()
+        return handle
+
+    def pending(self):
+        with self._cond:
+            return sum(1 for _, _, handle in self._heap if not handle.cancelled)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    while self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                if not self._running:
+                    return
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    handle = heapq.heappop(self._heap)[2]
+                    if not handle.cancelled:
+                        due.append(handle)
+            for handle in due:
+                self.max_lateness = max(self.max_lateness, now - handle.due)
+                self.dispatched += 1
+                self._pool.submit(handle.callback, *handle.args)
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        self._pool.shutdown(wait=wait)
+
+
+class RetryTask:
+    """Calls fn() until it returns a truthy value, retrying with exponential backoff and jitter."""
+
+    def __init__(self, scheduler, fn, max_retries=3, base_delay=1.0, max_delay=30.0, name=None,
+                 on_success=None, on_give_up=None):
+        self.scheduler = scheduler
+        self.fn = fn
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.name = name or getattr(fn, "__name__", "task")
+        self.on_success = on_success
+        self.on_give_up = on_give_up
+        self.attempt = 0
+        self.done = threading.Event()
+        self.succeeded = False
+        self._handle = None
+        self._cancelled = False
+
+    def start(self, delay=0):
+        self._handle = self.scheduler.call_later(delay, self._run_attempt)
+        return self
+
+    def cancel(self):
+        self._cancelled = True
+        if self._handle is not None:
+            self._handle.cancel()
+        self.done.set()
+
+    def next_delay(self):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** self.attempt))
+
+    def _run_attempt(self):
+        if self._cancelled:
+            return
+        try:
+            ok = self.fn()
+        except Exception as e:
+            print(f"{self.name}: attempt {self.attempt} raised {e!r}")
+            ok = False
+        if ok:
+            self.succeeded = True
+            self.done.set()
+            if self.on_success:
+                self.on_success(self)
+            return
+        self.attempt += 1
+        if self.attempt > self.max_retries:
+            self.done.set()
+            if self.on_give_up:
+                self.on_give_up(self)
+            return
+        if not self._cancelled:
+            self._handle = self.scheduler.call_later(self.next_delay(), self._run_attempt)
+
+
+# --- Benchmark: 10k pending timers, one scheduler vs threading.Timer per timer ---
+def _bench(start_timers, num_timers, min_delay=1.0, spread=1.0):
+    lateness = []
+    lock = threading.Lock()
+    all_done = threading.Event()
+
+    def fire(due):
+        late = time.monotonic() - due
+        with lock:
+            lateness.append(late)
+            if len(lateness) == num_timers:
+                all_done.set()
+
+    tracemalloc.start()
+    threads_before = threading.active_count()
+    started, stop = start_timers(fire, num_timers, min_delay, spread)
+    peak_threads = threading.active_count() - threads_before
+    python_heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    all_done.wait(min_delay + spread + 30)
+    stop()
+    lateness.sort()
+    p = lambda q: lateness[min(len(lateness) - 1, int(len(lateness) * q))] * 1000 if lateness else float("nan")
+    return started, peak_threads, python_heap, rss_mb, p(0.5), p(0.99), p(1.0)
+
+def _start_with_scheduler(fire, num_timers, min_delay, spread):
+    scheduler = TimerScheduler(max_workers=4)
+    for i in range(num_timers):
+        delay = min_delay + spread * i / num_timers
+        scheduler.call_later(delay, fire, time.monotonic() + delay)
+    return num_timers, scheduler.shutdown
+
+def _start_with_timers(fire, num_timers, min_delay, spread):
+    started = 0
+    for i in range(num_timers):
+        delay = min_delay + spread * i / num_timers
+        timer = threading.Timer(delay, fire, args=(time.monotonic() + delay,))
+        try:
+            timer.start()
+        except RuntimeError as e:
+            # the OS refused to create more threads
+            print(f"threading.Timer: could only start {started} timers: {e}")
+            break
+        started += 1
+    return started, lambda: None
+
+def run_benchmark(num_timers=10_000):
+    print(f"{'variant':>16} {'timers':>7} {'threads':>8} {'py heap MB':>11} {'max RSS MB':>11} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    row = _bench(_start_with_scheduler, num_timers)
+    print(f"{'TimerScheduler':>16} {row[0]:>7} {row[1]:>8} {row[2] / 1e6:>11.1f} {row[3]:>11.1f} "
+          f"{row[4]:>8.2f} {row[5]:>8.2f} {row[6]:>8.2f}")
+    row = _bench(_start_with_timers, num_timers)
+    print(f"{'threading.Timer':>16} {row[0]:>7} {row[1]:>8} {row[2] / 1e6:>11.1f} {row[3]:>11.1f} "
+          f"{row[4]:>8.2f} {row[5]:>8.2f} {row[6]:>8.2f}")
+
+
+if __name__ == "__main__":
+    MAX_RETRIES = 3
+    scheduler = TimerScheduler(max_workers=4)
+
+    def make_connect(endpoint):
+        def connect_to_server():
+            # Simulate a connection attempt, 1/3 chance of success
+            return random.choice([True, False, False])
+        connect_to_server.__name__ = f"connect[{endpoint}]"
+        return connect_to_server
+
+    tasks = [
+        RetryTask(scheduler, make_connect(f"server-{i}"), max_retries=MAX_RETRIES, base_delay=0.2,
+                  on_success=lambda t: print(f"{t.name}: Successfully connected after {t.attempt} retries"),
+                  on_give_up=lambda t: print(f"{t.name}: Maximum retries exceeded. Giving up.")).start()
+        for i in range(5)
+    ]
+    print("Main thread is now free to do other tasks.")
+    for task in tasks:
+        task.done.wait()
+    scheduler.shutdown()
+
+    print("\nBenchmark: 10k pending timers")
+    run_benchmark()
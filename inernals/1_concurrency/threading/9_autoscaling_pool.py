@@ -0,0 +1,358 @@
+"""
+Autoscaling thread pool
+
+9_thread_pool.py uses max_workers=3 and 6_semaphore.py uses DB_CONNECTIONS_LIMIT = 3: the size is fixed when
+the pool is created. When the load swings a lot during the day, a fixed pool is either too small at the peak
+(tasks wait in the queue) or too big at night (idle threads holding memory and connections).
+
+AutoscalingThreadPool grows and shrinks between min_workers and max_workers:-
+- Tasks go through one shared queue. Every task records when it was queued, when it started and when it
+  finished, so the pool knows the queue wait and the task latency.
+- A controller thread wakes up every `interval` seconds (stop_event.wait(interval), no busy polling) and
+  looks at the last window: average queue wait, average latency, arrival rate, throughput, utilization.
+- Scale up when tasks waited longer than `target_wait`. The new size comes from Little's law:
+  workers needed = arrival rate * average latency, plus `headroom`, and at least one more than now.
+  A deep backlog scales up right away, it doesn't wait for the next slow window.
+- Scale down only when the queue wait is below target_wait / 4 AND utilization is below
+  `low_utilization` for `scale_down_windows` windows in a row, and never within `cooldown` seconds of the
+  last scale up. This gap between the up and down conditions (hysteresis) keeps the pool from oscillating.
+  A shrink removes at most a quarter of the workers at a time.
+- Workers are removed with a _RETIRE sentinel on the queue (like the _STOP sentinel in
+  7_event_worker_lifecycle.py). A worker finishes its current task and exits.
+- Every decision (time, old size, new size, reason and the numbers behind it) is kept in `decisions` and
+  the counters are returned by metrics().
+"""
+
+import collections
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future
+
+_RETIRE = object()
+
+
+class AutoscalingThreadPool(Executor):
+    def __init__(self, min_workers=2, max_workers=64, interval=0.25, target_wait=0.05, low_utilization=0.5,
+                 headroom=0.2, scale_down_windows=3, cooldown=2.0, thread_name_prefix="auto-worker"):
+        if not 0 < min_workers <= max_workers:
+            raise ValueError("need 0 < min_workers <= max_workers")
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.interval = interval
+        self.target_wait = target_wait
+        self.low_utilization = low_utilization
+        self.headroom = headroom
+        self.scale_down_windows = scale_down_windows
+        self.cooldown = cooldown
+        self.thread_name_prefix = thread_name_prefix
+
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()  # protects the worker count and the window stats
+        self._workers = 0
+        self._target = 0  # workers after all pending _RETIRE sentinels are consumed
+        self._thread_ids = 0
+        self._shutdown = False
+        self._stop_event = threading.Event()
+        self._all_exited = threading.Condition(self._lock)
+
+        self._reset_window()
+        self._quiet_windows = 0
+        self._last_scale_up = float("-inf")
+        self.decisions = collections.deque(maxlen=1000)
+        self.scale_ups = 0
+        self.scale_downs = 0
+        self.peak_workers = 0
+        self.completed = 0
+        self.last_window = None
+        self._worker_seconds = 0.0  # integral of the pool size over time
+        self._started_at = self._sized_at = time.monotonic()
+
+        self._resize(min_workers, "initial", {})
+        self._controller = threading.Thread(target=self._control_loop, name=f"{thread_name_prefix}-controller",
+                                            daemon=True)
+        self._controller.start()
+
+    # --- Executor interface ---
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            # check and put under the lock shutdown() takes: a put after its _RETIRE sentinels would
+            # never be taken by a worker
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._arrivals += 1
+            self._queue.put((future, fn, args, kwargs, time.monotonic()))
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+        self._stop_event.set()
+        self._controller.join()
+        retires = 0  # sentinels of an earlier scale down taken out by the drain below, they go back in
+        if cancel_futures:
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _RETIRE:
+                    retires += 1
+                else:
+                    item[0].cancel()
+        with self._lock:
+            for _ in range(self._target + retires):
+                self._queue.put(_RETIRE)
+            self._set_target(0)
+            if wait:
+                while self._workers:
+                    self._all_exited.wait()
+
+    @property
+    def num_workers(self):
+        return self._target
+
+    # --- workers ---
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is _RETIRE:
+                with self._lock:
+                    self._workers -= 1
+                    if not self._workers:
+                        self._all_exited.notify_all()
+                return
+            future, fn, args, kwargs, queued_at = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finished = time.monotonic()
+            with self._lock:
+                self._done += 1
+                self._wait_sum += started - queued_at
+                self._max_wait = max(self._max_wait, started - queued_at)
+                self._busy_sum += finished - started
+
+    def _set_target(self, size):
+        # caller holds self._lock
+        now = time.monotonic()
+        self._worker_seconds += self._target * (now - self._sized_at)
+        self._sized_at = now
+        self._target = size
+        self.peak_workers = max(self.peak_workers, size)
+
+    def _resize(self, size, reason, window):
+        with self._lock:
+            old = self._target
+            if size == old:
+                return
+            if size > old:
+                for _ in range(size - old):
+                    self._thread_ids += 1
+                    threading.Thread(target=self._worker, name=f"{self.thread_name_prefix}-{self._thread_ids}",
+                                     daemon=True).start()
+                    self._workers += 1
+            else:
+                for _ in range(old - size):
+                    self._queue.put(_RETIRE)
+            self._set_target(size)
+        self.decisions.append({"time": time.monotonic() - self._started_at, "from": old, "to": size,
+                               "reason": reason, **window})
+
+    # --- controller ---
+    def _reset_window(self):
+        self._window_start = time.monotonic()
+        self._arrivals = 0
+        self._done = 0
+        self._wait_sum = 0.0
+        self._max_wait = 0.0
+        self._busy_sum = 0.0
+
+    def _take_window(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._window_start
+            window = {
+                "arrival_rate": self._arrivals / elapsed,
+                "throughput": self._done / elapsed,
+                "avg_wait": self._wait_sum / self._done if self._done else 0.0,
+                "max_wait": self._max_wait,
+                "avg_latency": self._busy_sum / self._done if self._done else 0.0,
+                "utilization": self._busy_sum / (elapsed * self._target) if self._target else 0.0,
+                "backlog": self._queue.qsize(),
+            }
+            self.completed += self._done
+            self._reset_window()
+        return window
+
+    def _control_loop(self):
+        while not self._stop_event.wait(self.interval):
+            window = self._take_window()
+            self.last_window = window
+            size = self._decide(window)
+            if size is not None:
+                self._resize(*size, window)
+
+    def _decide(self, w):
+        current = self._target
+        now = time.monotonic()
+        # Little's law: busy workers = arrival rate * time per task
+        needed = math.ceil(max(w["arrival_rate"], w["throughput"]) * w["avg_latency"] * (1 + self.headroom))
+
+        # a backlog with nobody finishing (all workers stuck on long tasks) also counts as waiting too long
+        waiting_too_long = w["avg_wait"] > self.target_wait or (w["backlog"] > current and w["max_wait"] > self.target_wait)
+        if waiting_too_long or (w["backlog"] > 0 and w["throughput"] == 0):
+            self._quiet_windows = 0
+            if current >= self.max_workers:
+                return None
+            # the backlog has to be drained as well, not just the steady state
+            drain = math.ceil(w["backlog"] * w["avg_latency"] / self.interval) if w["avg_latency"] else current
+            size = min(self.max_workers, max(current + 1, needed + drain))
+            self._last_scale_up = now
+            self.scale_ups += 1
+            return size, "queue wait above target"
+
+        quiet = w["avg_wait"] < self.target_wait / 4 and w["utilization"] < self.low_utilization and not w["backlog"]
+        self._quiet_windows = self._quiet_windows + 1 if quiet else 0
+        if (self._quiet_windows >= self.scale_down_windows and current > self.min_workers
+                and now - self._last_scale_up >= self.cooldown):
+            size = max(self.min_workers, needed, current - max(1, current // 4))
+            if size < current:
+                self._quiet_windows = 0
+                self.scale_downs += 1
+                return size, "low utilization"
+        return None
+
+    def metrics(self):
+        with self._lock:
+            worker_seconds = self._worker_seconds + self._target * (time.monotonic() - self._sized_at)
+            elapsed = time.monotonic() - self._started_at
+            return {
+                "workers": self._target,
+                "peak_workers": self.peak_workers,
+                "avg_workers": worker_seconds / elapsed if elapsed else float(self._target),
+                "scale_ups": self.scale_ups,
+                "scale_downs": self.scale_downs,
+                "completed": self.completed + self._done,
+                "last_window": self.last_window,
+            }
+
+
+# --- Benchmark: 20x load swing, fixed pools vs autoscaling ---
+class _FixedPool:
+    """Fixed size pool with the same queue wait bookkeeping, for comparison."""
+
+    def __init__(self, size):
+        self.size = size
+        self._queue = queue.SimpleQueue()
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(size)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        self._queue.put((future, fn, args))
+        return future
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is _RETIRE:
+                return
+            future, fn, args = item
+            future.set_result(fn(*args))
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(_RETIRE)
+        for t in self._threads:
+            t.join()
+
+    def metrics(self):
+        return {"avg_workers": float(self.size), "peak_workers": self.size, "scale_ups": 0, "scale_downs": 0}
+
+
+def _drive(pool, phases, task_time):
+    """Open-loop load: submits tasks at each phase's rate. Returns sorted queue waits in seconds."""
+    waits = []
+    lock = threading.Lock()
+
+    def task(queued_at):
+        wait = time.monotonic() - queued_at
+        time.sleep(task_time)  # I/O bound work, e.g. a DB or HTTP call
+        with lock:
+            waits.append(wait)
+
+    futures = []
+    tick = 0.01
+    for rate, duration in phases:
+        next_tick = time.monotonic()
+        owed = 0.0
+        end = next_tick + duration
+        while next_tick < end:
+            owed += rate * tick
+            while owed >= 1:
+                futures.append(pool.submit(task, time.monotonic()))
+                owed -= 1
+            next_tick += tick
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+    for future in futures:
+        future.result()
+    waits.sort()
+    return waits
+
+def run_benchmark(low_rate=25, high_rate=500, task_time=0.02, phase_seconds=2.0):
+    # quiet -> 20x peak -> quiet
+    phases = ((low_rate, phase_seconds), (high_rate, phase_seconds), (low_rate, phase_seconds))
+    needed_at_peak = math.ceil(high_rate * task_time)
+    variants = (
+        ("fixed, sized for quiet", lambda: _FixedPool(2)),
+        ("fixed, sized for peak", lambda: _FixedPool(needed_at_peak * 2)),
+        ("autoscaling", lambda: AutoscalingThreadPool(min_workers=2, max_workers=needed_at_peak * 2)),
+    )
+    print(f"load: {low_rate}/s -> {high_rate}/s -> {low_rate}/s, {phase_seconds:.0f}s each, "
+          f"{task_time * 1000:.0f} ms tasks")
+    print(f"{'pool':>24} {'p50 wait ms':>12} {'p99 wait ms':>12} {'max wait ms':>12} {'avg workers':>12} "
+          f"{'peak':>5} {'ups':>4} {'downs':>6}")
+    for name, make in variants:
+        pool = make()
+        waits = _drive(pool, phases, task_time)
+        m = pool.metrics()
+        pool.shutdown()
+        print(f"{name:>24} {waits[len(waits) // 2] * 1000:>12.2f} {waits[int(len(waits) * 0.99)] * 1000:>12.2f} "
+              f"{waits[-1] * 1000:>12.2f} {m['avg_workers']:>12.1f} {m['peak_workers']:>5} {m['scale_ups']:>4} "
+              f"{m['scale_downs']:>6}")
+        if isinstance(pool, AutoscalingThreadPool):
+            print("  scaling decisions:")
+            for d in pool.decisions:
+                print(f"    t={d['time']:5.2f}s {d['from']:>3} -> {d['to']:<3} {d['reason']:<24} "
+                      f"wait={d.get('avg_wait', 0) * 1000:.1f}ms util={d.get('utilization', 0):.2f} "
+                      f"arrivals={d.get('arrival_rate', 0):.0f}/s")
+
+
+if __name__ == "__main__":
+    def worker_function(task_id):
+        print(f"Worker {threading.current_thread().name}: Starting task {task_id}")
+        time.sleep(1) # Simulate some work
+        return f"Task {task_id} completed"
+
+    # starts with 1 worker, the controller adds more as soon as tasks wait in the queue
+    with AutoscalingThreadPool(min_workers=1, max_workers=5, interval=0.2) as executor:
+        tasks = [f"Task-{i}" for i in range(10)]
+        for result in executor.map(worker_function, tasks):
+            print("main thread", result)
+        print("main thread", executor.metrics())
+
+    print("All tasks have been processed.")
+
+    print("\nBenchmark: fixed pools vs autoscaling under a 20x load swing")
+    run_benchmark()
@@ -24,6 +24,10 @@ import concurrent.futures
 import threading
 import time
 
+# ThreadPoolExecutor shares one work queue between all workers. See 9_work_stealing_pool.py for per-worker
+# deques with work stealing, batched submit_many() and task priorities, and 9_autoscaling_pool.py for a pool
+# that grows and shrinks with the load instead of a fixed max_workers.
+
 def worker_function(task_id):
     print(f"Worker {threading.get_ident()}: Starting task {task_id}")
     time.sleep(1) # Simulate some work
@@ -0,0 +1,272 @@
+"""
+Work-stealing thread pool
+
+ThreadPoolExecutor (9_thread_pool.py) keeps one shared work queue. Every submit() puts into it and every
+worker takes from it, so with many short tasks all threads keep meeting at the same queue.
+
+A work-stealing pool gives every worker its own deque instead:-
+- submit() puts tasks on one worker's deque (round-robin from outside the pool; a task submitted from
+  inside a worker goes on that worker's own deque, which keeps related work on the same thread).
+- A worker takes from its own deque first, from the right end (LIFO, the most recently pushed task is the
+  "warmest").
+- When its own deque is empty it steals from the left end (FIFO, the oldest task) of another worker's
+  deque. Owner and thief work on opposite ends, and for uneven (skewed) task durations the idle workers
+  automatically take over the backlog of the busy ones.
+- collections.deque append/pop/popleft are atomic in CPython, so the deques need no lock.
+- An idle worker registers itself as idle, re-checks all deques once (so a task pushed at the same moment
+  can't be missed) and sleeps on its own Event. submit() only wakes a worker when one is idle.
+- submit_many() builds all futures first, spreads the tasks across the deques in chunks with extend() and
+  wakes at most one worker per chunk: one handoff per batch instead of one per task.
+- Optional priorities: every worker has one deque per priority level (HIGH, NORMAL, LOW). Own deques and
+  steal targets are always scanned from the highest priority down.
+
+WorkStealingExecutor is a concurrent.futures.Executor, so submit/map/shutdown and the with statement work
+the same as with ThreadPoolExecutor.
+"""
+
+import collections
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+
+HIGH, NORMAL, LOW = 0, 1, 2
+_PRIORITIES = (HIGH, NORMAL, LOW)
+
+
+class _Worker:
+    __slots__ = ("index", "deques", "wakeup", "thread")
+
+    def __init__(self, index):
+        self.index = index
+        self.deques = [collections.deque() for _ in _PRIORITIES]
+        self.wakeup = threading.Event()
+        self.thread = None
+
+
+class WorkStealingExecutor(Executor):
+    def __init__(self, max_workers=None, thread_name_prefix="ws-worker"):
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        self._workers = [_Worker(i) for i in range(max_workers)]
+        self._local = threading.local()
+        self._next_worker = itertools.cycle(range(max_workers))
+        self._idle = []  # workers currently sleeping
+        self._idle_lock = threading.Lock()
+        self._shutdown = False
+        self._shutdown_lock = threading.Lock()
+        self.steals = 0  # approximate, incremented without a lock by the workers
+        for worker in self._workers:
+            worker.thread = threading.Thread(target=self._run, args=(worker,),
+                                             name=f"{thread_name_prefix}-{worker.index}", daemon=True)
+            worker.thread.start()
+
+    # --- submission ---
+    def submit(self, fn, /, *args, **kwargs):
+        return self.submit_with_priority(NORMAL, fn, *args, **kwargs)
+
+    def submit_with_priority(self, priority, fn, /, *args, **kwargs):
+        future = Future()
+        # check and push under the lock, like ThreadPoolExecutor.submit: a task pushed after shutdown() set the
+        # flag could land in a deque no worker looks at anymore
+        with self._shutdown_lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._target_worker().deques[priority].append((future, fn, args, kwargs))
+        self._wake(1)
+        return future
+
+    def submit_many(self, fn, iterable, priority=NORMAL):
+        """Submits fn(*args) for every args tuple in iterable as one batch. Returns the list of futures."""
+        tasks = [(Future(), fn, args, {}) for args in iterable]
+        num_workers = len(self._workers)
+        chunk = -(-len(tasks) // num_workers)  # ceil division
+        chunks = 0
+        with self._shutdown_lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            if not tasks:
+                return []
+            start = next(self._next_worker)
+            for i in range(0, len(tasks), chunk):
+                worker = self._workers[(start + i // chunk) % num_workers]
+                worker.deques[priority].extend(tasks[i:i + chunk])
+                chunks += 1
+        self._wake(chunks)
+        return [task[0] for task in tasks]
+
+    def map(self, fn, *iterables, timeout=None, chunksize=1):
+        end_time = None if timeout is None else time.monotonic() + timeout
+        futures = self.submit_many(fn, zip(*iterables))
+
+        def result_iterator():
+            try:
+                futures.reverse()
+                while futures:
+                    future = futures.pop()
+                    if end_time is None:
+                        yield future.result()
+                    else:
+                        yield future.result(end_time - time.monotonic())
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        return result_iterator()
+
+    def _target_worker(self):
+        own = getattr(self._local, "worker", None)
+        if own is not None:
+            return own
+        return self._workers[next(self._next_worker)]
+
+    def _wake(self, count):
+        if not self._idle:  # cheap check without the lock, see _sleep for why this can't lose a wakeup
+            return
+        with self._idle_lock:
+            for _ in range(min(count, len(self._idle))):
+                self._idle.pop().wakeup.set()
+
+    # --- worker side ---
+    def _find_task(self, worker):
+        for level in _PRIORITIES:
+            try:
+                return worker.deques[level].pop()
+            except IndexError:
+                pass
+            # steal the oldest task of this priority from another worker, starting at a random victim
+            others = self._workers
+            offset = random.randrange(len(others))
+            for i in range(len(others)):
+                victim = others[(offset + i) % len(others)]
+                if victim is worker:
+                    continue
+                try:
+                    task = victim.deques[level].popleft()
+                except IndexError:
+                    continue
+                self.steals += 1
+                return task
+        return None
+
+    def _sleep(self, worker):
+        worker.wakeup.clear()
+        with self._idle_lock:
+            self._idle.append(worker)
+        # re-check after registering as idle: a submit that pushed before our registration is seen here,
+        # a submit that pushes after it sees us in self._idle and sets our event
+        task = self._find_task(worker)
+        if task is None and not self._shutdown:
+            worker.wakeup.wait()
+        with self._idle_lock:
+            if worker in self._idle:
+                self._idle.remove(worker)
+        return task
+
+    def _run(self, worker):
+        self._local.worker = worker
+        while True:
+            task = self._find_task(worker)
+            if task is None:
+                if self._shutdown:
+                    return
+                task = self._sleep(worker)
+                if task is None:
+                    continue
+            future, fn, args, kwargs = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._shutdown_lock:
+            self._shutdown = True
+        if cancel_futures:
+            for worker in self._workers:
+                for dq in worker.deques:
+                    while True:
+                        try:
+                            dq.popleft()[0].cancel()
+                        except IndexError:
+                            break
+        for worker in self._workers:
+            worker.wakeup.set()
+        if wait:
+            for worker in self._workers:
+                worker.thread.join()
+
+
+# --- Benchmark: tiny tasks and skewed durations vs ThreadPoolExecutor ---
+def _tiny(x):
+    return x + 1
+
+def _skewed(duration):
+    time.sleep(duration)
+    return duration
+
+def _latencies(executor, fn, args, use_batch):
+    """Runs fn over args, returns (elapsed, sorted submit-to-done latencies)."""
+    done_at = [0.0] * len(args)
+    start = time.perf_counter()
+
+    def timed(i, arg):
+        result = fn(arg)
+        done_at[i] = time.perf_counter()
+        return result
+
+    if use_batch:
+        futures = executor.submit_many(timed, list(enumerate(args)))
+    else:
+        futures = [executor.submit(timed, i, arg) for i, arg in enumerate(args)]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - start
+    return elapsed, sorted(t - start for t in done_at)
+
+def run_benchmark(num_workers=8, tiny_tasks=100_000, skewed_tasks=2_000):
+    rnd = random.Random(42)
+    # mostly 0.2 ms tasks, 2% of 20 ms ones (I/O-like waits, they release the GIL)
+    skewed = [0.02 if rnd.random() < 0.02 else 0.0002 for _ in range(skewed_tasks)]
+    workloads = (("tiny", _tiny, list(range(tiny_tasks))), ("skewed", _skewed, skewed))
+
+    print(f"{'workload':>9} {'executor':>22} {'tasks/s':>11} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, fn, args in workloads:
+        variants = (
+            ("ThreadPoolExecutor", lambda: ThreadPoolExecutor(max_workers=num_workers), False),
+            ("WorkStealing submit", lambda: WorkStealingExecutor(max_workers=num_workers), False),
+            ("WorkStealing batch", lambda: WorkStealingExecutor(max_workers=num_workers), True),
+        )
+        for label, make, use_batch in variants:
+            with make() as executor:
+                elapsed, lat = _latencies(executor, fn, args, use_batch)
+            print(f"{name:>9} {label:>22} {len(args) / elapsed:>11,.0f} {lat[len(lat) // 2] * 1000:>8.2f} "
+                  f"{lat[int(len(lat) * 0.99)] * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    def worker_function(task_id):
+        print(f"Worker {threading.current_thread().name}: Starting task {task_id}")
+        time.sleep(0.2) # Simulate some work
+        return f"Task {task_id} completed"
+
+    with WorkStealingExecutor(max_workers=3) as executor:
+        urgent = executor.submit_with_priority(HIGH, worker_function, "urgent")
+        tasks = [f"Task-{i}" for i in range(10)]
+        for result in executor.map(worker_function, tasks):
+            print("main thread", result)
+        print("main thread", urgent.result())
+        print(f"steals: {executor.steals}")
+
+    print("All tasks have been processed.")
+
+    print("\nBenchmark: work stealing vs ThreadPoolExecutor")
+    run_benchmark()